@@ -0,0 +1,226 @@
+"""
+Módulo de precarga de la agenda diaria de citas
+
+Descarga las citas del día de la agencia (NO_CIA/AGENCIA) y las guarda en un
+índice en memoria por placa normalizada. Con el índice cargado, una detección
+se resuelve localmente sin esperar a la API de citas; la consulta remota por
+placa solo se usa cuando la placa no está en el índice.
+
+Las placas del índice alimentan además un IndiceAproximado (ver
+app/coincidencia.py) para reconocer lecturas con errores de OCR.
+
+El servicio de agenda diaria se configura con URL_CITAS_DIA y recibe los
+parámetros noCia, agencia y fecha (YYYY-MM-DD). Se espera la misma estructura
+de respuesta que la consulta por placa: {"codigo": "0",
+"listadoDatosAgendamiento": [{"placa": ..., ...}, ...]}.
+"""
+
+import re
+import threading
+import time
+from datetime import date
+
+import requests
+
+from app.coincidencia import IndiceAproximado
+
+_NO_ALFANUMERICO = re.compile(r'[^A-Za-z0-9]')
+
+
+def normalizar_placa(placa):
+    """
+    Normaliza una placa para usarla como clave del índice.
+
+    Args:
+        placa (str): Placa tal como viene de la cámara o de la API
+
+    Returns:
+        str: Placa en mayúsculas, solo letras y números
+    """
+    return _NO_ALFANUMERICO.sub('', placa or '').upper()
+
+
+class AgendaDiaria:
+    """
+    Índice en memoria de las citas del día, actualizado en segundo plano.
+
+    Cada placa se asocia con una respuesta ya armada en el formato de la API
+    de citas, de modo que una búsqueda no crea objetos nuevos.
+
+    Attributes:
+        url (str): Endpoint de la agenda diaria
+        intervalo (float): Segundos entre actualizaciones del índice
+        fecha (date): Día cargado actualmente
+    """
+
+    def __init__(self, url, no_cia, agencia, intervalo=300, timeout=15,
+                 distancia_maxima=1, puntaje_minimo=0.8):
+        self.url = url
+        self.no_cia = no_cia
+        self.agencia = agencia
+        self.intervalo = intervalo
+        self.timeout = timeout
+        self.fecha = None
+        self._indice = {}
+        self._aproximado = IndiceAproximado(distancia_maxima=distancia_maxima,
+                                            puntaje_minimo=puntaje_minimo)
+        self._hilo = None
+        self._detener = threading.Event()
+        self._lock = threading.Lock()
+        self._cargas = 0
+        self._errores = 0
+        self._aciertos = 0
+        self._fallos = 0
+        self._ultima_carga = None
+
+    def cargar(self, dia=None):
+        """
+        Descarga la agenda del día y reemplaza el índice de forma atómica.
+
+        Args:
+            dia (date): Día a cargar (por defecto hoy)
+
+        Returns:
+            bool: True si la agenda se cargó correctamente
+        """
+        dia = dia or date.today()
+        try:
+            response = requests.get(self.url, params={
+                "noCia": self.no_cia,
+                "agencia": self.agencia,
+                "fecha": dia.isoformat()
+            }, timeout=self.timeout)
+            response.raise_for_status()
+            datos = response.json()
+            if not isinstance(datos, dict):
+                raise ValueError("formato de respuesta inválido")
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"Error al cargar la agenda del día: {e}")
+            with self._lock:
+                self._errores += 1
+            return False
+
+        citas_por_placa = {}
+        for cita in datos.get("listadoDatosAgendamiento") or []:
+            placa = normalizar_placa(cita.get("placa"))
+            if placa:
+                citas_por_placa.setdefault(placa, []).append(cita)
+        indice = {
+            placa: {"codigo": "0", "mensaje": "CITA ENCONTRADA", "listadoDatosAgendamiento": citas}
+            for placa, citas in citas_por_placa.items()
+        }
+
+        self._aproximado.reconstruir(indice)
+        with self._lock:
+            self._indice = indice
+            self.fecha = dia
+            self._cargas += 1
+            self._ultima_carga = time.time()
+        return True
+
+    def buscar(self, placa):
+        """
+        Busca una placa en el índice local.
+
+        Un índice de un día anterior (la recarga falló tras el cambio de día)
+        se trata como vacío, para que la consulta vaya a la API por placa.
+
+        Args:
+            placa (str): Placa detectada
+
+        Returns:
+            dict: Respuesta en formato de la API de citas o None si no está
+        """
+        resultado = self._vigente().get(normalizar_placa(placa))
+        with self._lock:
+            if resultado is None:
+                self._fallos += 1
+            else:
+                self._aciertos += 1
+        return resultado
+
+    def buscar_aproximada(self, placa):
+        """
+        Busca la cita de la placa conocida más parecida a una lectura.
+
+        Si dos placas de la agenda empatan en el mejor puntaje, la lectura se
+        considera ambigua y no se asocia a ninguna.
+
+        Args:
+            placa (str): Placa detectada
+
+        Returns:
+            tuple: (placa con cita, puntaje, respuesta de la API) o None
+        """
+        indice = self._vigente()
+        if not indice:
+            return None
+        candidatos = self._aproximado.buscar(normalizar_placa(placa), limite=2)
+        if not candidatos or (len(candidatos) > 1 and candidatos[0][1] == candidatos[1][1]):
+            return None
+        placa_cita, puntaje = candidatos[0]
+        resultado = indice.get(placa_cita)
+        if resultado is None:
+            return None
+        return placa_cita, puntaje, resultado
+
+    def placas(self):
+        """
+        Returns:
+            list: Placas normalizadas con cita en el día cargado
+        """
+        return list(self._vigente())
+
+    def iniciar(self):
+        """
+        Carga la agenda e inicia el hilo de actualización en segundo plano.
+
+        Returns:
+            threading.Thread: Hilo de actualización
+        """
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._actualizar, daemon=True)
+            self._hilo.start()
+        return self._hilo
+
+    def detener(self):
+        """Detiene el hilo de actualización."""
+        self._detener.set()
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: Placas indexadas, cargas, errores, aciertos y fallos
+        """
+        with self._lock:
+            return {
+                "fecha": self.fecha.isoformat() if self.fecha else None,
+                "placas": len(self._indice) if self.fecha == date.today() else 0,
+                "cargas": self._cargas,
+                "errores": self._errores,
+                "aciertos": self._aciertos,
+                "fallos": self._fallos,
+                "ultima_carga": self._ultima_carga,
+            }
+
+    def _vigente(self):
+        # Índice del día actual (vacío si el cargado es de otro día)
+        with self._lock:
+            return self._indice if self.fecha == date.today() else {}
+
+    def _actualizar(self):
+        fallos = 0
+        while not self._detener.is_set():
+            if self.cargar():
+                fallos = 0
+                espera = self.intervalo
+            else:
+                # Tras un error se reintenta antes, con espera exponencial acotada
+                fallos += 1
+                espera = min(self.intervalo, 30 * 2 ** min(fallos - 1, 4))
+            fin = time.monotonic() + max(1.0, espera)
+            while not self._detener.is_set() and time.monotonic() < fin:
+                # Si cambia el día se recarga de inmediato (solo tras una carga correcta)
+                if not fallos and self.fecha != date.today():
+                    break
+                self._detener.wait(min(30, max(0.0, fin - time.monotonic())))
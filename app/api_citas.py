@@ -1,43 +1,159 @@
 """
-Módulo de consulta a la API de citas 
+Módulo de consulta a la API de citas
 
 Servicio web REST para verificar citas programadas por placa.
+
+Si se configura URL_CITAS_DIA, las citas del día se precargan en un índice
+local (ver app/agenda.py) y las detecciones se resuelven sin consulta remota;
+la API por placa solo se usa cuando la placa no está en el índice. Si la API
+tampoco encuentra cita, se intenta una coincidencia aproximada contra las placas
+de la agenda para tolerar errores de lectura (0/O, 1/I, 8/B, caracteres omitidos).
+
+Las respuestas se guardan en un caché con TTL (ver app/cache_citas.py) y las
+consultas simultáneas de una misma placa comparten una sola solicitud remota.
+
+Las consultas remotas pasan por un interruptor de circuito (ver app/circuito.py)
+con timeout adaptativo y reintentos acotados. Mientras el circuito está
+abierto, consultar_cita() responde al instante con una respuesta "pendiente"
+(ver cita_pendiente) en lugar de esperar el timeout por cada placa.
 """
 
 import requests
 import json
-from app.config import URL_CITAS, NO_CIA, AGENCIA
+from app.config import (URL_CITAS, NO_CIA, AGENCIA, CACHE_CITAS_TTL, CACHE_CITAS_TTL_NEGATIVO,
+                        CACHE_CITAS_MAX, URL_CITAS_DIA, PREFETCH_INTERVALO,
+                        COINCIDENCIA_DISTANCIA_MAXIMA, COINCIDENCIA_PUNTAJE_MINIMO)
+from app.config import (CITAS_TIMEOUT_MIN, CITAS_TIMEOUT_MAX, CITAS_TIMEOUT_PERCENTIL, CITAS_REINTENTOS,
+                        CITAS_PRESUPUESTO_REINTENTOS, CIRCUITO_FALLOS, CIRCUITO_ESPERA)
+from app.cache_citas import CacheCitas, sin_cita
+from app.agenda import AgendaDiaria
+from app.circuito import Circuito, CircuitoAbierto
+from app.metricas import metricas
 
-def consultar_cita(placa):
+# Mensaje de las respuestas cuya consulta quedó pendiente por el circuito abierto
+MENSAJE_PENDIENTE = "CONSULTA DE CITA PENDIENTE (servicio de citas no disponible)"
+
+# Caché compartido de respuestas de la API de citas
+cache_citas = CacheCitas(CACHE_CITAS_TTL, CACHE_CITAS_TTL_NEGATIVO, CACHE_CITAS_MAX)
+
+# Índice local de las citas del día (None si la precarga no está configurada)
+agenda_diaria = (AgendaDiaria(URL_CITAS_DIA, NO_CIA, AGENCIA, PREFETCH_INTERVALO,
+                              distancia_maxima=COINCIDENCIA_DISTANCIA_MAXIMA,
+                              puntaje_minimo=COINCIDENCIA_PUNTAJE_MINIMO)
+                 if URL_CITAS_DIA else None)
+
+# Interruptor de circuito de la API de citas
+circuito_citas = Circuito("de citas", fallos_para_abrir=CIRCUITO_FALLOS, espera_abierto=CIRCUITO_ESPERA,
+                          timeout_minimo=CITAS_TIMEOUT_MIN, timeout_maximo=CITAS_TIMEOUT_MAX,
+                          percentil=CITAS_TIMEOUT_PERCENTIL, reintentos=CITAS_REINTENTOS,
+                          presupuesto_reintentos=CITAS_PRESUPUESTO_REINTENTOS)
+
+metricas.registrar_indicadores("cache_citas", cache_citas.estadisticas)
+metricas.registrar_indicadores("circuito_citas", circuito_citas.estadisticas)
+if agenda_diaria is not None:
+    metricas.registrar_indicadores("agenda", agenda_diaria.estadisticas)
+
+def cita_pendiente(resultado):
     """
-    Consulta cita programada por número de placa.
-    
+    Indica si una respuesta quedó pendiente porque el servicio no estaba disponible.
+
+    Args:
+        resultado (dict): Respuesta de consultar_cita()
+
+    Son pendientes las consultas rechazadas por el circuito abierto y las que
+    fallaron por errores de conexión, timeout o 5xx.
+
+    Returns:
+        bool: True si la consulta debe repetirse cuando el servicio se recupere
+    """
+    return isinstance(resultado, dict) and bool(resultado.get("pendiente"))
+
+def _es_fallo_servicio(error):
+    # Los errores 4xx son respuestas del servicio, no indican que esté caído
+    respuesta = getattr(error, "response", None)
+    return respuesta is None or respuesta.status_code >= 500
+
+def iniciar_prefetch_citas():
+    """
+    Inicia la precarga de la agenda diaria en segundo plano.
+
+    Returns:
+        bool: True si la precarga está configurada (URL_CITAS_DIA)
+    """
+    if agenda_diaria is None:
+        return False
+    agenda_diaria.iniciar()
+    return True
+
+def _consultar_cita_remota(placa):
+    """
+    Consulta la API de citas sin pasar por el caché.
+
     Args:
         placa (str): Número de placa del vehículo
-        
+
     Returns:
-        dict: Datos de la cita o dict con error
+        tuple: (dict, bool) - datos de la cita o dict con error, y si la
+               respuesta puede guardarse en caché (solo respuestas del servidor)
     """
-    try:
-        params = {
-            "noCia": NO_CIA,
-            "placa": placa,
-            "agencia": AGENCIA
-        }
-        response = requests.get(URL_CITAS, params=params, timeout=10)
+    params = {
+        "noCia": NO_CIA,
+        "placa": placa,
+        "agencia": AGENCIA
+    }
+
+    def solicitar(timeout):
+        response = requests.get(URL_CITAS, params=params, timeout=(min(3, timeout), timeout))
         response.raise_for_status()
-        return response.json()
+        return response
+
+    try:
+        response = circuito_citas.ejecutar(solicitar, _es_fallo_servicio)
+        resultado = response.json()
+        return resultado, isinstance(resultado, dict) and resultado.get("codigo") == "0"
+    except CircuitoAbierto:
+        return {"codigo": "1", "mensaje": MENSAJE_PENDIENTE, "pendiente": True}, False
     except requests.exceptions.RequestException as e:
         print(f"Error al conectar con el servicio de citas: {e}")
-        return {"codigo": "1", "mensaje": f"Error al conectar con el servicio de citas"}
+        pendiente = _es_fallo_servicio(e)
+        return {"codigo": "1", "mensaje": f"Error al conectar con el servicio de citas", "pendiente": pendiente}, False
     except json.JSONDecodeError as e:
         print(f"Error al procesar la respuesta del servicio: {e}")
-        return {"codigo": "1", "mensaje": "Error al procesar la respuesta del servicio"}
+        return {"codigo": "1", "mensaje": "Error al procesar la respuesta del servicio"}, False
     except Exception as e:
         error_str = str(e)
         if "postgres" in error_str.lower() or "psycopg" in error_str.lower():
             print(f"Error al consultar la base de datos del servidor")
-            return {"codigo": "1", "mensaje": "Error al consultar la base de datos del servidor"}
+            return {"codigo": "1", "mensaje": "Error al consultar la base de datos del servidor"}, False
         else:
             print(f"Error desconocido al consultar cita: {e}")
-            return {"codigo": "1", "mensaje": f"Error al consultar información de cita"} 
\ No newline at end of file
+            return {"codigo": "1", "mensaje": f"Error al consultar información de cita"}, False
+
+def consultar_cita(placa):
+    """
+    Consulta cita programada por número de placa.
+
+    Primero busca en la agenda precargada del día; si no está, consulta la
+    API por placa a través del caché. Si la API responde que no hay cita (no
+    en caso de error o consulta pendiente), busca una placa de la agenda que
+    coincida de forma aproximada; en ese caso la respuesta incluye
+    "coincidencia" con la placa de la cita y su puntaje.
+
+    Args:
+        placa (str): Número de placa del vehículo
+
+    Returns:
+        dict: Datos de la cita o dict con error (compartido, no modificar)
+    """
+    if agenda_diaria is not None:
+        resultado = agenda_diaria.buscar(placa)
+        if resultado is not None:
+            return resultado
+    resultado = cache_citas.obtener(placa, _consultar_cita_remota)
+    if agenda_diaria is not None and sin_cita(resultado):
+        aproximada = agenda_diaria.buscar_aproximada(placa)
+        if aproximada is not None:
+            placa_cita, puntaje, resultado_aproximado = aproximada
+            resultado = dict(resultado_aproximado)
+            resultado["coincidencia"] = {"tipo": "aproximada", "placa": placa_cita, "puntaje": puntaje}
+    return resultado
@@ -0,0 +1,170 @@
+"""
+Módulo de caché de consultas de citas
+
+La cámara suele leer la misma placa varias veces en pocos segundos mientras el
+vehículo avanza hacia la barrera. Este caché evita repetir la consulta remota:
+
+1. Guarda las respuestas con un tiempo de vida (TTL) configurable
+2. Guarda también las respuestas "sin cita" con un TTL negativo más corto
+3. Descarta las entradas menos usadas cuando se alcanza el máximo (LRU)
+4. Agrupa las consultas simultáneas de la misma placa en una sola solicitud
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+def tiene_cita(resultado):
+    """
+    Indica si una respuesta de la API de citas contiene una cita.
+
+    Args:
+        resultado (dict): Respuesta JSON de la API de citas
+
+    Returns:
+        bool: True si la respuesta trae al menos una cita agendada
+    """
+    return (isinstance(resultado, dict) and resultado.get("codigo") == "0"
+            and bool(resultado.get("listadoDatosAgendamiento")))
+
+
+def sin_cita(resultado):
+    """
+    Indica si la API de citas respondió que la placa no tiene cita.
+
+    A diferencia de "not tiene_cita(resultado)", no incluye los errores ni las
+    consultas pendientes.
+
+    Args:
+        resultado (dict): Respuesta JSON de la API de citas
+
+    Returns:
+        bool: True si la respuesta es correcta y no trae citas
+    """
+    return (isinstance(resultado, dict) and resultado.get("codigo") == "0"
+            and not resultado.get("listadoDatosAgendamiento"))
+
+
+class _SolicitudEnCurso:
+    """Consulta remota en curso compartida por los hilos que piden la misma placa."""
+
+    __slots__ = ("listo", "resultado")
+
+    def __init__(self):
+        self.listo = threading.Event()
+        self.resultado = None
+
+
+class CacheCitas:
+    """
+    Caché LRU con TTL y agrupación de solicitudes para las consultas de citas.
+
+    Las respuestas devueltas se comparten entre consultas y no deben
+    modificarse.
+
+    Attributes:
+        ttl (float): Segundos de vida de una respuesta con cita
+        ttl_negativo (float): Segundos de vida de una respuesta sin cita
+        max_entradas (int): Máximo de placas almacenadas
+    """
+
+    def __init__(self, ttl=120, ttl_negativo=30, max_entradas=1000):
+        self.ttl = ttl
+        self.ttl_negativo = ttl_negativo
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()
+        self._en_curso = {}
+        self._lock = threading.Lock()
+        self._aciertos = 0
+        self._fallos = 0
+        self._agrupadas = 0
+        self._descartadas = 0
+
+    def obtener(self, placa, consultar):
+        """
+        Devuelve la cita de una placa desde el caché o consultándola.
+
+        Args:
+            placa (str): Número de placa
+            consultar (callable): Función consultar(placa) -> (resultado, cacheable)
+
+        Returns:
+            dict: Respuesta de la API de citas o dict con error
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(placa)
+            if entrada is not None:
+                if entrada[0] > ahora:
+                    self._entradas.move_to_end(placa)
+                    self._aciertos += 1
+                    return entrada[1]
+                del self._entradas[placa]
+            solicitud = self._en_curso.get(placa)
+            if solicitud is not None:
+                self._agrupadas += 1
+                propietario = False
+            else:
+                solicitud = _SolicitudEnCurso()
+                self._en_curso[placa] = solicitud
+                self._fallos += 1
+                propietario = True
+
+        if not propietario:
+            solicitud.listo.wait()
+            return solicitud.resultado
+
+        resultado, cacheable = None, False
+        try:
+            resultado, cacheable = consultar(placa)
+        finally:
+            with self._lock:
+                if cacheable:
+                    self._guardar(placa, resultado)
+                del self._en_curso[placa]
+            solicitud.resultado = resultado
+            solicitud.listo.set()
+        return resultado
+
+    def invalidar(self, placa=None):
+        """
+        Elimina una placa del caché, o todo el caché si placa es None.
+
+        Args:
+            placa (str): Placa a invalidar
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if placa is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(placa, None)
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: Aciertos, fallos, consultas agrupadas, descartes y tamaño
+        """
+        with self._lock:
+            total = self._aciertos + self._fallos + self._agrupadas
+            return {
+                "aciertos": self._aciertos,
+                "fallos": self._fallos,
+                "agrupadas": self._agrupadas,
+                "descartadas": self._descartadas,
+                "entradas": len(self._entradas),
+                "tasa_aciertos": round((self._aciertos + self._agrupadas) / total, 3) if total else 0.0,
+            }
+
+    def _guardar(self, placa, resultado):
+        ttl = self.ttl if tiene_cita(resultado) else self.ttl_negativo
+        if ttl <= 0 or self.max_entradas <= 0:
+            return
+        self._entradas[placa] = (time.monotonic() + ttl, resultado)
+        self._entradas.move_to_end(placa)
+        while len(self._entradas) > self.max_entradas:
+            self._entradas.popitem(last=False)
+            self._descartadas += 1
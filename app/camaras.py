@@ -0,0 +1,209 @@
+"""
+Registro de cámaras del Sistema de Detección de Placas
+
+Cada sucursal puede tener varias cámaras (carril de entrada, de salida...).
+Cada cámara lleva su propio cliente HTTP, cursor de captura, registro de
+duplicados, pool de consultas y estado de reintentos, de modo que una cámara
+lenta o caída no afecta a las demás. El caché de citas y la publicación del
+estado son compartidos.
+
+Si no se configura CAMARAS, el registro contiene una sola cámara "principal"
+que usa CAMERA_URL y los objetos compartidos de app.camera, app.state y el
+cursor de ARCHIVO_CURSOR.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.camera import ClienteCamara, cliente
+from app.config import (CAMARAS, USERNAME, PASSWORD, MODO_CURSOR, ARCHIVO_CURSOR, MODO_INGESTA,
+                        URL_ALERT_STREAM, PUERTO_ALARMA, HILOS_PROCESAMIENTO, DEDUP_MAX_EVENTOS,
+                        DEDUP_VENTANA_SEGUNDOS)
+from app.cursor import CursorCaptura
+from app.dedup import RegistroEventos
+from app.eventos_camara import url_alert_stream
+from app.metricas import metricas
+from app.planificador import PlanificadorSondeo
+from app.state import eventos_exactos_procesados
+
+
+class Camara:
+    """
+    Cámara registrada con su estado de ingesta independiente.
+
+    Attributes:
+        nombre (str): Nombre de la cámara (p. ej. "entrada")
+        cliente (ClienteCamara): Sesión HTTP de la cámara
+        cursor (CursorCaptura): Cursor de captura (None si MODO_CURSOR está desactivado)
+        registro (RegistroEventos): Eventos ya procesados de esta cámara
+        modo_ingesta (str): "sondeo", "stream" o "alarma"
+        url_alert_stream (str): URL del alert stream
+        puerto_alarma (int): Puerto del servidor de alarmas
+        planificador (PlanificadorSondeo): Espera adaptativa entre sondeos
+    """
+
+    def __init__(self, nombre, cliente_camara, usuario, clave, cursor=None, registro=None,
+                 modo_ingesta=MODO_INGESTA, url_stream=None, puerto_alarma=PUERTO_ALARMA):
+        self.nombre = nombre
+        self.cliente = cliente_camara
+        self.usuario = usuario
+        self.clave = clave
+        self.cursor = cursor
+        self.registro = registro if registro is not None else RegistroEventos(DEDUP_MAX_EVENTOS,
+                                                                              DEDUP_VENTANA_SEGUNDOS)
+        self.modo_ingesta = modo_ingesta
+        self.url_alert_stream = url_stream or (url_alert_stream(cliente_camara.url) if cliente_camara.url else None)
+        self.puerto_alarma = puerto_alarma
+        self.planificador = PlanificadorSondeo()
+        self._conectado = None
+        # Eventos nuevos que no cupieron en un lote (ver monitor.limitar_lote)
+        self.diferidos = {}
+        # Serializa el procesamiento entre el sondeo y los eventos recibidos por push
+        self.lock = threading.Lock()
+        self._ejecutor = None
+        self._ejecutor_lock = threading.Lock()
+
+    @property
+    def fallos_consecutivos(self):
+        """Consultas fallidas seguidas (ver PlanificadorSondeo)."""
+        return self.planificador.fallos_consecutivos
+
+    def registrar_sondeo(self, conectado, eventos=0):
+        """
+        Registra el resultado de un sondeo en el planificador e informa en
+        consola cuando la cámara se conecta o pierde la conexión.
+
+        Args:
+            conectado (bool): True si la cámara respondió
+            eventos (int): Placas nuevas obtenidas
+
+        Returns:
+            None
+        """
+        self.planificador.registrar(conectado, eventos)
+        if conectado == self._conectado:
+            return
+        self._conectado = conectado
+        if conectado:
+            print(f"[{self.nombre}] Conexión con la cámara establecida")
+        else:
+            _, mensaje = self.cliente.estado()
+            print(f"[{self.nombre}] Sin conexión con la cámara: {mensaje}. Se reintentará en segundo plano")
+
+    def ejecutor(self):
+        """
+        Pool de hilos de consultas de citas de esta cámara (se crea al primer uso).
+
+        Returns:
+            ThreadPoolExecutor: Pool con HILOS_PROCESAMIENTO hilos
+        """
+        with self._ejecutor_lock:
+            if self._ejecutor is None:
+                self._ejecutor = ThreadPoolExecutor(max_workers=HILOS_PROCESAMIENTO,
+                                                    thread_name_prefix=f"citas-{self.nombre}")
+            return self._ejecutor
+
+    def configuracion(self):
+        """
+        Datos de conexión de la cámara, en el formato de CAMARAS.
+
+        Returns:
+            dict: Nombre, URL, credenciales y modo de ingesta (ver crear_camara)
+        """
+        return {
+            "nombre": self.nombre,
+            "url": self.cliente.url,
+            "usuario": self.usuario,
+            "clave": self.clave,
+            "modo_ingesta": self.modo_ingesta,
+            "url_alert_stream": self.url_alert_stream,
+            "puerto_alarma": self.puerto_alarma,
+        }
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: Contadores de la sesión HTTP, del registro de duplicados y
+                  espera actual entre sondeos
+        """
+        datos = self.cliente.estadisticas()
+        datos.update({f"registro_{clave}": valor for clave, valor in self.registro.estadisticas().items()})
+        datos["conectado"] = self.cliente.estado()[0]
+        datos["espera_sondeo"] = self.planificador.estado()["espera"]
+        datos["eventos_diferidos"] = len(self.diferidos)
+        return datos
+
+    def estado(self):
+        """
+        Returns:
+            dict: Nombre, conexión, último mensaje y fallos consecutivos
+        """
+        conectado, mensaje = self.cliente.estado()
+        return {
+            "nombre": self.nombre,
+            "conectado": conectado,
+            "mensaje": mensaje,
+            "modo_ingesta": self.modo_ingesta,
+            "fallos_consecutivos": self.fallos_consecutivos,
+            "espera_sondeo": self.planificador.estado()["espera"],
+            "cursor": self.cursor.obtener().isoformat() if self.cursor and self.cursor.obtener() else None,
+        }
+
+
+def _ruta_cursor(nombre):
+    base, extension = os.path.splitext(ARCHIVO_CURSOR)
+    return f"{base}_{nombre}{extension or '.json'}"
+
+
+def crear_camara(datos):
+    """
+    Construye una cámara con cliente, cursor y registro de duplicados propios.
+
+    Args:
+        datos (dict): 'nombre', 'url', 'usuario', 'clave' y opcionalmente
+                      'modo_ingesta', 'url_alert_stream' y 'puerto_alarma'
+
+    Returns:
+        Camara: Cámara lista para monitorear
+    """
+    return Camara(
+        datos["nombre"],
+        ClienteCamara(datos["url"], datos["usuario"], datos["clave"]),
+        datos["usuario"], datos["clave"],
+        cursor=CursorCaptura(_ruta_cursor(datos["nombre"])) if MODO_CURSOR else None,
+        modo_ingesta=(datos.get("modo_ingesta") or MODO_INGESTA).strip().lower(),
+        url_stream=datos.get("url_alert_stream"),
+        puerto_alarma=int(datos.get("puerto_alarma") or PUERTO_ALARMA),
+    )
+
+def cargar_camaras():
+    """
+    Construye el registro de cámaras a partir de la configuración.
+
+    Returns:
+        list: Objetos Camara, en el orden de CAMARAS
+    """
+    if not CAMARAS:
+        return [Camara(
+            "principal", cliente, USERNAME, PASSWORD,
+            cursor=CursorCaptura(ARCHIVO_CURSOR) if MODO_CURSOR else None,
+            registro=eventos_exactos_procesados,
+            url_stream=URL_ALERT_STREAM or None,
+        )]
+
+    camaras = []
+    for datos in CAMARAS:
+        if not datos["url"]:
+            print(f"Cámara '{datos['nombre']}' sin URL configurada, se omite")
+            continue
+        camaras.append(crear_camara(datos))
+    return camaras
+
+
+# Registro de cámaras configuradas
+camaras = cargar_camaras()
+
+for _camara in camaras:
+    metricas.registrar_indicadores(f"camara_{_camara.nombre}", _camara.estadisticas)
+
@@ -2,104 +2,462 @@
 Módulo de comunicación con la cámara Hikvision para detección de placas vehiculares
 
 API REST que devuelve datos en formato XML. Requiere autenticación HTTP Digest.
+
+Las consultas se realizan a través de un ClienteCamara que mantiene una sesión
+HTTP persistente (keep-alive) y reutiliza el nonce Digest entre consultas, de
+modo que cada sondeo normalmente cuesta un solo viaje de ida y vuelta sobre una
+conexión TCP ya abierta.
 """
 
 import requests
 from requests.auth import HTTPDigestAuth
 import xml.etree.ElementTree as ET
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+import re
+import threading
 import time
-from app.config import URL, USERNAME, PASSWORD, HEADERS, BODY_XML
+from app.config import (URL, USERNAME, PASSWORD, HEADERS, BODY_XML, BODY_XML_PLANTILLA,
+                        CAMARA_TIMEOUT_CONEXION, CAMARA_TIMEOUT_LECTURA)
+from app.cursor import formatear_pic_time
+from app.metricas import metricas
+
+_NO_ALFANUMERICO = re.compile(r'[^A-Za-z0-9]')
+
+# Bytes leídos de la respuesta de la cámara por cada paso del parser incremental
+_TAMANO_BLOQUE = 64 * 1024
+
+def limpiar_placa(plate_number):
+    """
+    Limpia una placa leída por la cámara (solo quedan letras y números).
+
+    Args:
+        plate_number (str): Texto de la placa tal como lo envía la cámara
+
+    Returns:
+        str: Placa limpia o None si está vacía o es "unknown"
+    """
+    plate_number_cleaned = _NO_ALFANUMERICO.sub('', plate_number or '')
+    if not plate_number_cleaned or plate_number_cleaned.lower() == "unknown":
+        return None
+    return plate_number_cleaned
+
+def construir_body_xml(desde=None):
+    """
+    Construye el cuerpo AfterTime de la consulta a la cámara.
+
+    Args:
+        desde (datetime): captureTime a partir del cual se piden eventos.
+                          Si es None se usa la fecha inicial de BODY_XML.
+
+    Returns:
+        str: XML con el filtro AfterTime
+    """
+    if desde is None:
+        return BODY_XML
+    return BODY_XML_PLANTILLA.format(pic_time=formatear_pic_time(desde))
+
+# Zonas horarias ya construidas, por texto de desplazamiento ("-500", "+0800"...)
+_ZONAS_HORARIAS = {}
+
+def _zona_horaria(texto):
+    zona = _ZONAS_HORARIAS.get(texto)
+    if zona is None:
+        if texto == "Z":
+            zona = timezone.utc
+        else:
+            digitos = texto[1:].replace(":", "")
+            if not digitos.isdigit() or texto[0] not in "+-" or len(digitos) > 4:
+                raise ValueError(f"Zona horaria no válida: {texto}")
+            if len(digitos) <= 2:
+                minutos = int(digitos) * 60
+            else:
+                minutos = int(digitos[:-2]) * 60 + int(digitos[-2:])
+            zona = timezone(timedelta(minutes=-minutos if texto[0] == "-" else minutos))
+        _ZONAS_HORARIAS[texto] = zona
+    return zona
+
+def parsear_fecha_captura(texto):
+    """
+    Convierte un captureTime de la cámara (p. ej. "20250501T100102-500") en datetime.
+
+    Lee las posiciones fijas del formato en lugar de usar strptime, que es
+    varias veces más lento; si el texto no tiene el formato esperado se recurre
+    a strptime.
+
+    Args:
+        texto (str): captureTime tal como lo envía la cámara
+
+    Returns:
+        datetime: Fecha con zona horaria
+
+    Raises:
+        ValueError: Si el texto no es una fecha válida
+    """
+    if len(texto) > 15 and texto[8] == "T" and texto[:8].isdigit() and texto[9:15].isdigit():
+        return datetime(int(texto[0:4]), int(texto[4:6]), int(texto[6:8]),
+                        int(texto[9:11]), int(texto[11:13]), int(texto[13:15]),
+                        tzinfo=_zona_horaria(texto[15:]))
+    return datetime.strptime(texto.replace("-500", "-0500"), "%Y%m%dT%H%M%S%z")
+
+class ParserPlacas:
+    """
+    Parser incremental de la lista de placas de la cámara.
+
+    Recibe el XML por partes (feed) a medida que llega de la red, por lo que no
+    construye el árbol completo de la respuesta: cada elemento Plate se
+    convierte en evento y se descarta. El namespace del firmware se resuelve una
+    sola vez, con el elemento raíz.
+
+    Si se indica 'limite' y la cámara entrega las placas de la más reciente a la
+    más antigua, el parser se detiene (terminado = True) al llegar a la primera
+    placa anterior al límite, ya que las siguientes también lo serán. Si el
+    orden no es descendente, las placas anteriores al límite solo se omiten.
+
+    Attributes:
+        limite (datetime): Fecha mínima de las placas de interés (p. ej. el cursor)
+        placas (list): Eventos con 'placa', 'fecha' y 'país', en orden de llegada
+        terminado (bool): True si se detuvo antes de recibir toda la respuesta
+    """
+
+    def __init__(self, limite=None):
+        self.limite = limite
+        self.placas = []
+        self.terminado = False
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._etiquetas = None
+        self._abiertos = []
+        self._anterior = None
+        self._descendente = True
+
+    def feed(self, datos):
+        """
+        Procesa una parte de la respuesta.
+
+        Args:
+            datos (bytes): Siguiente bloque del cuerpo XML
+
+        Returns:
+            bool: True si aún se esperan más datos, False si el parser terminó
+        """
+        if self.terminado:
+            return False
+        self._parser.feed(datos)
+        self._procesar()
+        return not self.terminado
+
+    def cerrar(self):
+        """
+        Termina el análisis y devuelve las placas, más reciente primero.
+
+        Returns:
+            list: Diccionarios con 'placa', 'fecha' y 'país'
+
+        Raises:
+            xml.etree.ElementTree.ParseError: Si el XML está incompleto o es inválido
+        """
+        if not self.terminado:
+            self._parser.close()
+            self._procesar()
+        self.placas.sort(key=lambda x: x["fecha"], reverse=True)
+        return self.placas
+
+    def _procesar(self):
+        for evento, elemento in self._parser.read_events():
+            if evento == "start":
+                if self._etiquetas is None:
+                    # Primer evento: el elemento raíz define el namespace de la respuesta
+                    prefijo = elemento.tag[:elemento.tag.index('}') + 1] if elemento.tag.startswith('{') else ''
+                    self._etiquetas = tuple(prefijo + nombre for nombre in
+                                            ("Plate", "plateNumber", "captureTime", "country"))
+                self._abiertos.append(elemento)
+                continue
+            self._abiertos.pop()
+            if elemento.tag != self._etiquetas[0]:
+                continue
+            self._agregar(elemento)
+            # El elemento ya convertido se quita del árbol para no retener la respuesta
+            if self._abiertos:
+                self._abiertos[-1].remove(elemento)
+            if self.terminado:
+                return
+
+    def _agregar(self, elemento):
+        _, etiqueta_placa, etiqueta_captura, etiqueta_pais = self._etiquetas
+        plate_number = elemento.findtext(etiqueta_placa)
+        capture_time = elemento.findtext(etiqueta_captura)
+        if not plate_number or not capture_time:
+            return
+        try:
+            fecha = parsear_fecha_captura(capture_time)
+        except ValueError:
+            return
+
+        # El orden descendente solo se da por confirmado tras comparar dos placas
+        confirmado = self._anterior is not None
+        if confirmado and fecha > self._anterior:
+            self._descendente = False
+        self._anterior = fecha
+        if self.limite is not None and fecha < self.limite:
+            if confirmado and self._descendente:
+                self.terminado = True
+            return
+
+        placa = limpiar_placa(plate_number)
+        if placa:
+            self.placas.append({"placa": placa, "fecha": fecha, "país": elemento.findtext(etiqueta_pais)})
+
+def parsear_placas(contenido, limite=None):
+    """
+    Convierte la respuesta XML de la cámara en una lista de placas.
+
+    Maneja namespace XML variable según versión del firmware.
+    Resultados ordenados por fecha (más reciente primero).
+
+    Args:
+        contenido (bytes): Cuerpo XML devuelto por la cámara
+        limite (datetime): Si se indica, se omiten las placas anteriores a esta
+                           fecha (ver ParserPlacas)
+
+    Returns:
+        list: Diccionarios con 'placa', 'fecha' y 'país'
+    """
+    with metricas.medir("parseo_xml"):
+        parser = ParserPlacas(limite)
+        parser.feed(contenido)
+        return parser.cerrar()
+
+class ClienteCamara:
+    """
+    Cliente HTTP de la cámara Hikvision con sesión persistente.
+
+    Mantiene una única requests.Session (pool de conexiones keep-alive) y un
+    único HTTPDigestAuth, que guarda el último nonce del servidor y lo reutiliza
+    para autenticar las siguientes solicitudes sin recibir otro 401.
+
+    El resultado de cada consulta real queda registrado en 'conectado' y
+    'mensaje', por lo que ya no es necesaria una verificación de conexión
+    previa a cada sondeo.
+
+    Attributes:
+        url (str): Endpoint ISAPI de placas
+        timeout (tuple): (timeout de conexión, timeout de lectura) en segundos
+        conectado (bool): Resultado de la última consulta
+        mensaje (str): Descripción del resultado de la última consulta
+    """
+
+    def __init__(self, url, usuario, clave, timeout_conexion=CAMARA_TIMEOUT_CONEXION,
+                 timeout_lectura=CAMARA_TIMEOUT_LECTURA):
+        self.url = url
+        self.timeout = (timeout_conexion, timeout_lectura)
+        self.conectado = False
+        self.mensaje = "Sin consultas realizadas"
+        self.sesion = requests.Session()
+        self.sesion.auth = HTTPDigestAuth(usuario, clave)
+        self.sesion.headers.update(HEADERS)
+        self._lock = threading.Lock()
+        self._consultas = 0
+        self._errores = 0
+        self._desafios_digest = 0
+
+    def _solicitar(self, desde=None, timeout=None, stream=False):
+        try:
+            response = self.sesion.get(
+                self.url,
+                data=construir_body_xml(desde).encode('utf-8'),
+                timeout=timeout or self.timeout,
+                stream=stream
+            )
+            with self._lock:
+                self._consultas += 1
+                self._desafios_digest += sum(1 for r in response.history if r.status_code == 401)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            self._registrar(False, describir_error(e))
+            raise
+        return response
+
+    def descargar(self, desde=None, timeout=None):
+        """
+        Realiza la consulta de placas y devuelve el cuerpo XML.
+
+        Args:
+            desde (datetime): Cursor de captura para el filtro AfterTime
+            timeout (tuple): Timeout alternativo (conexión, lectura)
+
+        Returns:
+            bytes: Cuerpo de la respuesta
+
+        Raises:
+            requests.exceptions.RequestException: Si la consulta falla
+        """
+        with metricas.medir("http_camara"):
+            contenido = self._solicitar(desde, timeout).content
+        self._registrar(True, "Conexión exitosa con la cámara")
+        return contenido
+
+    def obtener_placas(self, desde=None):
+        """
+        Obtiene las placas detectadas por la cámara.
+
+        La respuesta se analiza a medida que llega (ParserPlacas), sin esperar
+        al cuerpo completo ni construir su árbol XML. Si se alcanza una placa
+        anterior al cursor, el resto de la respuesta se lee sin analizarla para
+        que la conexión pueda reutilizarse.
+
+        Args:
+            desde (datetime): Cursor de captura; si se indica, solo se solicitan
+                              los eventos desde ese segundo (inclusive).
+
+        Returns:
+            list: Diccionarios con 'placa', 'fecha' y 'país'.
+                  Lista vacía si hay error.
+        """
+        # El parseo se intercala con la lectura: su tiempo se descuenta del de HTTP
+        inicio = time.perf_counter()
+        parseo = 0.0
+        try:
+            parser = ParserPlacas(limite=desde)
+            with self._solicitar(desde, stream=True) as response:
+                for bloque in response.iter_content(chunk_size=_TAMANO_BLOQUE):
+                    if not parser.terminado:
+                        inicio_parseo = time.perf_counter()
+                        parser.feed(bloque)
+                        parseo += time.perf_counter() - inicio_parseo
+            inicio_parseo = time.perf_counter()
+            placas = parser.cerrar()
+            parseo += time.perf_counter() - inicio_parseo
+        except requests.exceptions.RequestException as e:
+            self._registrar(False, describir_error(e))
+            return []
+        except Exception as e:
+            self._registrar(False, f"Error desconocido al consultar la cámara: {e}")
+            return []
+        metricas.observar("http_camara", time.perf_counter() - inicio - parseo)
+        metricas.observar("parseo_xml", parseo)
+        self._registrar(True, "Conexión exitosa con la cámara")
+        return placas
+
+    def registrar_estado(self, conectado, mensaje):
+        """
+        Registra el resultado de una consulta hecha fuera de este cliente
+        (p. ej. por un proceso trabajador, ver app/coordinador.py).
+
+        Args:
+            conectado (bool): True si la cámara respondió
+            mensaje (str): Mensaje descriptivo
+
+        Returns:
+            None
+        """
+        self._registrar(conectado, mensaje)
+
+    def estado(self):
+        """
+        Returns:
+            tuple: (bool, str) - resultado de la última consulta real
+        """
+        with self._lock:
+            return self.conectado, self.mensaje
+
+    def estadisticas(self):
+        """
+        Contadores de uso de la sesión HTTP.
+
+        'solicitudes_http' y 'conexiones_nuevas' provienen del pool de urllib3;
+        su diferencia indica cuántas solicitudes reutilizaron una conexión abierta.
+        'desafios_digest' cuenta las respuestas 401 recibidas (nonce renovado).
+
+        Returns:
+            dict: Contadores de consultas, conexiones y autenticación
+        """
+        solicitudes_http = conexiones_nuevas = 0
+        try:
+            pool = self.sesion.get_adapter(self.url).poolmanager.connection_from_url(self.url)
+            solicitudes_http = pool.num_requests
+            conexiones_nuevas = pool.num_connections
+        except Exception:
+            pass
+        with self._lock:
+            return {
+                "consultas": self._consultas,
+                "errores": self._errores,
+                "solicitudes_http": solicitudes_http,
+                "conexiones_nuevas": conexiones_nuevas,
+                "conexiones_reutilizadas": max(0, solicitudes_http - conexiones_nuevas),
+                "desafios_digest": self._desafios_digest,
+            }
+
+    def cerrar(self):
+        """Cierra la sesión y sus conexiones abiertas."""
+        self.sesion.close()
+
+    def _registrar(self, conectado, mensaje):
+        with self._lock:
+            self.conectado = conectado
+            self.mensaje = mensaje
+            if not conectado:
+                self._errores += 1
+
+def describir_error(error):
+    """
+    Traduce una excepción de requests a un mensaje descriptivo.
+
+    Args:
+        error (Exception): Excepción producida al consultar la cámara
+
+    Returns:
+        str: Mensaje para mostrar en consola
+    """
+    if isinstance(error, requests.exceptions.ConnectionError):
+        return "No se pudo conectar con la cámara (Error de conexión)"
+    if isinstance(error, requests.exceptions.Timeout):
+        return "Tiempo de espera agotado al conectar con la cámara"
+    if isinstance(error, requests.exceptions.HTTPError):
+        return f"Error HTTP al conectar con la cámara: {error}"
+    return f"Error desconocido al conectar con la cámara: {error}"
+
+# Cliente compartido de la cámara configurada en .env
+cliente = ClienteCamara(URL, USERNAME, PASSWORD)
 
 def verificar_conexion_camara():
     """
     Verifica conexión con la cámara Hikvision.
-    
+
+    Realiza una consulta real con el cliente compartido, por lo que la sesión
+    y el nonce Digest quedan listos para los sondeos siguientes.
+
     Returns:
         tuple: (bool, str) - (True/False si hay conexión, mensaje descriptivo)
     """
     try:
-        response = requests.get(
-            URL,
-            headers=HEADERS,
-            data=BODY_XML.encode('utf-8'),
-            auth=HTTPDigestAuth(USERNAME, PASSWORD),
-            timeout=5 
-        )
-        response.raise_for_status()
-        return True, "Conexión exitosa con la cámara"
-    except requests.exceptions.ConnectionError:
-        return False, "No se pudo conectar con la cámara (Error de conexión)"
-    except requests.exceptions.Timeout:
-        return False, "Tiempo de espera agotado al conectar con la cámara"
-    except requests.exceptions.HTTPError as e:
-        return False, f"Error HTTP al conectar con la cámara: {e}"
-    except Exception as e:
-        return False, f"Error desconocido al conectar con la cámara: {e}"
-
-def get_plates():
+        cliente.descargar(timeout=(CAMARA_TIMEOUT_CONEXION, 5))
+    except Exception:
+        pass
+    return cliente.estado()
+
+def get_plates(desde=None):
     """
     Obtiene las placas detectadas por la cámara Hikvision.
-    
-    Maneja namespace XML variable según versión del firmware.
-    Resultados ordenados por fecha (más reciente primero).
-    
+
+    El estado de conexión se toma del resultado de esta misma consulta
+    (ver estado_conexion_camara), sin una verificación previa.
+
+    Args:
+        desde (datetime): Cursor de captura; si se indica, solo se solicitan
+                          los eventos desde ese segundo (inclusive).
+
     Returns:
         list: Diccionarios con 'placa', 'fecha' y 'país'.
               Lista vacía si hay error.
     """
-    conectado, _ = verificar_conexion_camara()
-    if not conectado:
-        return []
-        
-    try:
-        response = requests.get(
-            URL,
-            headers=HEADERS,
-            data=BODY_XML.encode('utf-8'),
-            auth=HTTPDigestAuth(USERNAME, PASSWORD),
-            timeout=10
-        )
-        response.raise_for_status()
-
-        root = ET.fromstring(response.content)
-        plates = []
-
-        namespace = root.tag.split('}')[0].strip('{') if '}' in root.tag else None
-        ns = {'ns': namespace} if namespace else None
-
-        xpath = ".//ns:Plate" if namespace else ".//Plate"
-        for plate in root.findall(xpath, ns):
-            def get_text(element, tag):
-                return (element.findtext(f"ns:{tag}", namespaces=ns) if namespace 
-                       else element.findtext(tag))
-
-            plate_number = get_text(plate, "plateNumber")
-            capture_time = get_text(plate, "captureTime")
-            country = get_text(plate, "country")
-
-            if plate_number and capture_time:
-                capture_time = capture_time.replace("-500", "-0500")
-                
-                import re
-                plate_number_cleaned = re.sub(r'[^A-Za-z0-9]', '', plate_number)
-                
-                try:
-                    dt = datetime.strptime(capture_time, "%Y%m%dT%H%M%S%z")
-                    if plate_number_cleaned.lower() != "unknown" and plate_number_cleaned:
-                        plates.append({
-                            "placa": plate_number_cleaned,
-                            "fecha": dt,
-                            "país": country
-                        })
-                except ValueError:
-                    continue
-
-        plates.sort(key=lambda x: x["fecha"], reverse=True)
-        return plates
+    return cliente.obtener_placas(desde)
 
-    except Exception:
-        return []
+def estado_conexion_camara():
+    """
+    Returns:
+        tuple: (bool, str) - resultado de la última consulta a la cámara
+    """
+    return cliente.estado()
 
 def probar_conexion():
     """
@@ -108,23 +466,25 @@ def probar_conexion():
     """
     print(f"Probando conexión a la cámara en: {URL}")
     print(f"Usuario: {USERNAME}")
-    
+
     inicio = time.time()
     conectado, mensaje = verificar_conexion_camara()
     tiempo = time.time() - inicio
-    
+
     print(f"Tiempo de respuesta: {tiempo:.2f} segundos")
-    
+
     if conectado:
         print(" CONEXIÓN EXITOSA")
+        inicio = time.time()
         placas = get_plates()
-        print(f"Se encontraron {len(placas)} registros de placas")
+        print(f"Se encontraron {len(placas)} registros de placas ({time.time() - inicio:.2f} s con la sesión abierta)")
         if placas:
             print("\nÚltimas 3 placas detectadas:")
             for i, placa in enumerate(placas[:3]):
                 print(f"{i+1}. Placa: {placa['placa']}, Fecha: {placa['fecha']}")
+        print(f"Estadísticas de la sesión: {cliente.estadisticas()}")
     else:
         print(f" ERROR DE CONEXIÓN: {mensaje}")
 
 if __name__ == "__main__":
-    probar_conexion() 
\ No newline at end of file
+    probar_conexion()
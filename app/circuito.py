@@ -0,0 +1,213 @@
+"""
+Interruptor de circuito para servicios remotos lentos o caídos
+
+Protege el monitoreo de un servicio que deja de responder (la API de citas):
+
+1. Timeout adaptativo: el timeout de lectura se calcula a partir de un
+   percentil de las latencias recientes (p. ej. 2 x p95), acotado entre un
+   mínimo y un máximo, en lugar de esperar siempre el máximo.
+2. Reintentos con espera exponencial y jitter, limitados por un presupuesto
+   global (una fracción de las solicitudes), para que los reintentos no
+   multipliquen la carga sobre un servicio ya saturado.
+3. Circuito: tras varios fallos seguidos se abre y las llamadas fallan al
+   instante (CircuitoAbierto) durante un tiempo de espera. Después se deja
+   pasar una sola llamada de prueba (semiabierto): si responde, el circuito se
+   cierra; si falla, vuelve a abrirse.
+"""
+
+import random
+import threading
+import time
+from collections import deque
+
+CERRADO = "cerrado"
+ABIERTO = "abierto"
+SEMIABIERTO = "semiabierto"
+
+
+class CircuitoAbierto(Exception):
+    """El circuito está abierto: la llamada no se realizó."""
+
+
+class Circuito:
+    """
+    Interruptor de circuito con timeout adaptativo y presupuesto de reintentos.
+
+    Attributes:
+        nombre (str): Nombre del servicio protegido (para los mensajes)
+        fallos_para_abrir (int): Fallos seguidos que abren el circuito
+        espera_abierto (float): Segundos con el circuito abierto antes de la prueba
+        timeout_minimo (float): Timeout de lectura mínimo en segundos
+        timeout_maximo (float): Timeout de lectura máximo en segundos
+        percentil (float): Percentil de latencia usado para el timeout (0 a 100)
+        factor_timeout (float): Múltiplo del percentil que se usa como timeout
+        reintentos (int): Reintentos máximos por llamada
+        presupuesto_reintentos (float): Reintentos permitidos por solicitud (p. ej. 0.2 = 20 %)
+        espera_reintento (float): Espera base entre reintentos en segundos
+    """
+
+    def __init__(self, nombre, fallos_para_abrir=5, espera_abierto=30, timeout_minimo=1, timeout_maximo=10,
+                 percentil=95, factor_timeout=2, reintentos=2, presupuesto_reintentos=0.2,
+                 espera_reintento=0.2, muestras=200):
+        self.nombre = nombre
+        self.fallos_para_abrir = fallos_para_abrir
+        self.espera_abierto = espera_abierto
+        self.timeout_minimo = timeout_minimo
+        self.timeout_maximo = timeout_maximo
+        self.percentil = percentil
+        self.factor_timeout = factor_timeout
+        self.reintentos = reintentos
+        self.presupuesto_reintentos = presupuesto_reintentos
+        self.espera_reintento = espera_reintento
+        self._latencias = deque(maxlen=muestras)
+        self._lock = threading.Lock()
+        self._estado = CERRADO
+        self._fallos_seguidos = 0
+        self._abierto_desde = 0.0
+        self._prueba_en_curso = False
+        # Saldo de reintentos: cada solicitud suma 'presupuesto_reintentos' y cada reintento resta 1
+        self._saldo_reintentos = 1.0
+        self._cerrado = threading.Condition(self._lock)
+        self._contadores = {"llamadas": 0, "fallos": 0, "rechazadas": 0, "reintentos": 0,
+                            "reintentos_sin_presupuesto": 0, "aperturas": 0}
+
+    def ejecutar(self, funcion, es_fallo=lambda e: True):
+        """
+        Ejecuta una llamada protegida por el circuito.
+
+        Args:
+            funcion (callable): Recibe el timeout de lectura (segundos) y realiza
+                                la llamada; una excepción indica fallo
+            es_fallo (callable): Recibe la excepción y devuelve False si no
+                                 debe contar como fallo del servicio ni reintentarse
+
+        Returns:
+            object: Valor devuelto por 'funcion'
+
+        Raises:
+            CircuitoAbierto: Si el circuito está abierto
+            Exception: La última excepción de 'funcion' si se agotan los reintentos
+        """
+        prueba = self._admitir()
+        intento = 0
+        while True:
+            inicio = time.monotonic()
+            try:
+                resultado = funcion(self.timeout_actual())
+            except Exception as e:
+                if not es_fallo(e):
+                    self._registrar_exito(None, prueba)
+                    raise
+                if prueba or intento >= self.reintentos or not self._tomar_reintento():
+                    self._registrar_fallo(prueba)
+                    raise
+                intento += 1
+                # Espera exponencial con jitter completo: evita que todos los hilos reintenten a la vez
+                time.sleep(random.uniform(0, self.espera_reintento * (2 ** intento)))
+                continue
+            self._registrar_exito(time.monotonic() - inicio, prueba)
+            return resultado
+
+    def estado(self):
+        """
+        Returns:
+            str: "cerrado", "abierto" o "semiabierto"
+        """
+        with self._lock:
+            if self._estado == ABIERTO and time.monotonic() - self._abierto_desde >= self.espera_abierto:
+                return SEMIABIERTO
+            return self._estado
+
+    def disponible(self):
+        """
+        Returns:
+            bool: True si una llamada no sería rechazada en este momento
+        """
+        estado = self.estado()
+        return estado == CERRADO or (estado == SEMIABIERTO and not self._prueba_en_curso)
+
+    def esperar_cierre(self, timeout=None):
+        """
+        Espera a que el circuito se cierre.
+
+        Args:
+            timeout (float): Segundos máximos de espera
+
+        Returns:
+            bool: True si el circuito está cerrado
+        """
+        with self._cerrado:
+            return self._cerrado.wait_for(lambda: self._estado == CERRADO, timeout)
+
+    def timeout_actual(self):
+        """
+        Timeout de lectura según las latencias recientes.
+
+        Returns:
+            float: factor_timeout x percentil de las latencias, acotado entre
+                   timeout_minimo y timeout_maximo (el máximo si aún hay pocas muestras)
+        """
+        with self._lock:
+            if len(self._latencias) < 10:
+                return self.timeout_maximo
+            ordenadas = sorted(self._latencias)
+        indice = min(len(ordenadas) - 1, int(len(ordenadas) * self.percentil / 100))
+        return min(self.timeout_maximo, max(self.timeout_minimo, ordenadas[indice] * self.factor_timeout))
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: Estado, timeout actual, saldo de reintentos y contadores
+        """
+        estado = self.estado()
+        timeout = self.timeout_actual()
+        with self._lock:
+            return dict(self._contadores, estado=estado, timeout=round(timeout, 3),
+                        fallos_seguidos=self._fallos_seguidos,
+                        saldo_reintentos=round(self._saldo_reintentos, 2))
+
+    def _admitir(self):
+        with self._lock:
+            self._contadores["llamadas"] += 1
+            self._saldo_reintentos = min(10.0, self._saldo_reintentos + self.presupuesto_reintentos)
+            if self._estado == CERRADO:
+                return False
+            if (self._estado == ABIERTO and not self._prueba_en_curso
+                    and time.monotonic() - self._abierto_desde >= self.espera_abierto):
+                self._estado = SEMIABIERTO
+                self._prueba_en_curso = True
+                return True
+            self._contadores["rechazadas"] += 1
+            raise CircuitoAbierto(f"Servicio {self.nombre} no disponible (circuito abierto)")
+
+    def _tomar_reintento(self):
+        with self._lock:
+            if self._saldo_reintentos < 1:
+                self._contadores["reintentos_sin_presupuesto"] += 1
+                return False
+            self._saldo_reintentos -= 1
+            self._contadores["reintentos"] += 1
+            return True
+
+    def _registrar_exito(self, latencia, prueba):
+        with self._lock:
+            if latencia is not None:
+                self._latencias.append(latencia)
+            self._fallos_seguidos = 0
+            if prueba or self._estado != CERRADO:
+                print(f"Servicio {self.nombre} disponible de nuevo (circuito cerrado)")
+            self._estado = CERRADO
+            self._prueba_en_curso = False
+            self._cerrado.notify_all()
+
+    def _registrar_fallo(self, prueba):
+        with self._lock:
+            self._contadores["fallos"] += 1
+            self._fallos_seguidos += 1
+            if prueba or (self._estado == CERRADO and self._fallos_seguidos >= self.fallos_para_abrir):
+                if self._estado == CERRADO:
+                    self._contadores["aperturas"] += 1
+                    print(f"Servicio {self.nombre} no responde: circuito abierto por {self.espera_abierto:g} s")
+                self._estado = ABIERTO
+                self._abierto_desde = time.monotonic()
+                self._prueba_en_curso = False
@@ -0,0 +1,236 @@
+"""
+Módulo de coincidencia aproximada de placas
+
+Las lecturas ANPR confunden caracteres parecidos (0/O, 1/I, 8/B...) u omiten
+alguno. Este módulo busca, entre las placas conocidas con cita, las que más se
+parecen a una placa leída:
+
+1. Cada placa se reduce a una clave por clases de confusión (O y 0 dan la
+   misma clave, etc.), así los errores de sustitución se resuelven con una
+   búsqueda O(1) en un diccionario.
+2. Para cada clave se indexan sus variantes con hasta N caracteres eliminados
+   (búsqueda por eliminación simétrica). Así las placas con caracteres
+   omitidos o sobrantes se encuentran con unas pocas búsquedas en un
+   diccionario, sin recorrer las placas conocidas.
+3. Solo se aceptan candidatos que difieren de la lectura en sustituciones
+   confundibles y caracteres omitidos o sobrantes: un carácter cambiado por
+   otro no confundible puede ser otro vehículo y se descarta.
+4. Los candidatos se ordenan con un puntaje entre 0 y 1 en el que las
+   sustituciones entre caracteres confundibles pesan menos.
+
+Ejemplos (python -m doctest app/coincidencia.py):
+
+>>> indice = IndiceAproximado(["ABC1234", "PBA0123"])
+>>> indice.buscar("A8C1234")
+[('ABC1234', 0.964)]
+>>> indice.buscar("ABC123")
+[('ABC1234', 0.857)]
+>>> indice.buscar("PBA0I23")
+[('PBA0123', 0.964)]
+>>> indice.buscar("ABC1235"), indice.buscar("XBC1234"), indice.buscar("PBA0128")
+([], [], [])
+>>> IndiceAproximado(["ABC1234"], distancia_maxima=2).buscar("ABC1243")
+[]
+"""
+
+import threading
+
+# Clases de caracteres que el ANPR confunde con frecuencia
+_CLASES_CONFUSION = {
+    "O": "0", "Q": "0", "D": "0",
+    "I": "1", "L": "1",
+    "B": "8",
+    "S": "5",
+    "Z": "2",
+    "G": "6",
+    "A": "4",
+}
+_TABLA_CONFUSION = str.maketrans(_CLASES_CONFUSION)
+
+# Costo de sustituir dos caracteres de la misma clase de confusión
+_COSTO_CONFUSION = 0.25
+
+
+def clave_confusion(placa):
+    """
+    Reduce una placa normalizada a su clave por clases de confusión.
+
+    Args:
+        placa (str): Placa en mayúsculas, solo letras y números
+
+    Returns:
+        str: Clave en la que los caracteres confundibles son iguales
+    """
+    return placa.translate(_TABLA_CONFUSION)
+
+
+def distancia_edicion(a, b, maximo=None):
+    """
+    Distancia de Levenshtein entre dos cadenas, con corte anticipado.
+
+    Args:
+        a (str): Primera cadena
+        b (str): Segunda cadena
+        maximo (int): Si se indica, devuelve maximo + 1 en cuanto se supera
+
+    Returns:
+        int: Cantidad mínima de inserciones, eliminaciones y sustituciones
+    """
+    if maximo is not None and abs(len(a) - len(b)) > maximo:
+        return maximo + 1
+    anterior = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        actual = [i]
+        for j, cb in enumerate(b, 1):
+            actual.append(min(anterior[j] + 1, actual[j - 1] + 1, anterior[j - 1] + (ca != cb)))
+        if maximo is not None and min(actual) > maximo:
+            return maximo + 1
+        anterior = actual
+    return anterior[-1]
+
+
+def caracteres_omitidos(a, b):
+    """
+    Caracteres omitidos en la cadena más corta respecto de la más larga.
+
+    Args:
+        a (str): Primera cadena
+        b (str): Segunda cadena
+
+    Returns:
+        int: Diferencia de longitud si la cadena más corta se obtiene
+             eliminando caracteres de la más larga, o None si no es así
+             (hay algún carácter cambiado)
+    """
+    corta, larga = (a, b) if len(a) <= len(b) else (b, a)
+    restantes = iter(larga)
+    if all(caracter in restantes for caracter in corta):
+        return len(larga) - len(corta)
+    return None
+
+
+def distancia_ponderada(a, b):
+    """
+    Distancia de edición en la que las sustituciones confundibles cuestan menos.
+
+    Args:
+        a (str): Placa leída
+        b (str): Placa candidata
+
+    Returns:
+        float: Distancia ponderada
+    """
+    anterior = [float(j) for j in range(len(b) + 1)]
+    for i, ca in enumerate(a, 1):
+        actual = [float(i)]
+        clave_a = ca.translate(_TABLA_CONFUSION)
+        for j, cb in enumerate(b, 1):
+            if ca == cb:
+                costo = 0.0
+            elif clave_a == cb.translate(_TABLA_CONFUSION):
+                costo = _COSTO_CONFUSION
+            else:
+                costo = 1.0
+            actual.append(min(anterior[j] + 1, actual[j - 1] + 1, anterior[j - 1] + costo))
+        anterior = actual
+    return anterior[-1]
+
+
+def _variantes_eliminacion(clave, maximo):
+    """Conjunto de cadenas obtenidas al eliminar hasta 'maximo' caracteres."""
+    variantes = {clave}
+    frontera = {clave}
+    for _ in range(maximo):
+        siguiente = set()
+        for variante in frontera:
+            if len(variante) <= 1:
+                continue
+            for i in range(len(variante)):
+                siguiente.add(variante[:i] + variante[i + 1:])
+        variantes |= siguiente
+        frontera = siguiente
+    return variantes
+
+
+class IndiceAproximado:
+    """
+    Índice de placas conocidas para búsquedas tolerantes a errores de lectura.
+
+    Attributes:
+        distancia_maxima (int): Caracteres omitidos o sobrantes tolerados entre claves
+        puntaje_minimo (float): Puntaje mínimo para aceptar un candidato
+    """
+
+    def __init__(self, placas=(), distancia_maxima=1, puntaje_minimo=0.8):
+        self.distancia_maxima = distancia_maxima
+        self.puntaje_minimo = puntaje_minimo
+        self._por_clave = {}
+        self._por_variante = {}
+        self._lock = threading.Lock()
+        self.reconstruir(placas)
+
+    def reconstruir(self, placas):
+        """
+        Reemplaza las placas conocidas del índice.
+
+        Args:
+            placas (iterable): Placas normalizadas (mayúsculas, alfanuméricas)
+
+        Returns:
+            None
+        """
+        por_clave = {}
+        por_variante = {}
+        for placa in placas:
+            clave = clave_confusion(placa)
+            if clave in por_clave:
+                por_clave[clave].append(placa)
+                continue
+            por_clave[clave] = [placa]
+            for variante in _variantes_eliminacion(clave, self.distancia_maxima):
+                por_variante.setdefault(variante, []).append(clave)
+        with self._lock:
+            self._por_clave = por_clave
+            self._por_variante = por_variante
+
+    def __len__(self):
+        return sum(len(placas) for placas in self._por_clave.values())
+
+    def buscar(self, placa, limite=3):
+        """
+        Busca las placas conocidas más parecidas a una placa leída.
+
+        Args:
+            placa (str): Placa normalizada leída por la cámara
+            limite (int): Cantidad máxima de candidatos
+
+        Returns:
+            list: Tuplas (placa, puntaje) ordenadas de mayor a menor puntaje
+        """
+        with self._lock:
+            por_clave, por_variante = self._por_clave, self._por_variante
+        if not por_clave or not placa:
+            return []
+
+        clave = clave_confusion(placa)
+        claves = set()
+        if clave in por_clave:
+            claves.add(clave)
+        if self.distancia_maxima > 0:
+            for variante in _variantes_eliminacion(clave, self.distancia_maxima):
+                for clave_candidata in por_variante.get(variante, ()):
+                    # Sobre las claves las confusiones ya no cuentan: solo se
+                    # toleran caracteres omitidos o sobrantes, no cambiados
+                    if clave_candidata not in claves and caracteres_omitidos(clave, clave_candidata) is not None:
+                        claves.add(clave_candidata)
+
+        candidatos = []
+        for clave_candidata in claves:
+            for conocida in por_clave[clave_candidata]:
+                if conocida == placa:
+                    return [(conocida, 1.0)]
+                puntaje = 1.0 - distancia_ponderada(placa, conocida) / max(len(placa), len(conocida))
+                if puntaje >= self.puntaje_minimo:
+                    candidatos.append((conocida, round(puntaje, 3)))
+        candidatos.sort(key=lambda c: (-c[1], c[0]))
+        return candidatos[:limite]
@@ -10,26 +10,227 @@ from dotenv import load_dotenv
 # Cargar variables de entorno desde el archivo .env
 load_dotenv()
 
+# Valores de entorno que no se pudieron convertir (ver validar_configuracion)
+_errores = []
+
+def _leer_bool(nombre, defecto):
+    """Lee una variable de entorno booleana (1/0, true/false, si/no)."""
+    return os.getenv(nombre, defecto).strip().lower() in ('1', 'true', 'si', 'sí')
+
+def _leer_numero(tipo, nombre, defecto):
+    valor = os.getenv(nombre, '').strip()
+    if not valor:
+        return tipo(defecto)
+    try:
+        return tipo(valor)
+    except ValueError:
+        _errores.append(f"{nombre}={valor!r} no es un número válido; se usa {defecto}")
+        return tipo(defecto)
+
+def _leer_entero(nombre, defecto):
+    """Lee una variable de entorno entera (usa el valor por defecto si no es válida)."""
+    return _leer_numero(int, nombre, defecto)
+
+def _leer_decimal(nombre, defecto):
+    """Lee una variable de entorno numérica (usa el valor por defecto si no es válida)."""
+    return _leer_numero(float, nombre, defecto)
+
 # Configuración de la cámara/API de placas
 URL = os.getenv('CAMERA_URL')
 USERNAME = os.getenv('CAMERA_USERNAME')
 PASSWORD = os.getenv('CAMERA_PASSWORD')
-INTERVALO_CONSULTA = int(os.getenv('INTERVALO_CONSULTA', 1))
+INTERVALO_CONSULTA = _leer_entero('INTERVALO_CONSULTA', 1)
+
+# Registro de cámaras (multi-carril). CAMARAS es una lista de nombres separados
+# por comas; cada cámara se configura con CAMARA_<NOMBRE>_URL y, opcionalmente,
+# CAMARA_<NOMBRE>_USUARIO, _CLAVE, _MODO_INGESTA, _URL_ALERT_STREAM y
+# _PUERTO_ALARMA. Si CAMARAS está vacío se usa una sola cámara con CAMERA_URL.
+def _leer_camaras():
+    nombres = [n.strip() for n in os.getenv('CAMARAS', '').split(',') if n.strip()]
+    camaras = []
+    for nombre in nombres:
+        prefijo = f"CAMARA_{nombre.upper()}_"
+        camaras.append({
+            "nombre": nombre,
+            "url": os.getenv(prefijo + 'URL'),
+            "usuario": os.getenv(prefijo + 'USUARIO', USERNAME),
+            "clave": os.getenv(prefijo + 'CLAVE', PASSWORD),
+            "modo_ingesta": os.getenv(prefijo + 'MODO_INGESTA'),
+            "url_alert_stream": os.getenv(prefijo + 'URL_ALERT_STREAM'),
+            "puerto_alarma": os.getenv(prefijo + 'PUERTO_ALARMA'),
+        })
+    return camaras
+
+CAMARAS = _leer_camaras()
+
+# Espera máxima (segundos) del reintento con espera exponencial de una cámara caída
+CAMARA_ESPERA_MAXIMA = _leer_decimal('CAMARA_ESPERA_MAXIMA', 30)
+
+# Sondeo adaptativo: intervalo mínimo tras actividad, máximo en periodos sin
+# placas y segundos sin placas tras los que el intervalo empieza a crecer
+SONDEO_INTERVALO_MIN = _leer_decimal('SONDEO_INTERVALO_MIN', INTERVALO_CONSULTA)
+SONDEO_INTERVALO_MAX = _leer_decimal('SONDEO_INTERVALO_MAX', 5)
+SONDEO_VENTANA_ACTIVIDAD = _leer_decimal('SONDEO_VENTANA_ACTIVIDAD', 60)
+
+# Timeouts (segundos) de conexión y de lectura para la cámara
+CAMARA_TIMEOUT_CONEXION = _leer_decimal('CAMARA_TIMEOUT_CONEXION', 3)
+CAMARA_TIMEOUT_LECTURA = _leer_decimal('CAMARA_TIMEOUT_LECTURA', 10)
+
+# Consulta incremental: solo se piden los eventos posteriores al último procesado
+MODO_CURSOR = _leer_bool('MODO_CURSOR', '1')
+ARCHIVO_CURSOR = os.getenv('ARCHIVO_CURSOR', 'cursor_placas.json')
+
+# Ingesta de eventos: "sondeo" (consulta periódica), "stream" (alert stream de la
+# cámara) o "alarma" (la cámara envía los eventos a un servidor HTTP local)
+MODO_INGESTA = os.getenv('MODO_INGESTA', 'sondeo').strip().lower()
+# Vacío = /ISAPI/Event/notification/alertStream en el host de CAMERA_URL
+URL_ALERT_STREAM = os.getenv('URL_ALERT_STREAM', '').strip()
+PUERTO_ALARMA = _leer_entero('PUERTO_ALARMA', 8099)
+# Segundos de sondeo de respaldo tras caerse el stream / sin eventos del servidor de alarmas
+STREAM_REINTENTO = _leer_decimal('STREAM_REINTENTO', 30)
+STREAM_TIMEOUT_LECTURA = _leer_decimal('STREAM_TIMEOUT_LECTURA', 60)
+
+# Modelo de monitoreo: "hilos" (un hilo por cámara), "asyncio" (pipeline por etapas)
+# o "procesos" (un proceso trabajador por cámara, ver app/coordinador.py)
+MODO_MONITOR = os.getenv('MODO_MONITOR', 'hilos').strip().lower()
+PIPELINE_COLA_MAX = _leer_entero('PIPELINE_COLA_MAX', 100)
+PIPELINE_PARSEADORES = _leer_entero('PIPELINE_PARSEADORES', 2)
+PIPELINE_CONSULTAS = _leer_entero('PIPELINE_CONSULTAS', 8)
+# Modo "procesos": dirección del coordinador al que se conectan los procesos
+# trabajadores y clave compartida (vacía = clave aleatoria, solo trabajadores locales)
+COORDINADOR_HOST = os.getenv('COORDINADOR_HOST', '127.0.0.1')
+COORDINADOR_PUERTO = _leer_entero('COORDINADOR_PUERTO', 8765)
+COORDINADOR_CLAVE = os.getenv('COORDINADOR_CLAVE', '')
+
+# Procesamiento por lotes: se verifican todos los eventos nuevos de cada consulta
+MODO_LOTE = _leer_bool('MODO_LOTE', '1')
+HILOS_PROCESAMIENTO = _leer_entero('HILOS_PROCESAMIENTO', 4)
+MAX_EVENTOS_LOTE = _leer_entero('MAX_EVENTOS_LOTE', 20)
+# Eventos que no caben en un lote y esperan al siguiente (por cámara); por encima
+# de este límite se descartan los más antiguos (p. ej. en el primer arranque)
+MAX_EVENTOS_DIFERIDOS = _leer_entero('MAX_EVENTOS_DIFERIDOS', 200)
+
+# Control de duplicados: eventos procesados retenidos en memoria
+DEDUP_MAX_EVENTOS = _leer_entero('DEDUP_MAX_EVENTOS', 10000)
+DEDUP_VENTANA_SEGUNDOS = _leer_entero('DEDUP_VENTANA_SEGUNDOS', 86400)
+
+# Lecturas repetidas de un mismo vehículo: segundos máximos entre lecturas del mismo
+# paso (0 = cada lectura es un evento) y caracteres distintos tolerados entre ellas
+SESION_VENTANA = _leer_decimal('SESION_VENTANA', 15)
+SESION_DISTANCIA_MAXIMA = _leer_entero('SESION_DISTANCIA_MAXIMA', 0)
+
+# Historial persistente de detecciones (SQLite en modo WAL)
+HISTORIAL_ACTIVO = _leer_bool('HISTORIAL_ACTIVO', '1')
+ARCHIVO_HISTORIAL = os.getenv('ARCHIVO_HISTORIAL', 'historial_placas.db')
+# Detecciones máximas por transacción y segundos máximos antes de escribir un lote
+HISTORIAL_LOTE = _leer_entero('HISTORIAL_LOTE', 100)
+HISTORIAL_INTERVALO = _leer_decimal('HISTORIAL_INTERVALO', 0.5)
+
+# Servidor HTTP local con la última detección, el historial y el stream SSE
+HTTP_ACTIVO = _leer_bool('HTTP_ACTIVO', '1')
+# Por defecto solo escucha en este equipo: las respuestas incluyen datos de clientes
+HTTP_HOST = os.getenv('HTTP_HOST', '127.0.0.1')
+HTTP_PUERTO = _leer_entero('HTTP_PUERTO', 8080)
+# Orígenes web (p. ej. http://pantalla-recepcion:3000) a los que se permite leer
+# la API desde un navegador, separados por comas. Vacío = sin CORS
+HTTP_ORIGENES = [o.strip().rstrip('/') for o in os.getenv('HTTP_ORIGENES', '').split(',') if o.strip()]
+
+# Métricas de rendimiento (/metrics y /api/metricas) e instantánea JSON periódica (vacío = desactivada)
+METRICAS_ACTIVO = _leer_bool('METRICAS_ACTIVO', '1')
+METRICAS_JSON = os.getenv('METRICAS_JSON', '').strip()
+METRICAS_INTERVALO = _leer_decimal('METRICAS_INTERVALO', 60)
+# Perfilador por muestreo (también se activa en tiempo de ejecución con POST /api/perfilador/iniciar)
+PERFILADOR_ACTIVO = _leer_bool('PERFILADOR_ACTIVO', '0')
+PERFILADOR_INTERVALO = _leer_decimal('PERFILADOR_INTERVALO', 0.005)
+# Token para usar el perfilador desde otros equipos (Authorization: Bearer <token>);
+# vacío = solo desde este equipo
+PERFILADOR_TOKEN = os.getenv('PERFILADOR_TOKEN', '')
 
 # Configuración de la API de citas
 URL_CITAS = os.getenv('URL_CITAS')
 NO_CIA = os.getenv('NO_CIA')
 AGENCIA = os.getenv('AGENCIA')
 
-# XML con fecha de inicio para filtrar eventos, no necesario
-BODY_XML = """
+# Protección de la API de citas: circuito, timeout adaptativo y reintentos
+CITAS_TIMEOUT_MIN = _leer_decimal('CITAS_TIMEOUT_MIN', 1)
+CITAS_TIMEOUT_MAX = _leer_decimal('CITAS_TIMEOUT_MAX', 10)
+CITAS_TIMEOUT_PERCENTIL = _leer_decimal('CITAS_TIMEOUT_PERCENTIL', 95)
+CITAS_REINTENTOS = _leer_entero('CITAS_REINTENTOS', 2)
+CITAS_PRESUPUESTO_REINTENTOS = _leer_decimal('CITAS_PRESUPUESTO_REINTENTOS', 0.2)
+CIRCUITO_FALLOS = _leer_entero('CIRCUITO_FALLOS', 5)
+CIRCUITO_ESPERA = _leer_decimal('CIRCUITO_ESPERA', 30)
+
+# Caché de consultas de citas (segundos de vida; 0 desactiva)
+CACHE_CITAS_TTL = _leer_decimal('CACHE_CITAS_TTL', 120)
+CACHE_CITAS_TTL_NEGATIVO = _leer_decimal('CACHE_CITAS_TTL_NEGATIVO', 30)
+CACHE_CITAS_MAX = _leer_entero('CACHE_CITAS_MAX', 1000)
+
+# Precarga de la agenda diaria de la agencia (vacío desactiva la precarga)
+URL_CITAS_DIA = os.getenv('URL_CITAS_DIA', '').strip()
+PREFETCH_INTERVALO = _leer_decimal('PREFETCH_INTERVALO', 300)
+
+# Coincidencia aproximada de placas contra la agenda precargada
+COINCIDENCIA_DISTANCIA_MAXIMA = _leer_entero('COINCIDENCIA_DISTANCIA_MAXIMA', 1)
+COINCIDENCIA_PUNTAJE_MINIMO = _leer_decimal('COINCIDENCIA_PUNTAJE_MINIMO', 0.8)
+
+# XML con fecha de inicio para filtrar eventos (AfterTime)
+BODY_XML_PLANTILLA = """
 <AfterTime>
-    <picTime>20250415T000000-500</picTime>
+    <picTime>{pic_time}</picTime>
 </AfterTime>
 """
 
+# Fecha inicial usada cuando todavía no existe un cursor de captura
+FECHA_INICIO_CONSULTA = os.getenv('FECHA_INICIO_CONSULTA', '20250415T000000-500')
+BODY_XML = BODY_XML_PLANTILLA.format(pic_time=FECHA_INICIO_CONSULTA)
+
 # Encabezados HTTP para las solicitudes a la API de la cámara
 HEADERS = {
     "Content-Type": "application/xml",
     "Accept": "application/xml"
 }
+
+def validar_configuracion():
+    """
+    Revisa la configuración cargada del entorno.
+
+    Los valores numéricos que no se pudieron convertir ya se reemplazaron por
+    su valor por defecto; aquí se informan junto con las combinaciones que
+    impedirían funcionar al sistema.
+
+    Returns:
+        list: Mensajes con los problemas encontrados (vacía si todo es válido)
+    """
+    problemas = list(_errores)
+    if not URL and not any(datos["url"] for datos in CAMARAS):
+        problemas.append("No hay cámaras configuradas (CAMARAS o CAMERA_URL)")
+    if not URL_CITAS:
+        problemas.append("URL_CITAS no está configurada; no se podrán consultar citas")
+    opciones = (
+        ('MODO_MONITOR', MODO_MONITOR, ('hilos', 'asyncio', 'procesos')),
+        ('MODO_INGESTA', MODO_INGESTA, ('sondeo', 'stream', 'alarma')),
+    )
+    for nombre, valor, validos in opciones:
+        if valor not in validos:
+            problemas.append(f"{nombre}={valor!r} no es válido (opciones: {', '.join(validos)})")
+    for nombre, puerto in (('HTTP_PUERTO', HTTP_PUERTO), ('PUERTO_ALARMA', PUERTO_ALARMA),
+                           ('COORDINADOR_PUERTO', COORDINADOR_PUERTO)):
+        if not 0 <= puerto <= 65535:
+            problemas.append(f"{nombre}={puerto} está fuera del rango 0-65535")
+    positivos = (
+        ('CAMARA_TIMEOUT_CONEXION', CAMARA_TIMEOUT_CONEXION),
+        ('CAMARA_TIMEOUT_LECTURA', CAMARA_TIMEOUT_LECTURA),
+        ('SONDEO_INTERVALO_MIN', SONDEO_INTERVALO_MIN),
+        ('CITAS_TIMEOUT_MIN', CITAS_TIMEOUT_MIN),
+        ('HILOS_PROCESAMIENTO', HILOS_PROCESAMIENTO),
+        ('PIPELINE_PARSEADORES', PIPELINE_PARSEADORES),
+        ('PIPELINE_CONSULTAS', PIPELINE_CONSULTAS),
+    )
+    for nombre, valor in positivos:
+        if valor <= 0:
+            problemas.append(f"{nombre} debe ser mayor que 0 (valor actual: {valor:g})")
+    if SONDEO_INTERVALO_MAX < SONDEO_INTERVALO_MIN:
+        problemas.append("SONDEO_INTERVALO_MAX es menor que SONDEO_INTERVALO_MIN")
+    if CITAS_TIMEOUT_MAX < CITAS_TIMEOUT_MIN:
+        problemas.append("CITAS_TIMEOUT_MAX es menor que CITAS_TIMEOUT_MIN")
+    return problemas
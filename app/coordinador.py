@@ -0,0 +1,193 @@
+"""
+Coordinador de procesos trabajadores (MODO_MONITOR=procesos)
+
+En este modo la ingesta de cada cámara (consulta HTTP y análisis del XML)
+corre en un proceso trabajador propio (app/trabajador.py), de modo que varias
+cámaras usan varios núcleos en lugar de compartir el GIL. El proceso principal
+actúa como coordinador y es el único dueño del estado compartido:
+
+- cursor de captura, control de duplicados y pasos de vehículo de cada cámara,
+- caché de citas, agenda y circuito de la API de citas,
+- publicación (consola, historial, API HTTP).
+
+Los trabajadores se conectan por multiprocessing.connection (socket local
+autenticado con COORDINADOR_CLAVE). Cada mensaje lleva las placas de un
+sondeo o de eventos push; el coordinador las procesa por el mismo camino que
+app/monitor.py y responde con el cursor actualizado y la espera hasta el
+siguiente sondeo. Con COORDINADOR_HOST y una clave fija, otros equipos pueden
+conectar sus propios trabajadores (python -m app.trabajador) y compartir el
+mismo caché de citas.
+"""
+
+import multiprocessing
+import os
+import threading
+from multiprocessing.connection import Listener
+
+from app.camaras import crear_camara
+from app.config import COORDINADOR_HOST, COORDINADOR_PUERTO, COORDINADOR_CLAVE
+from app.historial import historial
+from app.metricas import metricas
+from app.monitor import procesar_eventos_recibidos
+from app.supervisor import Supervisor
+from app.trabajador import ejecutar_trabajador
+
+
+class Coordinador:
+    """
+    Recibe las placas de los procesos trabajadores y las procesa.
+
+    Attributes:
+        camaras (list): Cámaras registradas (las remotas se agregan al conectarse)
+        direccion (tuple): (host, puerto) donde escucha el coordinador
+    """
+
+    def __init__(self, camaras, direccion=(COORDINADOR_HOST, COORDINADOR_PUERTO), clave=COORDINADOR_CLAVE):
+        self.camaras = camaras
+        self._clave = clave.encode("utf-8") if clave else os.urandom(32)
+        self._listener = Listener(direccion, authkey=self._clave)
+        self.direccion = self._listener.address
+        self._contexto = multiprocessing.get_context("spawn")
+        self._procesos = {}
+        self._lock = threading.Lock()
+        self._conexiones = 0
+        self._mensajes = 0
+        self._detenido = threading.Event()
+        self.supervisor = Supervisor([camara for camara in camaras if camara.cliente.url], self._ejecutar_proceso)
+
+    def iniciar(self):
+        """
+        Empieza a aceptar trabajadores y arranca uno por cada cámara local.
+
+        Returns:
+            threading.Thread: Hilo del supervisor de procesos
+        """
+        threading.Thread(target=self._aceptar, name="coordinador", daemon=True).start()
+        return self.supervisor.iniciar()
+
+    def detener(self):
+        """Detiene los procesos trabajadores y deja de aceptar conexiones."""
+        self._detenido.set()
+        self.supervisor.detener()
+        with self._lock:
+            procesos = list(self._procesos.values())
+        for proceso in procesos:
+            proceso.terminate()
+        for proceso in procesos:
+            proceso.join(2)
+        self._listener.close()
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: Procesos vivos, trabajadores conectados y mensajes atendidos
+        """
+        with self._lock:
+            return {
+                "procesos": sum(1 for proceso in self._procesos.values() if proceso.is_alive()),
+                "conexiones": self._conexiones,
+                "mensajes": self._mensajes,
+            }
+
+    def _ejecutar_proceso(self, camara):
+        # El supervisor ejecuta esto en un hilo por cámara y lo reinicia si termina
+        proceso = self._contexto.Process(target=ejecutar_trabajador,
+                                         args=(camara.configuracion(), self.direccion, self._clave),
+                                         name=f"trabajador-{camara.nombre}", daemon=True)
+        proceso.start()
+        with self._lock:
+            self._procesos[camara.nombre] = proceso
+        proceso.join()
+        if not self._detenido.is_set():
+            print(f"[{camara.nombre}] El proceso trabajador terminó (código {proceso.exitcode})")
+
+    def _aceptar(self):
+        while not self._detenido.is_set():
+            try:
+                conexion = self._listener.accept()
+            except multiprocessing.AuthenticationError:
+                print("Conexión rechazada: clave de coordinador incorrecta")
+                continue
+            except OSError:
+                if self._detenido.is_set():
+                    return
+                continue
+            host = self._listener.last_accepted[0] if self._listener.last_accepted else "remoto"
+            threading.Thread(target=self._atender, args=(conexion, host), daemon=True).start()
+
+    def _atender(self, conexion, host):
+        camara = None
+        with self._lock:
+            self._conexiones += 1
+        try:
+            while True:
+                mensaje = conexion.recv()
+                tipo = mensaje[0]
+                if tipo == "registrar":
+                    camara = self._registrar(mensaje[1], host)
+                elif tipo == "sondeo":
+                    _, placas, conectado, texto = mensaje
+                    camara.cliente.registrar_estado(conectado, texto)
+                    procesados = procesar_eventos_recibidos(placas, camara) if placas else 0
+                    metricas.incrementar("sondeos")
+                    if not conectado:
+                        metricas.incrementar("sondeos_fallidos")
+                    camara.registrar_sondeo(conectado, procesados)
+                elif tipo == "eventos":
+                    procesar_eventos_recibidos(mensaje[1], camara)
+                with self._lock:
+                    self._mensajes += 1
+                desde = camara.cursor.desde_consulta() if camara.cursor is not None else None
+                conexion.send(("ok", desde, camara.planificador.siguiente_espera()))
+        except (EOFError, OSError):
+            pass
+        except ValueError as e:
+            print(f"Registro de trabajador rechazado: {e}")
+        except Exception as e:
+            print(f"[{camara.nombre if camara else 'trabajador'}] Error al procesar un mensaje del trabajador: {e}")
+        finally:
+            with self._lock:
+                self._conexiones -= 1
+            conexion.close()
+
+    def _registrar(self, datos, host):
+        # Una cámara se identifica por nombre y URL: todas las sucursales usan
+        # "principal" por defecto, y compartir la cámara local mezclaría cursores
+        with self._lock:
+            nombres = {camara.nombre: camara for camara in self.camaras}
+            for nombre in (datos["nombre"], f"{datos['nombre']}@{host}"):
+                existente = nombres.get(nombre)
+                if existente is None:
+                    break
+                if existente.cliente.url == datos["url"]:
+                    return existente
+            else:
+                raise ValueError(f"la cámara '{datos['nombre']}' de {host} ya está registrada con otra URL")
+            # Trabajador remoto con una cámara que este equipo no tiene configurada
+            camara = crear_camara(dict(datos, nombre=nombre))
+            self.camaras.append(camara)
+        if historial is not None:
+            historial.restaurar(camara)
+        metricas.registrar_indicadores(f"camara_{camara.nombre}", camara.estadisticas)
+        print(f"[{camara.nombre}] Cámara remota registrada por un trabajador")
+        return camara
+
+
+def iniciar_coordinador(camaras):
+    """
+    Inicia el coordinador y los procesos trabajadores de las cámaras locales.
+
+    Args:
+        camaras (list): Cámaras registradas
+
+    Returns:
+        Coordinador: Coordinador iniciado, o None si no se pudo abrir su puerto
+    """
+    try:
+        coordinador = Coordinador(camaras)
+    except OSError as e:
+        print(f"No se pudo iniciar el coordinador en el puerto {COORDINADOR_PUERTO}: {e}")
+        return None
+    coordinador.iniciar()
+    metricas.registrar_indicadores("coordinador", coordinador.estadisticas)
+    return coordinador
@@ -0,0 +1,182 @@
+"""
+Módulo del cursor de captura para la consulta incremental de placas
+
+El cursor guarda el captureTime más reciente ya procesado para que cada
+consulta a la cámara solicite únicamente los eventos posteriores (AfterTime),
+en lugar de descargar todo el historial desde la fecha fija de BODY_XML.
+
+Como la cámara trabaja con resolución de segundos, el cursor también recuerda
+las placas ya procesadas en ese mismo segundo. La consulta se envía un segundo
+antes del cursor (así no importa si la cámara trata AfterTime como inclusivo o
+exclusivo) y luego se descartan las placas ya cubiertas, de modo que ningún
+evento se pierde ni se procesa dos veces en el límite.
+
+El cursor se mantiene en memoria y se persiste en disco (JSON) para sobrevivir
+a reinicios del sistema.
+"""
+
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+
+class CursorCaptura:
+    """
+    Cursor persistente con el último captureTime procesado.
+
+    Attributes:
+        ruta (str): Archivo JSON donde se persiste el cursor (None = solo memoria)
+        fecha (datetime): captureTime más reciente procesado o None
+        placas_limite (set): Placas ya procesadas en el segundo de 'fecha'
+    """
+
+    def __init__(self, ruta=None):
+        self.ruta = ruta
+        self.fecha = None
+        self.placas_limite = set()
+        self._lock = threading.Lock()
+        self.cargar()
+
+    def cargar(self):
+        """
+        Carga el cursor desde disco. Si el archivo no existe o está dañado,
+        el cursor queda vacío y se usará la fecha inicial de BODY_XML.
+
+        Returns:
+            bool: True si se cargó un cursor válido
+        """
+        if not self.ruta or not os.path.exists(self.ruta):
+            return False
+        try:
+            with open(self.ruta, "r", encoding="utf-8") as archivo:
+                datos = json.load(archivo)
+            fecha = datetime.fromisoformat(datos["fecha"])
+            placas = set(datos.get("placas", []))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Cursor de captura inválido, se ignora: {e}")
+            return False
+        with self._lock:
+            self.fecha = fecha
+            self.placas_limite = placas
+        return True
+
+    def guardar(self):
+        """
+        Persiste el cursor en disco de forma atómica (archivo temporal + replace).
+
+        Returns:
+            None
+        """
+        if not self.ruta:
+            return
+        with self._lock:
+            if self.fecha is None:
+                return
+            datos = {"fecha": self.fecha.isoformat(), "placas": sorted(self.placas_limite)}
+        temporal = f"{self.ruta}.tmp"
+        try:
+            with open(temporal, "w", encoding="utf-8") as archivo:
+                json.dump(datos, archivo)
+            os.replace(temporal, self.ruta)
+        except OSError as e:
+            print(f"No se pudo guardar el cursor de captura: {e}")
+
+    def obtener(self):
+        """
+        Returns:
+            datetime: Fecha del cursor o None si aún no hay eventos procesados
+        """
+        with self._lock:
+            return self.fecha
+
+    def desde_consulta(self):
+        """
+        Fecha a enviar como AfterTime en la siguiente consulta.
+
+        Returns:
+            datetime: Un segundo antes del cursor o None si no hay cursor
+        """
+        with self._lock:
+            if self.fecha is None:
+                return None
+            return self.fecha - timedelta(seconds=1)
+
+    def es_nuevo(self, placa, fecha):
+        """
+        Indica si un evento es posterior al cursor.
+
+        Los eventos del mismo segundo que el cursor solo son nuevos si su placa
+        no fue procesada todavía en ese segundo.
+
+        Args:
+            placa (str): Placa ya limpia
+            fecha (datetime): captureTime del evento
+
+        Returns:
+            bool: True si el evento no ha sido cubierto por el cursor
+        """
+        with self._lock:
+            if self.fecha is None or fecha > self.fecha:
+                return True
+            if fecha < self.fecha:
+                return False
+            return placa not in self.placas_limite
+
+    def filtrar_nuevos(self, placas):
+        """
+        Filtra una lista de eventos dejando solo los posteriores al cursor.
+
+        Args:
+            placas (list): Diccionarios con 'placa' y 'fecha'
+
+        Returns:
+            list: Eventos no cubiertos por el cursor, en el mismo orden
+        """
+        return [p for p in placas if self.es_nuevo(p["placa"], p["fecha"])]
+
+    def avanzar(self, placa, fecha, guardar=True):
+        """
+        Avanza el cursor tras procesar un evento.
+
+        Args:
+            placa (str): Placa procesada
+            fecha (datetime): captureTime del evento procesado
+            guardar (bool): Persistir inmediatamente en disco
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if self.fecha is None or fecha > self.fecha:
+                self.fecha = fecha
+                self.placas_limite = {placa}
+            elif fecha == self.fecha:
+                self.placas_limite.add(placa)
+            else:
+                return
+        if guardar:
+            self.guardar()
+
+
+def formatear_pic_time(fecha):
+    """
+    Formatea una fecha con el formato picTime que usa la cámara Hikvision.
+
+    La cámara expresa la zona horaria como "-500" (horas*100 + minutos, sin
+    relleno), igual que en BODY_XML.
+
+    Args:
+        fecha (datetime): Fecha con o sin zona horaria
+
+    Returns:
+        str: Fecha en formato "YYYYMMDDTHHMMSS-500"
+    """
+    texto = fecha.strftime("%Y%m%dT%H%M%S")
+    desfase = fecha.utcoffset()
+    if desfase is None:
+        return texto
+    minutos = int(desfase.total_seconds() // 60)
+    signo = "-" if minutos < 0 else "+"
+    minutos = abs(minutos)
+    return f"{texto}{signo}{(minutos // 60) * 100 + minutos % 60}"
@@ -0,0 +1,117 @@
+"""
+Módulo de control de duplicados con memoria acotada
+
+Reemplaza al conjunto que crecía sin límite con los eventos ya procesados.
+Los eventos se identifican con la tupla compacta (placa, segundos epoch) y se
+guardan en un OrderedDict que funciona como anillo: las búsquedas e inserciones
+son O(1) y los eventos más antiguos se descartan por tamaño máximo y por
+antigüedad respecto al captureTime más reciente visto.
+
+Un captureTime adelantado respecto al reloj del equipo (p. ej. una lectura con
+la fecha mal formada) se registra pero no mueve la ventana: de lo contrario
+todas las placas reales quedarían fuera de ella y se tratarían como ya
+procesadas.
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+class RegistroEventos:
+    """
+    Registro acotado de eventos procesados.
+
+    Un evento cuyo captureTime es anterior a la ventana de retención se
+    considera procesado, ya que su identificador pudo haber sido descartado.
+
+    Attributes:
+        max_eventos (int): Cantidad máxima de eventos retenidos
+        ventana_segundos (int): Antigüedad máxima retenida respecto al evento más reciente
+        tolerancia_futuro (int): Segundos que un captureTime puede adelantarse al
+                                 reloj del equipo y aún mover la ventana
+    """
+
+    def __init__(self, max_eventos=10000, ventana_segundos=86400, tolerancia_futuro=300):
+        self.max_eventos = max_eventos
+        self.ventana_segundos = ventana_segundos
+        self.tolerancia_futuro = tolerancia_futuro
+        self._eventos = OrderedDict()
+        self._mas_reciente = None
+        self._lock = threading.Lock()
+        self._descartados_tamano = 0
+        self._descartados_ventana = 0
+
+    def __contains__(self, id_evento):
+        with self._lock:
+            if id_evento in self._eventos:
+                return True
+            return self._fuera_de_ventana(id_evento[1])
+
+    def __len__(self):
+        with self._lock:
+            return len(self._eventos)
+
+    def add(self, id_evento):
+        """
+        Registra un evento como procesado.
+
+        Args:
+            id_evento (tuple): (placa, segundos epoch) creado con crear_id_evento_exacto
+
+        Returns:
+            None
+        """
+        epoch = id_evento[1]
+        with self._lock:
+            if ((self._mas_reciente is None or epoch > self._mas_reciente)
+                    and epoch <= time.time() + self.tolerancia_futuro):
+                self._mas_reciente = epoch
+            self._eventos[id_evento] = None
+            self._eventos.move_to_end(id_evento)
+            self._depurar()
+
+    def clear(self):
+        """Elimina todos los eventos registrados."""
+        with self._lock:
+            self._eventos.clear()
+            self._mas_reciente = None
+
+    def estadisticas(self):
+        """
+        Estado del registro y memoria aproximada que ocupa.
+
+        Returns:
+            dict: Eventos retenidos, capacidad, descartes y bytes estimados
+        """
+        with self._lock:
+            cantidad = len(self._eventos)
+            bytes_estimados = sys.getsizeof(self._eventos)
+            if cantidad:
+                muestra = next(iter(self._eventos))
+                bytes_estimados += cantidad * (sys.getsizeof(muestra) + sys.getsizeof(muestra[0])
+                                               + sys.getsizeof(muestra[1]))
+            return {
+                "eventos": cantidad,
+                "max_eventos": self.max_eventos,
+                "ventana_segundos": self.ventana_segundos,
+                "descartados_tamano": self._descartados_tamano,
+                "descartados_ventana": self._descartados_ventana,
+                "bytes_estimados": bytes_estimados,
+            }
+
+    def _fuera_de_ventana(self, epoch):
+        return (self._mas_reciente is not None
+                and epoch < self._mas_reciente - self.ventana_segundos)
+
+    def _depurar(self):
+        while self._eventos:
+            id_evento = next(iter(self._eventos))
+            if not self._fuera_de_ventana(id_evento[1]):
+                break
+            self._eventos.popitem(last=False)
+            self._descartados_ventana += 1
+        while len(self._eventos) > self.max_eventos:
+            self._eventos.popitem(last=False)
+            self._descartados_tamano += 1
@@ -0,0 +1,244 @@
+"""
+Módulo de ingesta por eventos (push) de la cámara Hikvision
+
+En lugar de consultar la lista de placas cada INTERVALO_CONSULTA segundos, la
+cámara puede avisar de cada lectura ANPR en cuanto ocurre. Se admiten dos
+formas:
+
+1. Alert stream: conexión HTTP de larga duración a
+   /ISAPI/Event/notification/alertStream, donde la cámara envía un documento
+   EventNotificationAlert (multipart) por cada evento.
+2. Servidor de alarmas: la cámara hace POST de cada evento a un servidor HTTP
+   local configurado como "alarm server" (HTTP listening) en la cámara.
+
+Los eventos ANPR se convierten al mismo formato que get_plates()
+({'placa', 'fecha', 'país'}) y se entregan a una función de procesamiento, de
+modo que siguen el mismo camino que los eventos obtenidos por sondeo.
+"""
+
+import threading
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import requests
+from requests.auth import HTTPDigestAuth
+
+from app.camera import limpiar_placa
+
+_INICIO_ALERTA = b"<EventNotificationAlert"
+_FIN_ALERTA = b"</EventNotificationAlert>"
+
+# Tipos de evento de la cámara que contienen una lectura de placa
+TIPOS_EVENTO_ANPR = ("ANPR", "vehicleDetection")
+
+
+def url_alert_stream(url_camara):
+    """
+    Deriva la URL del alert stream a partir de la URL de placas de la cámara.
+
+    Args:
+        url_camara (str): URL ISAPI de placas (CAMERA_URL)
+
+    Returns:
+        str: URL de /ISAPI/Event/notification/alertStream en el mismo host
+    """
+    partes = urlsplit(url_camara)
+    return f"{partes.scheme}://{partes.netloc}/ISAPI/Event/notification/alertStream"
+
+
+def extraer_alertas(buffer):
+    """
+    Extrae los documentos EventNotificationAlert completos de un buffer.
+
+    No depende de los delimitadores multipart: busca directamente las etiquetas
+    de apertura y cierre, por lo que también funciona con cuerpos POST o partes
+    con imágenes adjuntas.
+
+    Args:
+        buffer (bytes): Datos acumulados del stream
+
+    Returns:
+        tuple: (list de documentos XML en bytes, bytes restantes sin procesar)
+    """
+    documentos = []
+    while True:
+        inicio = buffer.find(_INICIO_ALERTA)
+        if inicio < 0:
+            # Se conserva el final por si la etiqueta de apertura quedó partida
+            return documentos, buffer[-len(_INICIO_ALERTA):]
+        fin = buffer.find(_FIN_ALERTA, inicio)
+        if fin < 0:
+            return documentos, buffer[inicio:]
+        fin += len(_FIN_ALERTA)
+        documentos.append(buffer[inicio:fin])
+        buffer = buffer[fin:]
+
+
+def _nombre_local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def parsear_alerta(documento):
+    """
+    Convierte un EventNotificationAlert ANPR en un evento de placa.
+
+    Args:
+        documento (bytes): XML EventNotificationAlert
+
+    Returns:
+        dict: Evento con 'placa', 'fecha' y 'país', o None si el documento no
+              es una lectura de placa válida (p. ej. latidos "videoloss")
+    """
+    try:
+        raiz = ET.fromstring(documento)
+    except ET.ParseError:
+        return None
+    campos = {}
+    for elemento in raiz.iter():
+        nombre = _nombre_local(elemento.tag)
+        if nombre not in campos and elemento.text:
+            campos[nombre] = elemento.text.strip()
+
+    if campos.get("eventType") not in TIPOS_EVENTO_ANPR:
+        return None
+    placa = limpiar_placa(campos.get("licensePlate") or campos.get("plateNumber"))
+    texto_fecha = campos.get("dateTime") or campos.get("captureTime")
+    if not placa or not texto_fecha:
+        return None
+    try:
+        fecha = datetime.fromisoformat(texto_fecha.replace("Z", "+00:00"))
+    except ValueError:
+        try:
+            fecha = datetime.strptime(texto_fecha.replace("-500", "-0500"), "%Y%m%dT%H%M%S%z")
+        except ValueError:
+            return None
+    if fecha.tzinfo is None:
+        fecha = fecha.astimezone()
+    return {"placa": placa, "fecha": fecha.replace(microsecond=0), "país": campos.get("country")}
+
+
+def _leer_bloques(response, tamano=8192):
+    """
+    Itera los datos del stream a medida que llegan.
+
+    iter_content() espera a completar cada bloque (o hasta el fin de la
+    respuesta si no es chunked), lo que retrasaría los eventos pequeños; por eso
+    se usa read1() de la respuesta http.client subyacente cuando está disponible.
+    """
+    fp = getattr(response.raw, "_fp", None)
+    if fp is None or not hasattr(fp, "read1"):
+        yield from response.iter_content(chunk_size=None)
+        return
+    while True:
+        bloque = fp.read1(tamano)
+        if not bloque:
+            return
+        yield bloque
+
+
+def consumir_alert_stream(url, usuario, clave, procesar, al_conectar=None, detener=None,
+                          timeout_conexion=3, timeout_lectura=60):
+    """
+    Consume el alert stream de la cámara hasta que se corta.
+
+    Args:
+        url (str): URL del alert stream
+        usuario (str): Usuario de la cámara
+        clave (str): Contraseña de la cámara
+        procesar (callable): Recibe una lista de eventos de placa
+        al_conectar (callable): Se llama una vez establecida la conexión
+        detener (threading.Event): Permite terminar el consumo desde otro hilo
+        timeout_conexion (float): Segundos para conectar
+        timeout_lectura (float): Segundos máximos sin recibir datos (la cámara
+                                 envía latidos periódicos)
+
+    Returns:
+        str: Motivo por el que terminó el stream
+    """
+    sesion = requests.Session()
+    sesion.auth = HTTPDigestAuth(usuario, clave)
+    try:
+        with sesion.get(url, stream=True, timeout=(timeout_conexion, timeout_lectura)) as response:
+            response.raise_for_status()
+            if al_conectar is not None:
+                al_conectar()
+            buffer = b""
+            for bloque in _leer_bloques(response):
+                if detener is not None and detener.is_set():
+                    return "Stream detenido"
+                buffer += bloque
+                documentos, buffer = extraer_alertas(buffer)
+                eventos = [e for e in (parsear_alerta(d) for d in documentos) if e is not None]
+                if eventos:
+                    procesar(eventos)
+        return "La cámara cerró el stream de eventos"
+    except (requests.exceptions.RequestException, OSError) as e:
+        return f"Error en el stream de eventos: {e}"
+    finally:
+        sesion.close()
+
+
+class _ManejadorAlarmas(BaseHTTPRequestHandler):
+    """Recibe los POST del servidor de alarmas y entrega los eventos ANPR."""
+
+    def do_POST(self):
+        longitud = int(self.headers.get("Content-Length") or 0)
+        cuerpo = self.rfile.read(longitud) if longitud else b""
+        self.server.ultimo_mensaje = time.monotonic()
+        documentos, _ = extraer_alertas(cuerpo)
+        eventos = [e for e in (parsear_alerta(d) for d in documentos) if e is not None]
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+        if eventos:
+            try:
+                self.server.procesar(eventos)
+            except Exception as e:
+                print(f"Error al procesar evento de alarma: {e}")
+
+    def log_message(self, formato, *args):
+        pass
+
+
+class ServidorAlarmas(ThreadingHTTPServer):
+    """
+    Servidor HTTP local que recibe los eventos enviados por la cámara.
+
+    Attributes:
+        procesar (callable): Recibe una lista de eventos de placa
+        ultimo_mensaje (float): time.monotonic() del último POST recibido
+    """
+
+    daemon_threads = True
+
+    def __init__(self, direccion, procesar):
+        super().__init__(direccion, _ManejadorAlarmas)
+        self.procesar = procesar
+        self.ultimo_mensaje = None
+
+    def iniciar(self):
+        """
+        Atiende las solicitudes en un hilo daemon.
+
+        Returns:
+            threading.Thread: Hilo del servidor
+        """
+        hilo = threading.Thread(target=self.serve_forever, daemon=True)
+        hilo.start()
+        return hilo
+
+    def activo(self, tolerancia):
+        """
+        Indica si la cámara envió algún mensaje en los últimos 'tolerancia' segundos.
+
+        Args:
+            tolerancia (float): Segundos máximos sin mensajes
+
+        Returns:
+            bool: True si hubo mensajes recientes
+        """
+        return (self.ultimo_mensaje is not None
+                and time.monotonic() - self.ultimo_mensaje <= tolerancia)
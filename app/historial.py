@@ -0,0 +1,346 @@
+"""
+Historial persistente de detecciones
+
+Guarda cada detección publicada (placa, cámara, captureTime y resultado de la
+cita) en una base SQLite en modo WAL, de modo que el historial sobrevive a los
+reinicios del sistema.
+
+- Las escrituras no bloquean la publicación: las detecciones se encolan y un
+  hilo escritor las guarda en lotes (HISTORIAL_LOTE detecciones o
+  HISTORIAL_INTERVALO segundos por transacción).
+- Los índices (placa, fecha) y (camara, fecha) permiten restaurar el control
+  de duplicados y el cursor de cada cámara al arrancar con una sola consulta,
+  sin volver a procesar ni consultar citas de placas ya vistas.
+- consultar() ofrece el historial reciente con filtros y paginación.
+- El id de cada fila es el número de secuencia de la detección en el almacén
+  (el mismo de /api/ultima y del stream SSE); al arrancar, el almacén continúa
+  la numeración desde el último id guardado.
+- Las actualizaciones de una detección ya guardada (cita completada, cierre de
+  su paso de vehículo) modifican su fila (camara, placa, fecha) en lugar de
+  agregar otra.
+"""
+
+import json
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from app.config import HISTORIAL_ACTIVO, ARCHIVO_HISTORIAL, HISTORIAL_LOTE, HISTORIAL_INTERVALO
+from app.metricas import metricas
+from app.state import crear_id_evento_exacto, almacen_detecciones
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS detecciones (
+    id INTEGER PRIMARY KEY,
+    camara TEXT,
+    placa TEXT NOT NULL,
+    fecha INTEGER NOT NULL,
+    fecha_texto TEXT NOT NULL,
+    tiene_cita INTEGER NOT NULL,
+    mensaje TEXT,
+    coincidencia TEXT,
+    placa_cita TEXT,
+    puntaje REAL,
+    datos_cita TEXT,
+    registrado REAL NOT NULL,
+    ultima_lectura TEXT,
+    lecturas INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_detecciones_placa_fecha ON detecciones (placa, fecha);
+CREATE INDEX IF NOT EXISTS idx_detecciones_camara_fecha ON detecciones (camara, fecha);
+"""
+
+_COLUMNAS = ("id", "camara", "placa", "fecha_texto", "tiene_cita", "mensaje", "coincidencia",
+             "placa_cita", "puntaje", "datos_cita", "registrado", "ultima_lectura", "lecturas")
+
+# Columnas agregadas después de la primera versión del esquema
+_COLUMNAS_NUEVAS = {
+    "ultima_lectura": "TEXT",
+    "lecturas": "INTEGER NOT NULL DEFAULT 1",
+}
+
+# Marca que indica al hilo escritor que debe terminar
+_FIN = object()
+
+
+class HistorialDetecciones:
+    """
+    Historial de detecciones en SQLite con escritura por lotes.
+
+    Attributes:
+        ruta (str): Archivo de la base de datos
+        lote (int): Detecciones máximas por transacción
+        intervalo (float): Segundos máximos que una detección espera a ser escrita
+    """
+
+    def __init__(self, ruta, lote=HISTORIAL_LOTE, intervalo=HISTORIAL_INTERVALO):
+        self.ruta = ruta
+        self.lote = lote
+        self.intervalo = intervalo
+        self._pendientes = queue.Queue()
+        self._local = threading.local()
+        self._hilo = None
+        self._cancelar_suscripcion = None
+        self._escritas = 0
+        self._lotes = 0
+        self._errores = 0
+
+    def abrir(self):
+        """
+        Crea la base de datos y sus índices si no existen.
+
+        Returns:
+            None
+        """
+        conexion = self._conexion()
+        conexion.executescript(_ESQUEMA)
+        existentes = {fila[1] for fila in conexion.execute("PRAGMA table_info(detecciones)")}
+        for columna, tipo in _COLUMNAS_NUEVAS.items():
+            if columna not in existentes:
+                conexion.execute(f"ALTER TABLE detecciones ADD COLUMN {columna} {tipo}")
+        conexion.commit()
+
+    def iniciar(self):
+        """
+        Arranca el hilo escritor y se suscribe a las detecciones publicadas.
+
+        Returns:
+            threading.Thread: Hilo escritor
+        """
+        self.abrir()
+        if self._hilo is None or not self._hilo.is_alive():
+            self._hilo = threading.Thread(target=self._escribir, name="historial", daemon=True)
+            self._hilo.start()
+        if self._cancelar_suscripcion is None:
+            self._cancelar_suscripcion = almacen_detecciones.suscribir(self.registrar)
+        return self._hilo
+
+    def cerrar(self, timeout=5):
+        """
+        Escribe las detecciones pendientes y detiene el hilo escritor.
+
+        Args:
+            timeout (float): Segundos máximos de espera
+
+        Returns:
+            None
+        """
+        if self._cancelar_suscripcion is not None:
+            self._cancelar_suscripcion()
+            self._cancelar_suscripcion = None
+        if self._hilo is not None:
+            self._pendientes.put(_FIN)
+            self._hilo.join(timeout)
+            self._hilo = None
+
+    def registrar(self, deteccion):
+        """
+        Encola una detección para guardarla en el siguiente lote.
+
+        Args:
+            deteccion (Deteccion): Detección publicada
+
+        Returns:
+            None
+        """
+        self._pendientes.put(deteccion)
+
+    def restaurar(self, camara):
+        """
+        Restaura el control de duplicados y el cursor de una cámara desde el historial.
+
+        Se cargan los eventos de la ventana de retención del registro (como
+        máximo max_eventos) y, si el historial es más reciente que el cursor
+        guardado, el cursor avanza hasta la última detección registrada (o
+        hasta la última lectura de su paso, ver app/sesiones.py).
+
+        Args:
+            camara (Camara): Cámara a restaurar
+
+        Returns:
+            int: Eventos cargados en el registro de duplicados
+        """
+        conexion = self._conexion()
+        fila = conexion.execute("SELECT MAX(fecha) FROM detecciones WHERE camara = ?",
+                                (camara.nombre,)).fetchone()
+        if fila is None or fila[0] is None:
+            return 0
+        ultima = fila[0]
+        registro = camara.registro
+        filas = conexion.execute(
+            "SELECT placa, fecha, fecha_texto, ultima_lectura FROM detecciones WHERE camara = ? AND fecha >= ? "
+            "ORDER BY fecha DESC LIMIT ?",
+            (camara.nombre, ultima - registro.ventana_segundos, registro.max_eventos)).fetchall()
+        for placa, fecha, _, _ in reversed(filas):
+            registro.add((placa, fecha))
+
+        if camara.cursor is not None:
+            for placa, fecha, fecha_texto, ultima_lectura in filas:
+                if fecha == ultima:
+                    camara.cursor.avanzar(placa, datetime.fromisoformat(fecha_texto), guardar=False)
+                if ultima_lectura and ultima_lectura != fecha_texto:
+                    camara.cursor.avanzar(placa, datetime.fromisoformat(ultima_lectura), guardar=False)
+            camara.cursor.guardar()
+        return len(filas)
+
+    def ultimo_id(self):
+        """
+        Returns:
+            int: Mayor id guardado (0 si el historial está vacío)
+        """
+        fila = self._conexion().execute("SELECT MAX(id) FROM detecciones").fetchone()
+        return fila[0] or 0
+
+    def consultar(self, limite=50, antes_de=None, camara=None, placa=None, desde=None, hasta=None,
+                  despues_de=None):
+        """
+        Consulta el historial, de la detección más reciente a la más antigua.
+
+        Args:
+            limite (int): Cantidad máxima de detecciones
+            antes_de (int): Solo detecciones con id menor (paginación: id de la
+                            última detección de la página anterior)
+            despues_de (int): Solo detecciones con id mayor
+            camara (str): Filtrar por cámara
+            placa (str): Filtrar por placa
+            desde (datetime): captureTime mínimo
+            hasta (datetime): captureTime máximo
+
+        Returns:
+            list: Diccionarios con los datos de cada detección
+        """
+        condiciones = []
+        parametros = []
+        for condicion, valor in (("id < ?", antes_de), ("id > ?", despues_de), ("camara = ?", camara),
+                                 ("placa = ?", placa),
+                                 ("fecha >= ?", int(desde.timestamp()) if desde else None),
+                                 ("fecha <= ?", int(hasta.timestamp()) if hasta else None)):
+            if valor is not None:
+                condiciones.append(condicion)
+                parametros.append(valor)
+        sql = f"SELECT {', '.join(_COLUMNAS)} FROM detecciones"
+        if condiciones:
+            sql += " WHERE " + " AND ".join(condiciones)
+        sql += " ORDER BY id DESC LIMIT ?"
+        parametros.append(limite)
+
+        resultados = []
+        for fila in self._conexion().execute(sql, parametros):
+            datos = dict(zip(_COLUMNAS, fila))
+            datos["fecha"] = datos.pop("fecha_texto")
+            datos["tiene_cita"] = bool(datos["tiene_cita"])
+            datos["datos_cita"] = json.loads(datos["datos_cita"]) if datos["datos_cita"] else None
+            datos["actualizado"] = datetime.fromtimestamp(datos.pop("registrado")).isoformat(timespec="seconds")
+            datos["ultima_lectura"] = datos["ultima_lectura"] or datos["fecha"]
+            resultados.append(datos)
+        return resultados
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: Detecciones escritas, lotes, errores y pendientes de escribir
+        """
+        return {
+            "escritas": self._escritas,
+            "lotes": self._lotes,
+            "errores": self._errores,
+            "pendientes": self._pendientes.qsize(),
+        }
+
+    def _conexion(self):
+        # sqlite3 no comparte conexiones entre hilos: cada hilo abre la suya
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexion = conexion
+        return conexion
+
+    def _escribir(self):
+        conexion = self._conexion()
+        terminar = False
+        while not terminar:
+            lote = [self._pendientes.get()]
+            limite = time.monotonic() + self.intervalo
+            while len(lote) < self.lote:
+                restante = limite - time.monotonic()
+                try:
+                    lote.append(self._pendientes.get(timeout=restante) if restante > 0
+                                else self._pendientes.get_nowait())
+                except queue.Empty:
+                    break
+            if _FIN in lote:
+                terminar = True
+                lote = [d for d in lote if d is not _FIN]
+            if lote:
+                self._guardar_lote(conexion, lote)
+        conexion.close()
+        self._local.conexion = None
+
+    def _guardar_lote(self, conexion, lote):
+        nuevas = []
+        actualizadas = []
+        for deteccion in lote:
+            fecha = crear_id_evento_exacto(deteccion.placa, deteccion.fecha)[1]
+            datos = (int(deteccion.tiene_cita), deteccion.mensaje, deteccion.coincidencia, deteccion.placa_cita,
+                     deteccion.puntaje,
+                     json.dumps(deteccion.datos_cita, ensure_ascii=False) if deteccion.datos_cita else None,
+                     deteccion.actualizado.timestamp(), deteccion.ultima_lectura.isoformat(), deteccion.lecturas)
+            if deteccion.revision:
+                # Actualización de una detección ya guardada (cita completada, cierre del paso)
+                actualizadas.append(datos + (deteccion.camara, deteccion.placa, fecha))
+            else:
+                nuevas.append((deteccion.secuencia, deteccion.camara, deteccion.placa, fecha,
+                               deteccion.fecha.isoformat()) + datos)
+        try:
+            with conexion:
+                conexion.executemany(
+                    "INSERT INTO detecciones (id, camara, placa, fecha, fecha_texto, tiene_cita, mensaje, "
+                    "coincidencia, placa_cita, puntaje, datos_cita, registrado, ultima_lectura, lecturas) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", nuevas)
+                conexion.executemany(
+                    "UPDATE detecciones SET tiene_cita = ?, mensaje = ?, coincidencia = ?, placa_cita = ?, "
+                    "puntaje = ?, datos_cita = ?, registrado = ?, ultima_lectura = ?, lecturas = ? "
+                    "WHERE camara IS ? AND placa = ? AND fecha = ?", actualizadas)
+            self._escritas += len(lote)
+            self._lotes += 1
+        except sqlite3.Error as e:
+            self._errores += 1
+            print(f"No se pudo guardar el historial de detecciones: {e}")
+
+
+# Historial compartido (None si HISTORIAL_ACTIVO está desactivado)
+historial = HistorialDetecciones(ARCHIVO_HISTORIAL) if HISTORIAL_ACTIVO else None
+
+
+def iniciar_historial(camaras):
+    """
+    Restaura el estado de las cámaras desde el historial y empieza a registrar.
+
+    Debe llamarse antes de iniciar el monitoreo, para que las placas ya
+    procesadas antes del reinicio no se vuelvan a procesar.
+
+    Args:
+        camaras (list): Cámaras registradas
+
+    Returns:
+        tuple: (bool, int, float) - si el historial está activo, eventos
+               restaurados y milisegundos empleados
+    """
+    if historial is None:
+        return False, 0, 0.0
+    inicio = time.perf_counter()
+    try:
+        historial.abrir()
+        # Los ids del historial y los números de secuencia son el mismo espacio
+        almacen_detecciones.continuar_secuencia(historial.ultimo_id())
+        restaurados = sum(historial.restaurar(camara) for camara in camaras)
+        historial.iniciar()
+    except sqlite3.Error as e:
+        print(f"No se pudo abrir el historial de detecciones: {e}")
+        return False, 0, 0.0
+    metricas.registrar_indicadores("historial", historial.estadisticas)
+    return True, restaurados, (time.perf_counter() - inicio) * 1000
@@ -0,0 +1,376 @@
+"""
+Métricas de rendimiento del Sistema de Detección de Placas
+
+Instrumentación de bajo costo del camino crítico:
+
+- Temporizadores por etapa (histogramas): HTTP de la cámara, parseo XML,
+  control de duplicados, consulta de cita y publicación del estado.
+- Contadores: sondeos, eventos, duplicados, errores...
+- Indicadores leídos al exportar desde las estadísticas de otros componentes
+  (caché de citas, agenda, circuito, historial...).
+
+Las métricas se exportan en formato de texto Prometheus (ver
+app/servidor_http.py, ruta /metrics), como JSON (/api/metricas) o como una
+instantánea JSON periódica en disco (METRICAS_JSON).
+
+Incluye además un perfilador por muestreo que se puede activar y desactivar
+en tiempo de ejecución: cada pocos milisegundos toma la pila de todos los
+hilos y cuenta las pilas repetidas (formato "collapsed" de los flame graphs).
+"""
+
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from app.config import METRICAS_ACTIVO, PERFILADOR_INTERVALO
+
+# Límites (segundos) de los histogramas de las etapas
+LIMITES_HISTOGRAMA = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_PREFIJO = "placas"
+
+_CARACTER_INVALIDO = re.compile(r"[^a-zA-Z0-9_]")
+
+
+class _Histograma:
+    __slots__ = ("cuentas", "suma", "total")
+
+    def __init__(self):
+        self.cuentas = [0] * (len(LIMITES_HISTOGRAMA) + 1)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        indice = 0
+        for limite in LIMITES_HISTOGRAMA:
+            if valor <= limite:
+                break
+            indice += 1
+        self.cuentas[indice] += 1
+        self.suma += valor
+        self.total += 1
+
+
+class _Medicion:
+    """Context manager que observa la duración de un bloque en una etapa."""
+
+    __slots__ = ("registro", "etapa", "inicio")
+
+    def __init__(self, registro, etapa):
+        self.registro = registro
+        self.etapa = etapa
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        self.registro.observar(self.etapa, time.perf_counter() - self.inicio)
+        return False
+
+
+class RegistroMetricas:
+    """
+    Contadores, histogramas por etapa e indicadores del sistema.
+
+    Attributes:
+        activo (bool): Si es False, las mediciones no se registran
+    """
+
+    def __init__(self, activo=True):
+        self.activo = activo
+        self._lock = threading.Lock()
+        self._contadores = Counter()
+        self._etapas = {}
+        self._indicadores = {}
+        self._inicio = time.time()
+
+    def medir(self, etapa):
+        """
+        Mide la duración de un bloque:
+
+            with metricas.medir("consulta_cita"):
+                ...
+
+        Args:
+            etapa (str): Nombre de la etapa
+
+        Returns:
+            _Medicion: Context manager
+        """
+        return _Medicion(self, etapa)
+
+    def observar(self, etapa, segundos):
+        """
+        Registra la duración de una ejecución de una etapa.
+
+        Args:
+            etapa (str): Nombre de la etapa
+            segundos (float): Duración medida
+
+        Returns:
+            None
+        """
+        if not self.activo:
+            return
+        with self._lock:
+            histograma = self._etapas.get(etapa)
+            if histograma is None:
+                histograma = self._etapas[etapa] = _Histograma()
+            histograma.observar(segundos)
+
+    def incrementar(self, nombre, valor=1):
+        """
+        Incrementa un contador.
+
+        Args:
+            nombre (str): Nombre del contador (p. ej. "sondeos")
+            valor (int): Cantidad a sumar
+
+        Returns:
+            None
+        """
+        if not self.activo:
+            return
+        with self._lock:
+            self._contadores[nombre] += valor
+
+    def registrar_indicadores(self, nombre, funcion):
+        """
+        Registra una fuente de indicadores que se lee al exportar.
+
+        Args:
+            nombre (str): Prefijo de los indicadores (p. ej. "cache_citas")
+            funcion (callable): Devuelve un dict; se exportan sus valores numéricos
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._indicadores[nombre] = funcion
+
+    def instantanea(self):
+        """
+        Estado actual de todas las métricas.
+
+        Returns:
+            dict: Contadores, etapas (cantidad, suma, promedio y percentiles
+                  aproximados en ms) e indicadores
+        """
+        with self._lock:
+            contadores = dict(self._contadores)
+            etapas = {nombre: (list(h.cuentas), h.suma, h.total) for nombre, h in self._etapas.items()}
+            fuentes = dict(self._indicadores)
+
+        resumen_etapas = {}
+        for nombre, (cuentas, suma, total) in etapas.items():
+            resumen_etapas[nombre] = {
+                "cantidad": total,
+                "suma_s": round(suma, 6),
+                "promedio_ms": round(suma / total * 1000, 3) if total else 0.0,
+                "p50_ms": _percentil_histograma(cuentas, total, 0.50),
+                "p99_ms": _percentil_histograma(cuentas, total, 0.99),
+            }
+        return {
+            "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "segundos_activo": round(time.time() - self._inicio, 1),
+            "contadores": contadores,
+            "etapas": resumen_etapas,
+            "indicadores": {nombre: _numericos(funcion) for nombre, funcion in fuentes.items()},
+        }
+
+    def texto_prometheus(self):
+        """
+        Returns:
+            str: Métricas en formato de exposición de texto de Prometheus
+        """
+        with self._lock:
+            contadores = dict(self._contadores)
+            etapas = {nombre: (list(h.cuentas), h.suma, h.total) for nombre, h in self._etapas.items()}
+            fuentes = dict(self._indicadores)
+
+        lineas = []
+        for nombre in sorted(contadores):
+            metrica = _nombre_metrica(f"{_PREFIJO}_{nombre}_total")
+            lineas += [f"# TYPE {metrica} counter", f"{metrica} {contadores[nombre]}"]
+
+        if etapas:
+            metrica = f"{_PREFIJO}_etapa_segundos"
+            lineas.append(f"# TYPE {metrica} histogram")
+            for nombre in sorted(etapas):
+                cuentas, suma, total = etapas[nombre]
+                acumulado = 0
+                for limite, cuenta in zip(LIMITES_HISTOGRAMA, cuentas):
+                    acumulado += cuenta
+                    lineas.append(f'{metrica}_bucket{{etapa="{nombre}",le="{limite}"}} {acumulado}')
+                lineas.append(f'{metrica}_bucket{{etapa="{nombre}",le="+Inf"}} {total}')
+                lineas.append(f'{metrica}_sum{{etapa="{nombre}"}} {suma:.6f}')
+                lineas.append(f'{metrica}_count{{etapa="{nombre}"}} {total}')
+
+        for fuente in sorted(fuentes):
+            for clave, valor in sorted(_numericos(fuentes[fuente]).items()):
+                metrica = _nombre_metrica(f"{_PREFIJO}_{fuente}_{clave}")
+                lineas += [f"# TYPE {metrica} gauge", f"{metrica} {valor}"]
+        return "\n".join(lineas) + "\n"
+
+    def reiniciar(self):
+        """Pone a cero contadores y etapas (los indicadores se conservan)."""
+        with self._lock:
+            self._contadores.clear()
+            self._etapas.clear()
+            self._inicio = time.time()
+
+
+def _nombre_metrica(nombre):
+    # Los nombres de cámara pueden tener guiones o acentos
+    return _CARACTER_INVALIDO.sub("_", nombre)
+
+
+def _numericos(funcion):
+    try:
+        datos = funcion() or {}
+    except Exception:
+        return {"error_lectura": 1}
+    # Solo valores numéricos (los booleanos se exportan como 0/1)
+    return {clave: int(valor) if isinstance(valor, bool) else valor
+            for clave, valor in datos.items() if isinstance(valor, (int, float))}
+
+
+def _percentil_histograma(cuentas, total, fraccion):
+    # Aproximación: límite superior del intervalo que contiene el percentil
+    if not total:
+        return 0.0
+    objetivo = total * fraccion
+    acumulado = 0
+    for limite, cuenta in zip(LIMITES_HISTOGRAMA, cuentas):
+        acumulado += cuenta
+        if acumulado >= objetivo:
+            return limite * 1000
+    return float("inf")
+
+
+class PerfiladorMuestreo:
+    """
+    Perfilador por muestreo de todos los hilos, activable en tiempo de ejecución.
+
+    Attributes:
+        intervalo (float): Segundos entre muestras
+        profundidad (int): Marcos máximos de pila por muestra
+    """
+
+    def __init__(self, intervalo=0.005, profundidad=30):
+        self.intervalo = intervalo
+        self.profundidad = profundidad
+        self._pilas = Counter()
+        self._muestras = 0
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self._hilo = None
+
+    @property
+    def activo(self):
+        """True si el perfilador está tomando muestras."""
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def iniciar(self):
+        """
+        Empieza a tomar muestras (no hace nada si ya está activo).
+
+        Returns:
+            bool: True si se inició
+        """
+        if self.activo:
+            return False
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._muestrear, name="perfilador", daemon=True)
+        self._hilo.start()
+        return True
+
+    def detener(self):
+        """Deja de tomar muestras (las pilas acumuladas se conservan)."""
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join(1)
+        self._hilo = None
+
+    def reiniciar(self):
+        """Descarta las muestras acumuladas."""
+        with self._lock:
+            self._pilas.clear()
+            self._muestras = 0
+
+    def reporte(self, limite=None):
+        """
+        Pilas muestreadas en formato "collapsed" (una por línea: marcos
+        separados por ';' y cantidad de muestras), compatible con flamegraph.pl
+        y speedscope.
+
+        Args:
+            limite (int): Cantidad máxima de pilas (las más frecuentes)
+
+        Returns:
+            str: Reporte de texto
+        """
+        with self._lock:
+            pilas = self._pilas.most_common(limite)
+            muestras = self._muestras
+        lineas = [f"{pila} {cantidad}" for pila, cantidad in pilas]
+        return f"# muestras: {muestras}\n" + "\n".join(lineas) + "\n"
+
+    def _muestrear(self):
+        propio = threading.get_ident()
+        nombres = {}
+        while not self._detener.wait(self.intervalo):
+            marcos = sys._current_frames()
+            if len(nombres) != threading.active_count():
+                nombres = {hilo.ident: hilo.name for hilo in threading.enumerate()}
+            pilas = []
+            for ident, marco in marcos.items():
+                if ident == propio:
+                    continue
+                partes = []
+                while marco is not None and len(partes) < self.profundidad:
+                    codigo = marco.f_code
+                    partes.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{marco.f_lineno})")
+                    marco = marco.f_back
+                partes.append(nombres.get(ident, "hilo"))
+                pilas.append(";".join(reversed(partes)))
+            with self._lock:
+                self._pilas.update(pilas)
+                self._muestras += 1
+
+
+# Registro y perfilador compartidos
+metricas = RegistroMetricas(METRICAS_ACTIVO)
+perfilador = PerfiladorMuestreo(PERFILADOR_INTERVALO)
+
+
+def iniciar_instantaneas(ruta, intervalo=60):
+    """
+    Escribe periódicamente una instantánea JSON de las métricas en disco.
+
+    Args:
+        ruta (str): Archivo de destino (se reemplaza de forma atómica)
+        intervalo (float): Segundos entre instantáneas
+
+    Returns:
+        threading.Thread: Hilo de escritura
+    """
+    def escribir():
+        while True:
+            time.sleep(intervalo)
+            temporal = f"{ruta}.tmp"
+            try:
+                with open(temporal, "w", encoding="utf-8") as archivo:
+                    json.dump(metricas.instantanea(), archivo, ensure_ascii=False, indent=2)
+                os.replace(temporal, ruta)
+            except OSError as e:
+                print(f"No se pudo guardar la instantánea de métricas: {e}")
+
+    hilo = threading.Thread(target=escribir, name="metricas", daemon=True)
+    hilo.start()
+    return hilo
@@ -7,102 +7,526 @@ una nueva placa, realiza las siguientes acciones:
 
 1. Consulta si el vehículo tiene citas programadas
 2. Actualiza el estado del sistema para mostrar la información en la consola
+
+Las lecturas repetidas de un mismo vehículo (detenido frente a la barrera) se
+agrupan en un solo paso (ver app/sesiones.py): solo la primera consulta la cita
+y se publica.
+
+Las placas pueden llegar por sondeo periódico de la cámara o, según
+MODO_INGESTA, por eventos enviados por la cámara (alert stream o servidor de
+alarmas, ver app/eventos_camara.py). En los modos por eventos el sondeo queda
+como respaldo automático mientras el stream no está disponible.
+
+Con varias cámaras (ver app/camaras.py) cada una se monitorea en su propio
+hilo, supervisado por app/supervisor.py. Las funciones de este módulo reciben
+la cámara a procesar; si se omite, se usa la primera cámara registrada.
 """
 
 import time
-import threading
-from app.camera import get_plates
-from app.api_citas import consultar_cita
-from app.state import actualizar_datos, crear_id_evento_exacto, eventos_exactos_procesados, ultima_consulta
-from app.config import INTERVALO_CONSULTA
+from app.api_citas import consultar_cita, cita_pendiente, circuito_citas
+from app.pendientes import ConsultasPendientes
+from app.state import actualizar_datos, actualizar_paso, actualizar_cita, crear_id_evento_exacto, almacen_detecciones
+from app.sesiones import SesionizadorPasos
+from app.config import (MODO_LOTE, MAX_EVENTOS_LOTE, MAX_EVENTOS_DIFERIDOS, STREAM_REINTENTO,
+                        STREAM_TIMEOUT_LECTURA)
+from app.camaras import camaras
+from app.eventos_camara import consumir_alert_stream, ServidorAlarmas
+from app.supervisor import Supervisor
+from app.metricas import metricas
+
+# Cámara usada cuando no se indica otra (la única en instalaciones de un carril)
+camara_principal = camaras[0] if camaras else None
+
+# Cursor de captura de la cámara principal (None = consulta completa)
+cursor_captura = camara_principal.cursor if camara_principal else None
+
+def _publicar(evento, resultado_cita, camara):
+    deteccion = actualizar_datos(resultado_cita, evento["placa"], evento["fecha"], camara=camara.nombre,
+                                 ultima_lectura=evento.get("ultima_lectura"), lecturas=evento.get("lecturas", 1))
+    sesiones_paso.asociar(evento, camara, deteccion)
+    return deteccion
+
+def _completar_pendiente(evento, resultado_cita, camara, deteccion):
+    deteccion = actualizar_cita(deteccion, resultado_cita, evento.get("ultima_lectura"), evento.get("lecturas"))
+    sesiones_paso.asociar(evento, camara, deteccion)
+    return deteccion
+
+def _publicar_cierre_paso(deteccion, evento):
+    actualizar_paso(deteccion, evento["ultima_lectura"], evento["lecturas"])
+
+# Pasos de vehículo abiertos: agrupan las lecturas repetidas de una misma placa
+sesiones_paso = SesionizadorPasos(al_cerrar=_publicar_cierre_paso)
+metricas.registrar_indicadores("pasos", sesiones_paso.estadisticas)
+
+# Eventos publicados como "consulta pendiente" mientras el servicio de citas no responde
+consultas_pendientes = ConsultasPendientes(lambda evento: consultar_evento(evento), _completar_pendiente,
+                                           cita_pendiente, circuito_citas)
+metricas.registrar_indicadores("consultas_pendientes", consultas_pendientes.estadisticas)
+
+def obtener_placas_nuevas(camara=None):
+    """
+    Consulta la cámara y descarta los eventos ya cubiertos por el cursor.
+
+    Args:
+        camara (Camara): Cámara a consultar (por defecto la principal)
+
+    Returns:
+        list: Placas detectadas (más reciente primero)
+    """
+    camara = camara or camara_principal
+    if camara.cursor is not None:
+        return camara.cursor.filtrar_nuevos(camara.cliente.obtener_placas(desde=camara.cursor.desde_consulta()))
+    return camara.cliente.obtener_placas()
+
+def consultar_evento(evento):
+    """
+    Consulta la cita de un evento sin lanzar excepciones.
+
+    Args:
+        evento (dict): Evento con 'placa' y 'fecha'
+
+    Returns:
+        dict: Respuesta de la API de citas o dict con error
+    """
+    try:
+        with metricas.medir("consulta_cita"):
+            return consultar_cita(evento["placa"])
+    except Exception as e:
+        metricas.incrementar("errores")
+        print(f"Error al consultar cita: {e}")
+        return {
+            "codigo": "1",
+            "mensaje": f"Error al consultar información: {str(e)[:100]}"
+        }
+
+def registrar_evento(evento, resultado_cita, camara=None, guardar_cursor=True):
+    """
+    Publica el resultado de un evento y lo marca como procesado.
+
+    Si la consulta de la cita quedó pendiente (servicio de citas no
+    disponible), la detección se publica igualmente y el evento se guarda en
+    'consultas_pendientes' para actualizar la detección con su cita más tarde.
+
+    Args:
+        evento (dict): Evento con 'placa' y 'fecha'
+        resultado_cita (dict): Respuesta de la API de citas
+        camara (Camara): Cámara que detectó el evento (por defecto la principal)
+        guardar_cursor (bool): Persistir el cursor inmediatamente
+
+    Returns:
+        None
+    """
+    camara = camara or camara_principal
+    with metricas.medir("publicacion"):
+        deteccion = _publicar(evento, resultado_cita, camara)
+    metricas.incrementar("eventos")
+    if cita_pendiente(resultado_cita):
+        consultas_pendientes.agregar(evento, camara, deteccion)
+    marcar_procesado(evento, camara, guardar_cursor)
+
+def marcar_procesado(evento, camara=None, guardar_cursor=True):
+    """
+    Marca un evento como procesado sin consultar ni publicar su cita.
+
+    Args:
+        evento (dict): Evento con 'placa' y 'fecha'
+        camara (Camara): Cámara que detectó el evento (por defecto la principal)
+        guardar_cursor (bool): Persistir el cursor inmediatamente
+
+    Returns:
+        None
+    """
+    camara = camara or camara_principal
+    camara.registro.add(crear_id_evento_exacto(evento["placa"], evento["fecha"]))
+    if camara.cursor is not None:
+        camara.cursor.avanzar(evento["placa"], evento["fecha"], guardar=guardar_cursor)
+
+def agrupar_lecturas(eventos, camara=None):
+    """
+    Separa las lecturas que abren un paso de vehículo de las repetidas.
+
+    Las lecturas repetidas se suman a su paso (ver app/sesiones.py) y se
+    marcan como procesadas sin consultar la cita.
+
+    Args:
+        eventos (list): Eventos nuevos en orden de captura
+        camara (Camara): Cámara que detectó los eventos (por defecto la principal)
+
+    Returns:
+        list: Eventos que abren un paso nuevo, en orden de captura
+    """
+    camara = camara or camara_principal
+    nuevos = []
+    for evento in eventos:
+        if sesiones_paso.agrupar(evento, camara):
+            marcar_procesado(evento, camara, guardar_cursor=False)
+            metricas.incrementar("lecturas_agrupadas")
+        else:
+            nuevos.append(evento)
+    return nuevos
 
-def procesar_ultimo_evento():
+def procesar_ultimo_evento(camara=None):
     """
     Procesa el evento más reciente de detección de placa.
-    
+
     Esta función realiza el flujo principal de procesamiento cuando se detecta
     una nueva placa:
-    1. Obtiene la lista de placas detectadas recientemente
+    1. Obtiene la lista de placas detectadas recientemente (solo las posteriores
+       al cursor de captura si MODO_CURSOR está activo)
     2. Verifica si la placa más reciente ya ha sido procesada (evita duplicados)
+       o si es una lectura repetida de un paso de vehículo abierto
     3. Consulta si el vehículo tiene una cita programada
     4. Actualiza el estado del sistema para mostrar la información en la consola
-    5. Marca el evento como procesado para evitar procesarlo nuevamente
-    
+    5. Marca el evento como procesado y avanza el cursor de captura
+
     Si no hay placas detectadas o la última ya fue procesada, la función
     termina sin realizar ninguna acción.
-    
+
+    Args:
+        camara (Camara): Cámara a consultar (por defecto la principal)
+
     Returns:
-        None
+        int: 1 si se procesó un evento nuevo, 0 en caso contrario
     """
+    camara = camara or camara_principal
     try:
-        placas = get_plates()
+        placas = obtener_placas_nuevas(camara)
         if not placas:
-            return
+            return 0
 
         ultimo_evento = placas[0]
         id_evento_exacto = crear_id_evento_exacto(ultimo_evento["placa"], ultimo_evento["fecha"])
-        
-        if id_evento_exacto not in eventos_exactos_procesados:
-            try:
-                resultado_cita = consultar_cita(ultimo_evento["placa"])
-                actualizar_datos(resultado_cita, ultimo_evento["placa"], ultimo_evento["fecha"])
-            except Exception as e:
-                print(f"Error al consultar cita: {e}")
-                datos_error = {
-                    "codigo": "1",
-                    "mensaje": f"Error al consultar información: {str(e)[:100]}"
-                }
-                actualizar_datos(datos_error, ultimo_evento["placa"], ultimo_evento["fecha"])
-            eventos_exactos_procesados.add(id_evento_exacto)
+
+        with camara.lock:
+            with metricas.medir("dedup"):
+                nuevo = id_evento_exacto not in camara.registro
+            if nuevo and sesiones_paso.agrupar(ultimo_evento, camara):
+                marcar_procesado(ultimo_evento, camara)
+                metricas.incrementar("lecturas_agrupadas")
+                return 0
+            if nuevo:
+                registrar_evento(ultimo_evento, consultar_evento(ultimo_evento), camara)
+                return 1
+        metricas.incrementar("duplicados")
+        return 0
     except Exception as e:
+        metricas.incrementar("errores")
         print(f"Error general en el procesamiento de evento: {e}")
+        return 0
+
+def seleccionar_eventos_nuevos(placas, camara=None):
+    """
+    Obtiene los eventos de una lista que aún no han sido procesados.
+
+    Los eventos se devuelven en orden de captura (más antiguo primero), como
+    máximo MAX_EVENTOS_LOTE (ver limitar_lote).
+
+    Args:
+        placas (list): Placas detectadas por la cámara
+        camara (Camara): Cámara que detectó las placas (por defecto la principal)
+
+    Returns:
+        list: Eventos pendientes en orden de captura
+    """
+    camara = camara or camara_principal
+    with metricas.medir("dedup"):
+        pendientes = {}
+        for evento in placas:
+            id_evento_exacto = crear_id_evento_exacto(evento["placa"], evento["fecha"])
+            if id_evento_exacto not in camara.registro:
+                pendientes[id_evento_exacto] = evento
+    if len(placas) > len(pendientes):
+        metricas.incrementar("duplicados", len(placas) - len(pendientes))
+    return [evento for _, evento in limitar_lote(pendientes, camara)]
+
+def limitar_lote(pendientes, camara, en_curso=()):
+    """
+    Arma el siguiente lote de una cámara con como máximo MAX_EVENTOS_LOTE eventos.
+
+    Los eventos que no caben quedan diferidos en la cámara, sin marcarse como
+    procesados, y entran en los lotes siguientes antes que los más nuevos.
+    Solo si los diferidos superan MAX_EVENTOS_DIFERIDOS se descartan los más
+    antiguos (p. ej. en el primer arranque sin cursor); se cuentan en la
+    métrica eventos_omitidos.
+
+    Args:
+        pendientes (dict): Id de evento exacto -> evento aún no procesado
+        camara (Camara): Cámara que detectó los eventos
+        en_curso (set): Ids que ya se están procesando (no se vuelven a incluir)
+
+    Returns:
+        list: Tuplas (id de evento, evento) en orden de captura
+    """
+    for id_evento, evento in camara.diferidos.items():
+        if id_evento not in camara.registro and id_evento not in en_curso:
+            pendientes.setdefault(id_evento, evento)
+    ordenados = sorted(pendientes.items(), key=lambda x: x[1]["fecha"])
+
+    exceso = len(ordenados) - MAX_EVENTOS_LOTE - MAX_EVENTOS_DIFERIDOS
+    if exceso > 0:
+        for id_evento, _ in ordenados[:exceso]:
+            camara.registro.add(id_evento)
+        ordenados = ordenados[exceso:]
+        metricas.incrementar("eventos_omitidos", exceso)
+        print(f"[{camara.nombre}] Se omitieron {exceso} eventos antiguos "
+              f"(más de {MAX_EVENTOS_DIFERIDOS} esperando lote)")
+
+    lote, resto = ordenados[:MAX_EVENTOS_LOTE], ordenados[MAX_EVENTOS_LOTE:]
+    nuevos_diferidos = sum(1 for id_evento, _ in resto if id_evento not in camara.diferidos)
+    if nuevos_diferidos:
+        metricas.incrementar("eventos_diferidos", nuevos_diferidos)
+    camara.diferidos = dict(resto)
+    return lote
+
+def procesar_eventos(eventos, camara=None):
+    """
+    Procesa un lote de eventos nuevos.
+
+    Las lecturas repetidas de un paso de vehículo se agrupan primero
+    (agrupar_lecturas). Las consultas de citas se ejecutan en paralelo en el
+    pool de hilos acotado de la cámara (HILOS_PROCESAMIENTO), pero los
+    resultados se publican en orden de captura para que la última detección
+    mostrada sea siempre la más reciente.
+
+    Args:
+        eventos (list): Eventos pendientes en orden de captura
+        camara (Camara): Cámara que detectó los eventos (por defecto la principal)
+
+    Returns:
+        int: Cantidad de eventos procesados (sin contar las lecturas agrupadas)
+    """
+    if not eventos:
+        return 0
+    camara = camara or camara_principal
+    eventos = agrupar_lecturas(eventos, camara)
+    ejecutor = camara.ejecutor()
+    futuros = [ejecutor.submit(consultar_evento, evento) for evento in eventos]
+    for evento, futuro in zip(eventos, futuros):
+        registrar_evento(evento, futuro.result(), camara, guardar_cursor=False)
+    if camara.cursor is not None:
+        camara.cursor.guardar()
+    return len(eventos)
+
+def procesar_nuevos_eventos(camara=None):
+    """
+    Procesa todos los eventos nuevos de una consulta (modo por lotes).
+
+    A diferencia de procesar_ultimo_evento, compara toda la lista obtenida
+    contra los eventos ya procesados, de modo que dos vehículos que pasan
+    dentro del mismo intervalo de consulta se verifican ambos.
+
+    Args:
+        camara (Camara): Cámara a consultar (por defecto la principal)
+
+    Returns:
+        int: Cantidad de eventos procesados
+    """
+    camara = camara or camara_principal
+    try:
+        placas = obtener_placas_nuevas(camara)
+        with camara.lock:
+            return procesar_eventos(seleccionar_eventos_nuevos(placas, camara), camara)
+    except Exception as e:
+        metricas.incrementar("errores")
+        print(f"Error general en el procesamiento de eventos: {e}")
+        return 0
+
+def procesar_eventos_recibidos(placas, camara=None):
+    """
+    Procesa eventos enviados por la cámara (alert stream o servidor de alarmas).
+
+    Sigue el mismo camino que el sondeo: filtro por cursor, control de
+    duplicados, consulta de citas y publicación en orden de captura.
+
+    Args:
+        placas (list): Eventos con 'placa', 'fecha' y 'país'
+        camara (Camara): Cámara que envió los eventos (por defecto la principal)
+
+    Returns:
+        int: Cantidad de eventos procesados
+    """
+    camara = camara or camara_principal
+    try:
+        if camara.cursor is not None:
+            placas = camara.cursor.filtrar_nuevos(placas)
+        with camara.lock:
+            procesados = procesar_eventos(seleccionar_eventos_nuevos(placas, camara), camara)
+        if procesados:
+            camara.planificador.registrar_actividad()
+            # La cámara está enviando eventos: un sondeo de respaldo en espera no
+            # espera el resto (p. ej. una espera larga tras fallos)
+            camara.planificador.despertar()
+        return procesados
+    except Exception as e:
+        metricas.incrementar("errores")
+        print(f"Error al procesar eventos recibidos: {e}")
+        return 0
+
+def sondear(camara=None):
+    """
+    Realiza un ciclo de sondeo según el modo configurado (lotes o último evento).
+
+    El resultado (conexión y placas nuevas) se registra en el planificador de
+    la cámara, que decide la espera hasta el siguiente sondeo.
+
+    Args:
+        camara (Camara): Cámara a consultar (por defecto la principal)
+
+    Returns:
+        bool: True si la cámara respondió
+    """
+    camara = camara or camara_principal
+    procesados = 0
+    try:
+        if MODO_LOTE:
+            procesados = procesar_nuevos_eventos(camara)
+        else:
+            procesados = procesar_ultimo_evento(camara)
+    except Exception as e:
+        metricas.incrementar("errores")
+        print(f"Error en el hilo de monitoreo: {e}")
+    conectado, _ = camara.cliente.estado()
+    metricas.incrementar("sondeos")
+    if not conectado:
+        metricas.incrementar("sondeos_fallidos")
+    camara.registrar_sondeo(conectado, procesados)
+    return conectado
+
+def espera_sondeo(camara):
+    """
+    Segundos hasta el siguiente sondeo de una cámara.
+
+    Args:
+        camara (Camara): Cámara sondeada
+
+    Returns:
+        float: Segundos de espera según su planificador (ver app/planificador.py)
+    """
+    return camara.planificador.siguiente_espera()
+
+def monitor_camara(camara):
+    """
+    Bucle de monitoreo de una cámara según su modo de ingesta.
+
+    Args:
+        camara (Camara): Cámara a monitorear
+
+    Returns:
+        None
+    """
+    if camara.modo_ingesta == "stream":
+        monitor_stream(camara)
+    elif camara.modo_ingesta == "alarma":
+        monitor_alarmas(camara)
+    else:
+        while True:
+            sondear(camara)
+            camara.planificador.esperar()
 
 def monitor_thread():
     """
     Función que se ejecuta en un hilo separado para monitorear continuamente la cámara.
-    
+
     Este procedimiento implementa el bucle infinito de monitoreo que verifica
     periódicamente si hay nuevas placas detectadas. El intervalo entre consultas
-    se configura mediante la constante INTERVALO_CONSULTA en el archivo config.py.
-    
+    lo decide el planificador de la cámara (ver app/planificador.py): corto tras
+    una detección, más largo sin actividad y creciente si la cámara no responde.
+
+    En modo por lotes (MODO_LOTE) se procesan todos los eventos nuevos de cada
+    consulta; en caso contrario solo el más reciente.
+
+    Con MODO_INGESTA="stream" o "alarma" las placas llegan por eventos de la
+    cámara y el sondeo solo se usa como respaldo.
+
     El bucle continuará indefinidamente hasta que el programa principal termine,
     ya que se ejecuta como un hilo daemon.
-    
+
     Returns:
         None
     """
+    monitor_camara(camara_principal)
+
+def monitor_stream(camara=None):
+    """
+    Ingesta por alert stream con respaldo por sondeo.
+
+    Mientras el stream está conectado, cada lectura ANPR se procesa en cuanto
+    llega. Si el stream se corta, se sondea la cámara durante STREAM_REINTENTO
+    segundos y luego se intenta reconectar.
+
+    Args:
+        camara (Camara): Cámara a monitorear (por defecto la principal)
+
+    Returns:
+        None
+    """
+    camara = camara or camara_principal
+
+    def al_conectar():
+        print(f"[{camara.nombre}] Stream de eventos de la cámara conectado")
+        # Recupera los eventos ocurridos mientras el stream estuvo desconectado
+        sondear(camara)
+
     while True:
-        try:
-            procesar_ultimo_evento()
-        except Exception as e:
-            print(f"Error en el hilo de monitoreo: {e}")
-        time.sleep(INTERVALO_CONSULTA)
+        motivo = consumir_alert_stream(camara.url_alert_stream, camara.usuario, camara.clave,
+                                       lambda placas: procesar_eventos_recibidos(placas, camara),
+                                       al_conectar=al_conectar,
+                                       timeout_conexion=camara.cliente.timeout[0],
+                                       timeout_lectura=STREAM_TIMEOUT_LECTURA)
+        print(f"[{camara.nombre}] {motivo}. Usando sondeo como respaldo durante {STREAM_REINTENTO:g} s")
+        fin = time.monotonic() + STREAM_REINTENTO
+        while time.monotonic() < fin:
+            sondear(camara)
+            camara.planificador.esperar()
+
+def monitor_alarmas(camara=None):
+    """
+    Ingesta por servidor de alarmas con respaldo por sondeo.
+
+    Levanta un servidor HTTP local en el puerto de alarmas de la cámara que
+    recibe los eventos enviados por ella. Si no llega ningún mensaje durante
+    STREAM_REINTENTO segundos, se sondea la cámara hasta que vuelvan a llegar
+    eventos.
+
+    Args:
+        camara (Camara): Cámara a monitorear (por defecto la principal)
+
+    Returns:
+        None
+    """
+    camara = camara or camara_principal
+    servidor = ServidorAlarmas(("0.0.0.0", camara.puerto_alarma),
+                               lambda placas: procesar_eventos_recibidos(placas, camara))
+    servidor.iniciar()
+    print(f"[{camara.nombre}] Servidor de alarmas escuchando en el puerto {camara.puerto_alarma}")
+    while True:
+        if not servidor.activo(STREAM_REINTENTO):
+            sondear(camara)
+            camara.planificador.esperar()
+        else:
+            time.sleep(1)
 
 def iniciar_monitor():
     """
-    Inicia el hilo de monitoreo en segundo plano.
-    
-    Crea y arranca un nuevo hilo (Thread) que ejecuta la función monitor_thread
-    en segundo plano. El hilo se configura como daemon para que termine 
-    automáticamente cuando el programa principal finalice.
-    
+    Inicia el monitoreo en segundo plano de todas las cámaras registradas.
+
+    Crea un supervisor que arranca un hilo por cámara y los reinicia si
+    terminan de forma inesperada. Los hilos se configuran como daemon para que
+    terminen automáticamente cuando el programa principal finalice.
+
     Returns:
-        threading.Thread: Objeto Thread que representa el hilo de monitoreo iniciado
+        threading.Thread: Hilo del supervisor de monitoreo
     """
-    t = threading.Thread(target=monitor_thread, daemon=True)
-    t.start()
-    return t
+    return Supervisor(camaras, monitor_camara).iniciar()
 
 def obtener_ultima_deteccion():
     """
     Obtiene la información de la última placa detectada.
-    
+
     Esta función devuelve la información actualizada sobre la última placa
     detectada por el sistema, incluyendo datos sobre la cita si existe.
-    
+
     Returns:
-        dict: Diccionario con los datos de la última detección o None si no hay datos
+        Deteccion: Registro inmutable de la última detección o None si no hay datos
     """
-    if ultima_consulta["placa"] is None:
-        return None
-    return ultima_consulta 
\ No newline at end of file
+    return almacen_detecciones.ultima()
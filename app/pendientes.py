@@ -0,0 +1,116 @@
+"""
+Consultas de citas pendientes
+
+Cuando el servicio de citas no responde (circuito abierto o error de conexión)
+la detección se publica al instante como pendiente y su evento se guarda aquí.
+Un hilo en segundo plano repite las consultas cuando el circuito vuelve a
+cerrarse (o cada cierto intervalo, lo que sirve como prueba del circuito
+semiabierto) y actualiza cada detección pendiente con el resultado de su cita
+(conserva su id y su fila del historial).
+"""
+
+import threading
+from collections import OrderedDict
+
+from app.state import crear_id_evento_exacto
+
+
+class ConsultasPendientes:
+    """
+    Eventos cuya consulta de cita debe completarse más tarde.
+
+    Attributes:
+        consultar (callable): Recibe el evento y devuelve la respuesta de citas
+        publicar (callable): Recibe (evento, resultado, camara, deteccion) al
+                             completarse, con la detección pendiente publicada
+        es_pendiente (callable): Indica si una respuesta sigue pendiente
+        circuito (Circuito): Circuito del servicio de citas
+        max_pendientes (int): Eventos retenidos como máximo (se descartan los más antiguos)
+        intervalo (float): Segundos entre reintentos mientras el servicio no responde
+    """
+
+    def __init__(self, consultar, publicar, es_pendiente, circuito, max_pendientes=500, intervalo=5):
+        self.consultar = consultar
+        self.publicar = publicar
+        self.es_pendiente = es_pendiente
+        self.circuito = circuito
+        self.max_pendientes = max_pendientes
+        self.intervalo = intervalo
+        self._eventos = OrderedDict()
+        self._lock = threading.Lock()
+        self._hay_pendientes = threading.Event()
+        self._detener = threading.Event()
+        self._hilo = None
+        self._completadas = 0
+        self._descartadas = 0
+
+    def agregar(self, evento, camara, deteccion):
+        """
+        Guarda un evento para completar su consulta cuando el servicio responda.
+
+        Args:
+            evento (dict): Evento con 'placa' y 'fecha'
+            camara (Camara): Cámara que detectó el evento
+            deteccion (Deteccion): Detección publicada como pendiente
+
+        Returns:
+            None
+        """
+        clave = (camara.nombre,) + crear_id_evento_exacto(evento["placa"], evento["fecha"])
+        with self._lock:
+            self._eventos[clave] = (evento, camara, deteccion)
+            while len(self._eventos) > self.max_pendientes:
+                self._eventos.popitem(last=False)
+                self._descartadas += 1
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._ejecutar, name="citas-pendientes", daemon=True)
+                self._hilo.start()
+        self._hay_pendientes.set()
+
+    def detener(self):
+        """Detiene el hilo de reintentos."""
+        self._detener.set()
+        self._hay_pendientes.set()
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: Consultas pendientes, completadas y descartadas
+        """
+        with self._lock:
+            return {"pendientes": len(self._eventos), "completadas": self._completadas,
+                    "descartadas": self._descartadas}
+
+    def _ejecutar(self):
+        while not self._detener.is_set():
+            self._hay_pendientes.wait()
+            if self._detener.is_set():
+                return
+            # Se despierta en cuanto otra consulta cierra el circuito
+            self.circuito.esperar_cierre(self.intervalo)
+            if not self._reintentar():
+                self._detener.wait(self.intervalo)
+
+    def _reintentar(self):
+        """
+        Repite las consultas pendientes, de la más antigua a la más reciente.
+
+        Returns:
+            bool: True si no quedan consultas pendientes
+        """
+        while True:
+            with self._lock:
+                if not self._eventos:
+                    self._hay_pendientes.clear()
+                    return True
+                clave, (evento, camara, deteccion) = next(iter(self._eventos.items()))
+            resultado = self.consultar(evento)
+            if self.es_pendiente(resultado):
+                return False
+            with self._lock:
+                self._eventos.pop(clave, None)
+                self._completadas += 1
+            try:
+                self.publicar(evento, resultado, camara, deteccion)
+            except Exception as e:
+                print(f"[{camara.nombre}] Error al publicar la cita completada: {e}")
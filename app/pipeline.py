@@ -0,0 +1,307 @@
+"""
+Pipeline asyncio de detección de placas
+
+Alternativa al monitoreo por hilos (MODO_MONITOR=asyncio). El flujo se divide
+en etapas independientes unidas por colas acotadas:
+
+    cámara (descarga) -> XML (parseo y filtro) -> citas (consulta) -> publicación
+
+- Cada etapa tiene su propio límite de concurrencia y su propio pool de hilos
+  para las llamadas bloqueantes (requests), así una respuesta lenta de la API
+  de citas no detiene la descarga de la cámara ni el parseo.
+- Las colas son acotadas (PIPELINE_COLA_MAX): si una etapa se atrasa, las
+  anteriores esperan (contrapresión) en lugar de acumular memoria.
+- La etapa de filtro descarta los duplicados exactos y agrupa las lecturas
+  repetidas de un mismo vehículo (ver app/sesiones.py) antes de consultar citas.
+- Al detener el pipeline (Ctrl+C) las tareas se cancelan de forma ordenada y
+  el cursor de cada cámara queda guardado.
+
+Las cámaras en modo "stream" o "alarma" entregan sus eventos directamente a la
+etapa de filtro, con el sondeo como respaldo igual que en app/monitor.py.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.camera import parsear_placas
+from app.config import (PIPELINE_COLA_MAX, PIPELINE_PARSEADORES, PIPELINE_CONSULTAS, STREAM_REINTENTO,
+                        STREAM_TIMEOUT_LECTURA)
+from app.eventos_camara import consumir_alert_stream, ServidorAlarmas
+from app.metricas import metricas
+from app.monitor import consultar_evento, registrar_evento, espera_sondeo, sesiones_paso, limitar_lote
+from app.state import crear_id_evento_exacto
+
+
+class PipelineDeteccion:
+    """
+    Pipeline asyncio de ingesta, consulta y publicación de detecciones.
+
+    Attributes:
+        camaras (list): Cámaras registradas (objetos Camara)
+        cola_max (int): Capacidad de cada cola entre etapas
+        parseadores (int): Tareas de parseo simultáneas
+        consultas (int): Consultas de citas simultáneas
+    """
+
+    def __init__(self, camaras, cola_max=PIPELINE_COLA_MAX, parseadores=PIPELINE_PARSEADORES,
+                 consultas=PIPELINE_CONSULTAS):
+        self.camaras = camaras
+        self.cola_max = cola_max
+        self.parseadores = parseadores
+        self.consultas = consultas
+        self.estadisticas = {"descargas": 0, "errores_descarga": 0, "eventos": 0, "publicados": 0}
+        self._loop = None
+        self._tareas = []
+        self._detener_hilos = threading.Event()
+        self._en_curso = {camara.nombre: set() for camara in camaras}
+        # Reordenamiento: cada evento recibe un número de secuencia por cámara y
+        # se publica en ese orden aunque las consultas terminen desordenadas
+        self._secuencia = {camara.nombre: 0 for camara in camaras}
+        self._siguiente = {camara.nombre: 0 for camara in camaras}
+        self._por_publicar = {camara.nombre: {} for camara in camaras}
+
+    async def ejecutar(self):
+        """
+        Ejecuta el pipeline hasta que sea cancelado.
+
+        Returns:
+            None
+        """
+        self._loop = asyncio.get_running_loop()
+        self._cola_xml = asyncio.Queue(self.cola_max)
+        self._cola_eventos = asyncio.Queue(self.cola_max)
+        self._cola_publicar = asyncio.Queue(self.cola_max)
+        # Los eventos push adelantan el siguiente sondeo de respaldo de su cámara
+        self._despertar = {camara.nombre: asyncio.Event() for camara in self.camaras}
+        self._esperando = set()
+        self._hilos_camara = ThreadPoolExecutor(max_workers=max(1, len(self.camaras)) * 2,
+                                                thread_name_prefix="pipeline-camara")
+        self._hilos_parseo = ThreadPoolExecutor(max_workers=self.parseadores, thread_name_prefix="pipeline-xml")
+        self._hilos_citas = ThreadPoolExecutor(max_workers=self.consultas, thread_name_prefix="pipeline-citas")
+
+        for camara in self.camaras:
+            if camara.modo_ingesta == "stream":
+                self._tareas.append(asyncio.create_task(self._fuente_stream(camara)))
+            elif camara.modo_ingesta == "alarma":
+                self._tareas.append(asyncio.create_task(self._fuente_alarmas(camara)))
+            else:
+                self._tareas.append(asyncio.create_task(self._fuente_sondeo(camara)))
+        self._tareas += [asyncio.create_task(self._etapa_parseo()) for _ in range(self.parseadores)]
+        self._tareas += [asyncio.create_task(self._etapa_consulta()) for _ in range(self.consultas)]
+        self._tareas.append(asyncio.create_task(self._etapa_publicacion()))
+
+        try:
+            await asyncio.gather(*self._tareas)
+        finally:
+            await self._cerrar()
+
+    # --- Fuentes -----------------------------------------------------------
+
+    async def _sondear(self, camara):
+        desde = camara.cursor.desde_consulta() if camara.cursor is not None else None
+        try:
+            contenido = await self._loop.run_in_executor(self._hilos_camara, camara.cliente.descargar, desde)
+        except Exception:
+            camara.registrar_sondeo(False)
+            self.estadisticas["errores_descarga"] += 1
+            metricas.incrementar("sondeos")
+            metricas.incrementar("sondeos_fallidos")
+            return
+        camara.registrar_sondeo(True)
+        metricas.incrementar("sondeos")
+        self.estadisticas["descargas"] += 1
+        await self._cola_xml.put((camara, contenido, desde))
+
+    async def _fuente_sondeo(self, camara):
+        while True:
+            await self._sondear(camara)
+            await asyncio.sleep(espera_sondeo(camara))
+
+    def _entregar_desde_hilo(self, camara):
+        # Los eventos push llegan en hilos; se encolan en el loop y el hilo espera
+        # si la cola está llena (contrapresión hacia la cámara)
+        def entregar(placas):
+            futuro = asyncio.run_coroutine_threadsafe(self._filtrar_y_encolar(camara, placas), self._loop)
+            futuro.result()
+            if placas:
+                self._loop.call_soon_threadsafe(self._despertar_sondeo, camara)
+        return entregar
+
+    def _en_hilo_daemon(self, funcion):
+        # Las conexiones de larga duración no usan un ThreadPoolExecutor, cuyos
+        # hilos retrasarían la salida del proceso hasta que el stream se corte
+        futuro = self._loop.create_future()
+
+        def ejecutar():
+            try:
+                resultado = funcion()
+            except Exception as e:
+                resultado = f"Error en el stream de eventos: {e}"
+            if not self._loop.is_closed():
+                self._loop.call_soon_threadsafe(lambda: futuro.done() or futuro.set_result(resultado))
+
+        threading.Thread(target=ejecutar, daemon=True).start()
+        return futuro
+
+    async def _fuente_stream(self, camara):
+        entregar = self._entregar_desde_hilo(camara)
+        while True:
+            motivo = await self._en_hilo_daemon(lambda: consumir_alert_stream(
+                camara.url_alert_stream, camara.usuario, camara.clave, entregar,
+                detener=self._detener_hilos, timeout_conexion=camara.cliente.timeout[0],
+                timeout_lectura=STREAM_TIMEOUT_LECTURA))
+            print(f"[{camara.nombre}] {motivo}. Usando sondeo como respaldo durante {STREAM_REINTENTO:g} s")
+            fin = time.monotonic() + STREAM_REINTENTO
+            while time.monotonic() < fin:
+                await self._sondear(camara)
+                await self._esperar_sondeo(camara)
+
+    async def _fuente_alarmas(self, camara):
+        servidor = ServidorAlarmas(("0.0.0.0", camara.puerto_alarma), self._entregar_desde_hilo(camara))
+        servidor.iniciar()
+        print(f"[{camara.nombre}] Servidor de alarmas escuchando en el puerto {camara.puerto_alarma}")
+        try:
+            while True:
+                if not servidor.activo(STREAM_REINTENTO):
+                    await self._sondear(camara)
+                    await self._esperar_sondeo(camara)
+                else:
+                    await asyncio.sleep(1)
+        finally:
+            servidor.shutdown()
+
+    async def _esperar_sondeo(self, camara):
+        # Como PlanificadorSondeo.esperar(), con un evento del loop
+        despertar = self._despertar[camara.nombre]
+        despertar.clear()
+        self._esperando.add(camara.nombre)
+        try:
+            await asyncio.wait_for(despertar.wait(), espera_sondeo(camara))
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self._esperando.discard(camara.nombre)
+            despertar.clear()
+
+    def _despertar_sondeo(self, camara):
+        # Solo interrumpe una espera de respaldo en curso (ver PlanificadorSondeo.despertar)
+        if camara.nombre in self._esperando:
+            self._despertar[camara.nombre].set()
+
+    # --- Etapas ------------------------------------------------------------
+
+    async def _filtrar_y_encolar(self, camara, placas):
+        if camara.cursor is not None:
+            placas = camara.cursor.filtrar_nuevos(placas)
+        en_curso = self._en_curso[camara.nombre]
+        with metricas.medir("dedup"):
+            nuevos = {}
+            for evento in placas:
+                id_evento = crear_id_evento_exacto(evento["placa"], evento["fecha"])
+                if id_evento not in camara.registro and id_evento not in en_curso:
+                    nuevos[id_evento] = evento
+        if len(placas) > len(nuevos):
+            metricas.incrementar("duplicados", len(placas) - len(nuevos))
+        ordenados = limitar_lote(nuevos, camara, en_curso)
+        if ordenados:
+            camara.planificador.registrar_actividad()
+        for id_evento, evento in ordenados:
+            if sesiones_paso.agrupar(evento, camara):
+                # Lectura repetida de un paso abierto: el cursor avanza con las
+                # publicaciones, para no adelantarse a las consultas en curso
+                camara.registro.add(id_evento)
+                metricas.incrementar("lecturas_agrupadas")
+                continue
+            en_curso.add(id_evento)
+            secuencia = self._secuencia[camara.nombre]
+            self._secuencia[camara.nombre] += 1
+            self.estadisticas["eventos"] += 1
+            await self._cola_eventos.put((camara, secuencia, id_evento, evento))
+
+    async def _etapa_parseo(self):
+        while True:
+            camara, contenido, desde = await self._cola_xml.get()
+            try:
+                placas = await self._loop.run_in_executor(self._hilos_parseo, parsear_placas, contenido, desde)
+                await self._filtrar_y_encolar(camara, placas)
+            except Exception as e:
+                metricas.incrementar("errores")
+                print(f"[{camara.nombre}] Error al procesar la respuesta de la cámara: {e}")
+            finally:
+                self._cola_xml.task_done()
+
+    async def _etapa_consulta(self):
+        while True:
+            camara, secuencia, id_evento, evento = await self._cola_eventos.get()
+            try:
+                resultado = await self._loop.run_in_executor(self._hilos_citas, consultar_evento, evento)
+                await self._cola_publicar.put((camara, secuencia, id_evento, evento, resultado))
+            finally:
+                self._cola_eventos.task_done()
+
+    async def _etapa_publicacion(self):
+        while True:
+            camara, secuencia, id_evento, evento, resultado = await self._cola_publicar.get()
+            por_publicar = self._por_publicar[camara.nombre]
+            por_publicar[secuencia] = (id_evento, evento, resultado)
+            while self._siguiente[camara.nombre] in por_publicar:
+                id_evento, evento, resultado = por_publicar.pop(self._siguiente[camara.nombre])
+                self._siguiente[camara.nombre] += 1
+                try:
+                    registrar_evento(evento, resultado, camara)
+                    self.estadisticas["publicados"] += 1
+                except Exception as e:
+                    metricas.incrementar("errores")
+                    print(f"[{camara.nombre}] Error al publicar la detección: {e}")
+                finally:
+                    self._en_curso[camara.nombre].discard(id_evento)
+            self._cola_publicar.task_done()
+
+    async def _cerrar(self):
+        self._detener_hilos.set()
+        for tarea in self._tareas:
+            tarea.cancel()
+        await asyncio.gather(*self._tareas, return_exceptions=True)
+        for camara in self.camaras:
+            if camara.cursor is not None:
+                camara.cursor.guardar()
+        for ejecutor in (self._hilos_camara, self._hilos_parseo, self._hilos_citas):
+            ejecutor.shutdown(wait=False)
+
+
+def iniciar_pipeline(camaras):
+    """
+    Ejecuta el pipeline asyncio en un hilo daemon con su propio event loop.
+
+    Args:
+        camaras (list): Cámaras registradas
+
+    Returns:
+        tuple: (threading.Thread, callable) - hilo del pipeline y función que
+               lo detiene de forma ordenada
+    """
+    pipeline = PipelineDeteccion(camaras)
+    loop = asyncio.new_event_loop()
+    principal = {}
+
+    def ejecutar():
+        asyncio.set_event_loop(loop)
+        principal["tarea"] = loop.create_task(pipeline.ejecutar())
+        try:
+            loop.run_until_complete(principal["tarea"])
+        except asyncio.CancelledError:
+            pass
+        finally:
+            loop.close()
+
+    def detener(timeout=5):
+        tarea = principal.get("tarea")
+        if tarea is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(tarea.cancel)
+        hilo.join(timeout)
+
+    hilo = threading.Thread(target=ejecutar, name="pipeline", daemon=True)
+    hilo.start()
+    return hilo, detener
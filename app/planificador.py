@@ -0,0 +1,123 @@
+"""
+Planificador adaptativo del sondeo de la cámara
+
+Reemplaza la espera fija de INTERVALO_CONSULTA entre consultas:
+
+1. Tras una detección se sondea con el intervalo mínimo (SONDEO_INTERVALO_MIN),
+   porque es probable que lleguen más vehículos.
+2. Si no hay placas durante SONDEO_VENTANA_ACTIVIDAD segundos, el intervalo se
+   duplica por cada ventana sin actividad hasta SONDEO_INTERVALO_MAX (p. ej. de
+   noche), lo que reduce la carga sobre la cámara y el CPU.
+3. Si la cámara no responde, la espera crece de forma exponencial con jitter
+   hasta CAMARA_ESPERA_MAXIMA, para no saturar una cámara caída ni reintentar
+   todas las cámaras al mismo tiempo.
+"""
+
+import random
+import threading
+import time
+
+from app.config import (SONDEO_INTERVALO_MIN, SONDEO_INTERVALO_MAX, SONDEO_VENTANA_ACTIVIDAD,
+                        CAMARA_ESPERA_MAXIMA)
+
+
+class PlanificadorSondeo:
+    """
+    Calcula la espera hasta el siguiente sondeo de una cámara.
+
+    Attributes:
+        intervalo_minimo (float): Segundos entre sondeos con actividad reciente
+        intervalo_maximo (float): Segundos máximos entre sondeos sin actividad
+        ventana_actividad (float): Segundos sin placas que duplican el intervalo
+        espera_maxima (float): Espera máxima tras fallos de conexión
+        fallos_consecutivos (int): Sondeos fallidos seguidos
+    """
+
+    def __init__(self, intervalo_minimo=SONDEO_INTERVALO_MIN, intervalo_maximo=SONDEO_INTERVALO_MAX,
+                 ventana_actividad=SONDEO_VENTANA_ACTIVIDAD, espera_maxima=CAMARA_ESPERA_MAXIMA):
+        self.intervalo_minimo = intervalo_minimo
+        self.intervalo_maximo = max(intervalo_maximo, intervalo_minimo)
+        self.ventana_actividad = ventana_actividad
+        self.espera_maxima = espera_maxima
+        self.fallos_consecutivos = 0
+        self._ultima_actividad = time.monotonic()
+        self._despertar = threading.Event()
+        self._esperando = False
+        self._lock = threading.Lock()
+
+    def registrar(self, conectado, eventos=0):
+        """
+        Registra el resultado de un sondeo.
+
+        Args:
+            conectado (bool): True si la cámara respondió
+            eventos (int): Placas nuevas obtenidas
+
+        Returns:
+            None
+        """
+        self.fallos_consecutivos = 0 if conectado else self.fallos_consecutivos + 1
+        if eventos:
+            self.registrar_actividad()
+
+    def registrar_actividad(self):
+        """Registra una detección (también las recibidas por eventos push)."""
+        self._ultima_actividad = time.monotonic()
+
+    def siguiente_espera(self):
+        """
+        Returns:
+            float: Segundos hasta el siguiente sondeo
+        """
+        if self.fallos_consecutivos:
+            espera = min(self.intervalo_minimo * 2 ** min(self.fallos_consecutivos, 16), self.espera_maxima)
+            # Jitter: entre la mitad y el total de la espera
+            return random.uniform(espera / 2, espera)
+        inactivo = time.monotonic() - self._ultima_actividad
+        if inactivo < self.ventana_actividad or self.ventana_actividad <= 0:
+            return self.intervalo_minimo
+        ventanas = min(inactivo / self.ventana_actividad, 16)
+        return min(self.intervalo_minimo * 2 ** ventanas, self.intervalo_maximo)
+
+    def esperar(self):
+        """
+        Espera hasta el siguiente sondeo o hasta que se llame a despertar().
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._despertar.clear()
+            self._esperando = True
+        try:
+            self._despertar.wait(self.siguiente_espera())
+        finally:
+            with self._lock:
+                self._esperando = False
+                self._despertar.clear()
+
+    def despertar(self):
+        """
+        Adelanta el siguiente sondeo si hay una espera en curso.
+
+        Fuera de una espera no hace nada: los eventos push que llegan mientras
+        el stream funciona no deben provocar un sondeo de respaldo extra.
+
+        Returns:
+            bool: True si se interrumpió una espera
+        """
+        with self._lock:
+            if self._esperando:
+                self._despertar.set()
+            return self._esperando
+
+    def estado(self):
+        """
+        Returns:
+            dict: Fallos seguidos, segundos sin actividad y espera actual
+        """
+        return {
+            "fallos_consecutivos": self.fallos_consecutivos,
+            "segundos_sin_actividad": round(time.monotonic() - self._ultima_actividad, 1),
+            "espera": round(self.siguiente_espera(), 2),
+        }
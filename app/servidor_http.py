@@ -0,0 +1,413 @@
+"""
+Servidor HTTP local de detecciones
+
+Expone las detecciones a las pantallas de recepción y a la aplicación de los
+asesores, que antes solo podían leer la consola:
+
+    GET /api/ultima      Última detección (JSON)
+    GET /api/historial   Historial reciente, más reciente primero
+                         (?limite=50&antes_de=<id>&camara=...&placa=...)
+    GET /api/eventos     Stream Server-Sent Events con cada detección publicada
+                         (las actualizaciones de una detección repiten su id)
+
+y las métricas de rendimiento (ver app/metricas.py):
+
+    GET  /metrics                   Métricas en formato de texto Prometheus
+    GET  /api/metricas              Las mismas métricas en JSON
+    GET  /api/perfilador            Pilas muestreadas (formato "collapsed")
+    POST /api/perfilador/iniciar    Activa el perfilador por muestreo
+    POST /api/perfilador/detener    Lo desactiva (las muestras se conservan)
+
+Las respuestas se serializan una sola vez por cambio y se guardan en caché:
+la última detección y las tramas SSE se preparan al publicarse (suscripción al
+almacén de detecciones) y las páginas del historial se reutilizan mientras no
+se escriban detecciones nuevas. Las respuestas llevan ETag, por lo que un
+cliente que vuelve a preguntar sin cambios recibe un 304 sin cuerpo.
+
+Las respuestas contienen datos de clientes: por defecto el servidor solo
+escucha en 127.0.0.1 (HTTP_HOST) y solo los orígenes web de HTTP_ORIGENES
+reciben la cabecera CORS que permite leerlas desde un navegador. Las rutas
+del perfilador solo se atienden desde este equipo o con PERFILADOR_TOKEN, y
+las solicitudes POST de un origen web no permitido se rechazan.
+"""
+
+import hmac
+import ipaddress
+import json
+import queue
+import threading
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+from app.config import HTTP_ACTIVO, HTTP_HOST, HTTP_PUERTO, HTTP_ORIGENES, PERFILADOR_TOKEN
+from app.metricas import metricas, perfilador
+from app.state import almacen_detecciones
+
+# Detecciones recientes retenidas para el historial sin base de datos y para
+# reenviar a los clientes SSE que se reconectan (Last-Event-ID)
+MAX_RECIENTES = 500
+MAX_CACHE_HISTORIAL = 64
+LIMITE_HISTORIAL = 200
+INTERVALO_LATIDO = 15
+
+_TEXTO = "text/plain; version=0.0.4; charset=utf-8"
+
+_SIN_DETECCIONES = json.dumps({"mensaje": "Sin detecciones"}).encode("utf-8")
+
+
+def _serializar(datos):
+    return json.dumps(datos, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _trama(datos, json_deteccion=None):
+    # Evento SSE de una detección, con su id de historial como id del evento
+    return b"id: %d\nevent: deteccion\ndata: %s\n\n" % (datos["id"], json_deteccion or _serializar(datos))
+
+
+class _ManejadorDetecciones(BaseHTTPRequestHandler):
+    """Atiende las solicitudes de la API de detecciones."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        partes = urlsplit(self.path)
+        ruta = partes.path.rstrip("/")
+        if ruta == "/api/ultima":
+            self._responder(*self.server.ultima())
+        elif ruta == "/api/historial":
+            try:
+                version, cuerpo = self.server.historial(parse_qs(partes.query))
+            except ValueError as e:
+                self._responder(None, _serializar({"mensaje": str(e)}), estado=400)
+                return
+            self._responder(version, cuerpo)
+        elif ruta == "/api/eventos":
+            self._stream()
+        elif ruta == "/metrics":
+            self._responder(None, metricas.texto_prometheus().encode("utf-8"), tipo=_TEXTO)
+        elif ruta == "/api/metricas":
+            self._responder(None, _serializar(metricas.instantanea()))
+        elif ruta == "/api/perfilador":
+            if self._control_permitido():
+                self._responder(None, perfilador.reporte().encode("utf-8"), tipo=_TEXTO)
+        else:
+            self._responder(None, _serializar({"mensaje": "Ruta no encontrada"}), estado=404)
+
+    def do_POST(self):
+        longitud = int(self.headers.get("Content-Length") or 0)
+        if longitud:
+            self.rfile.read(longitud)
+        ruta = urlsplit(self.path).path.rstrip("/")
+        if not self._control_permitido():
+            return
+        if ruta == "/api/perfilador/iniciar":
+            perfilador.iniciar()
+        elif ruta == "/api/perfilador/detener":
+            perfilador.detener()
+        else:
+            self._responder(None, _serializar({"mensaje": "Ruta no encontrada"}), estado=404)
+            return
+        self._responder(None, _serializar({"perfilador_activo": perfilador.activo}))
+
+    def _control_permitido(self):
+        # Un navegador envía Origin en los POST entre sitios, incluso los "simples"
+        origen = self.headers.get("Origin")
+        if origen and origen.rstrip("/") not in HTTP_ORIGENES:
+            self._responder(None, _serializar({"mensaje": "Origen no permitido"}), estado=403)
+            return False
+        autorizacion = self.headers.get("Authorization", "")
+        if PERFILADOR_TOKEN and hmac.compare_digest(autorizacion.encode("utf-8"),
+                                                    f"Bearer {PERFILADOR_TOKEN}".encode("utf-8")):
+            return True
+        if ipaddress.ip_address(self.client_address[0].split("%")[0]).is_loopback:
+            return True
+        self._responder(None, _serializar({"mensaje": "Solo disponible desde este equipo o con PERFILADOR_TOKEN"}),
+                        estado=403)
+        return False
+
+    def _responder(self, version, cuerpo, estado=200, tipo="application/json; charset=utf-8"):
+        etag = f'"{version}"' if version is not None else None
+        if etag and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if cuerpo is _SIN_DETECCIONES:
+            estado = 404
+        self.send_response(estado)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self._cabecera_cors()
+        self.send_header("Cache-Control", "no-cache")
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def _cabecera_cors(self):
+        # Solo se permite leer la respuesta a los orígenes configurados
+        origen = self.headers.get("Origin")
+        if origen and origen.rstrip("/") in HTTP_ORIGENES:
+            self.send_header("Access-Control-Allow-Origin", origen)
+            self.send_header("Vary", "Origin")
+
+    def _stream(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self._cabecera_cors()
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        cola, pendientes = self.server.conectar_stream(self.headers.get("Last-Event-ID"))
+        try:
+            for trama in pendientes:
+                self.wfile.write(trama)
+            self.wfile.flush()
+            while not self.server.detenido.is_set() and self.server.conectado(cola):
+                try:
+                    trama = cola.get(timeout=INTERVALO_LATIDO)
+                except queue.Empty:
+                    # Comentario SSE: mantiene viva la conexión y detecta clientes caídos
+                    trama = b": latido\n\n"
+                self.wfile.write(trama)
+                self.wfile.flush()
+        except OSError:
+            pass
+        finally:
+            self.server.desconectar_stream(cola)
+
+    def log_message(self, formato, *args):
+        pass
+
+
+class ServidorDetecciones(ThreadingHTTPServer):
+    """
+    Servidor HTTP con la API de detecciones.
+
+    Attributes:
+        historial (HistorialDetecciones): Historial persistente (None = solo
+                                          las detecciones recientes en memoria)
+        detenido (threading.Event): Indica a los streams abiertos que terminen
+    """
+
+    daemon_threads = True
+
+    def __init__(self, direccion, historial=None, almacen=almacen_detecciones):
+        super().__init__(direccion, _ManejadorDetecciones)
+        self.fuente_historial = historial
+        self.almacen = almacen
+        self.detenido = threading.Event()
+        self._lock = threading.Lock()
+        self._version = 0
+        self._ultima_secuencia = 0
+        self._ultima = _SIN_DETECCIONES
+        self._recientes = deque(maxlen=MAX_RECIENTES)
+        self._tramas = deque(maxlen=MAX_RECIENTES)
+        self._clientes = set()
+        self._cache_historial = OrderedDict()
+        self._cancelar_suscripcion = None
+
+    def iniciar(self):
+        """
+        Se suscribe a las detecciones y atiende las solicitudes en un hilo daemon.
+
+        Returns:
+            threading.Thread: Hilo del servidor
+        """
+        self._ultima_secuencia = self.almacen.secuencia
+        ultima = self.almacen.ultima()
+        if ultima is not None:
+            self._al_publicar(ultima)
+        self._cancelar_suscripcion = self.almacen.suscribir(self._al_publicar)
+        hilo = threading.Thread(target=self.serve_forever, name="servidor-http", daemon=True)
+        hilo.start()
+        return hilo
+
+    def detener(self):
+        """Cierra los streams abiertos y detiene el servidor."""
+        self.detenido.set()
+        if self._cancelar_suscripcion is not None:
+            self._cancelar_suscripcion()
+        self.shutdown()
+        self.server_close()
+
+    def ultima(self):
+        """
+        Returns:
+            tuple: (versión, bytes JSON) de la última detección
+        """
+        with self._lock:
+            return self._version, self._ultima
+
+    def historial(self, parametros):
+        """
+        Página del historial, serializada y guardada en caché.
+
+        Args:
+            parametros (dict): Parámetros de la consulta (parse_qs)
+
+        Returns:
+            tuple: (versión, bytes JSON) - la versión cambia con cada detección nueva
+
+        Raises:
+            ValueError: Si 'limite' o 'antes_de' no son números
+        """
+        def entero(nombre, defecto=None):
+            valor = parametros.get(nombre, [None])[0]
+            if valor in (None, ""):
+                return defecto
+            try:
+                return int(valor)
+            except ValueError:
+                raise ValueError(f"'{nombre}' debe ser un número entero")
+
+        limite = max(1, min(entero("limite", 50), LIMITE_HISTORIAL))
+        antes_de = entero("antes_de")
+        camara = parametros.get("camara", [None])[0]
+        placa = parametros.get("placa", [None])[0]
+
+        version = self._version_historial()
+        clave = (limite, antes_de, camara, placa)
+        with self._lock:
+            guardado = self._cache_historial.get(clave)
+            if guardado is not None and guardado[0] == version:
+                self._cache_historial.move_to_end(clave)
+                return guardado
+
+        if self.fuente_historial is not None:
+            detecciones = self.fuente_historial.consultar(limite=limite, antes_de=antes_de, camara=camara,
+                                                          placa=placa)
+        else:
+            with self._lock:
+                recientes = list(self._recientes)
+            detecciones = [d for d in reversed(recientes)
+                           if (antes_de is None or d["id"] < antes_de)
+                           and (camara is None or d["camara"] == camara)
+                           and (placa is None or d["placa"] == placa)][:limite]
+        respuesta = {"detecciones": detecciones,
+                     "siguiente": detecciones[-1]["id"] if len(detecciones) == limite else None}
+        resultado = (version, _serializar(respuesta))
+
+        with self._lock:
+            self._cache_historial[clave] = resultado
+            while len(self._cache_historial) > MAX_CACHE_HISTORIAL:
+                self._cache_historial.popitem(last=False)
+        return resultado
+
+    def conectar_stream(self, ultimo_id=None):
+        """
+        Registra un cliente SSE.
+
+        Las detecciones perdidas se reenvían desde las tramas recientes en
+        memoria y, si son anteriores (p. ej. el cliente se reconecta tras un
+        reinicio del sistema), desde el historial persistente.
+
+        Args:
+            ultimo_id (str): Cabecera Last-Event-ID del cliente que se reconecta
+
+        Returns:
+            tuple: (queue.Queue de tramas, list de tramas perdidas a reenviar)
+        """
+        cola = queue.Queue(MAX_RECIENTES)
+        ultimo = int(ultimo_id) if ultimo_id and ultimo_id.isdigit() else None
+        with self._lock:
+            self._clientes.add(cola)
+            if ultimo is None:
+                return cola, []
+            pendientes = [trama for secuencia, trama in self._tramas if secuencia > ultimo]
+            # Las detecciones posteriores a 'tope' llegan por la cola o por las tramas en memoria
+            tope = self._tramas[0][0] - 1 if self._tramas else self._ultima_secuencia
+        if self.fuente_historial is not None and tope > ultimo:
+            anteriores = self.fuente_historial.consultar(limite=MAX_RECIENTES, antes_de=tope + 1,
+                                                         despues_de=ultimo)
+            pendientes = [_trama(datos) for datos in reversed(anteriores)] + pendientes
+        return cola, pendientes
+
+    def conectado(self, cola):
+        """
+        Returns:
+            bool: False si el cliente fue desconectado por no leer sus detecciones
+        """
+        return cola in self._clientes
+
+    def desconectar_stream(self, cola):
+        """Deja de enviar detecciones a un cliente SSE."""
+        with self._lock:
+            self._clientes.discard(cola)
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: Clientes SSE conectados y páginas del historial en caché
+        """
+        with self._lock:
+            return {"clientes_stream": len(self._clientes), "paginas_en_cache": len(self._cache_historial)}
+
+    def _version_historial(self):
+        if self.fuente_historial is not None:
+            # Las páginas cambian cuando el historial escribe un lote nuevo
+            return f"h{self.fuente_historial.estadisticas()['escritas']}"
+        return self._version
+
+    def _al_publicar(self, deteccion):
+        # Mismo formato que las filas de HistorialDetecciones.consultar()
+        datos = deteccion.a_dict()
+        datos["id"] = datos.pop("secuencia")
+        del datos["revision"]
+        datos["fecha"] = deteccion.fecha.isoformat()
+        datos["ultima_lectura"] = deteccion.ultima_lectura.isoformat()
+        datos["actualizado"] = deteccion.actualizado.isoformat(timespec="seconds")
+        json_deteccion = _serializar(datos)
+        trama = _trama(datos, json_deteccion)
+        with self._lock:
+            if deteccion.revision:
+                # Actualización: reemplaza la detección en memoria y conserva su id
+                self._version = f"{deteccion.secuencia}.{deteccion.revision}"
+                if self.almacen.ultima() is deteccion:
+                    self._ultima = json_deteccion
+                for i, reciente in enumerate(self._recientes):
+                    if reciente["id"] == deteccion.secuencia:
+                        self._recientes[i] = datos
+                for i, (secuencia, _) in enumerate(self._tramas):
+                    if secuencia == deteccion.secuencia:
+                        self._tramas[i] = (secuencia, trama)
+            else:
+                self._version = deteccion.secuencia
+                self._ultima_secuencia = max(self._ultima_secuencia, deteccion.secuencia)
+                self._ultima = json_deteccion
+                self._recientes.append(datos)
+                self._tramas.append((deteccion.secuencia, trama))
+            clientes = list(self._clientes)
+        for cola in clientes:
+            try:
+                cola.put_nowait(trama)
+            except queue.Full:
+                # Cliente que no lee: se desconecta para no retener memoria
+                self.desconectar_stream(cola)
+
+
+def iniciar_servidor_http(historial=None):
+    """
+    Inicia el servidor HTTP de detecciones si está activado.
+
+    Args:
+        historial (HistorialDetecciones): Historial persistente para /api/historial
+
+    Returns:
+        ServidorDetecciones: Servidor iniciado, o None si está desactivado o
+                             el puerto no está disponible
+    """
+    if not HTTP_ACTIVO:
+        return None
+    try:
+        servidor = ServidorDetecciones((HTTP_HOST, HTTP_PUERTO), historial)
+    except OSError as e:
+        print(f"No se pudo iniciar el servidor HTTP en el puerto {HTTP_PUERTO}: {e}")
+        return None
+    servidor.iniciar()
+    metricas.registrar_indicadores("servidor_http", servidor.estadisticas)
+    return servidor
@@ -0,0 +1,218 @@
+"""
+Agrupación de lecturas repetidas en pasos de vehículo
+
+Un vehículo detenido frente a la barrera produce varias lecturas de su placa
+con pocos segundos de diferencia, a veces con algún carácter mal leído. Cada
+lectura tiene su propio captureTime, por lo que el control de duplicados
+(crear_id_evento_exacto) las trata como eventos distintos.
+
+SesionizadorPasos agrupa las lecturas de la misma placa, o de una casi igual
+(ver app/coincidencia.py), que llegan dentro de SESION_VENTANA segundos de la
+anterior en un único paso de vehículo:
+
+- La primera lectura abre el paso y sigue el camino normal (consulta de cita
+  y publicación inmediata).
+- Las siguientes solo actualizan 'lecturas' y 'ultima_lectura' del evento del
+  paso; no consultan la cita ni se publican.
+- Cuando pasa la ventana sin lecturas nuevas el paso se cierra y, si recibió
+  lecturas después de publicarse, su detección se actualiza una sola vez con
+  el total (conserva su id; ver AlmacenDetecciones.actualizar).
+"""
+
+import threading
+import time
+from datetime import timedelta
+
+from app.coincidencia import clave_confusion, distancia_edicion
+from app.config import SESION_VENTANA, SESION_DISTANCIA_MAXIMA
+
+
+class _Paso:
+    __slots__ = ("evento", "camara", "vence", "deteccion")
+
+    def __init__(self, evento, camara, vence):
+        self.evento = evento
+        self.camara = camara
+        self.vence = vence
+        self.deteccion = None
+
+
+class SesionizadorPasos:
+    """
+    Pasos de vehículo abiertos por cámara.
+
+    Attributes:
+        ventana (float): Segundos máximos entre dos lecturas del mismo paso
+                         (0 desactiva la agrupación)
+        distancia_maxima (int): Caracteres distintos tolerados entre lecturas
+                                (además de las confusiones 0/O, 1/I, 8/B...)
+        al_cerrar (callable): Recibe (deteccion, evento) al cerrarse un paso
+                              con lecturas aún no publicadas
+        max_pasos (int): Pasos abiertos como máximo (se cierran los más antiguos)
+    """
+
+    def __init__(self, ventana=SESION_VENTANA, distancia_maxima=SESION_DISTANCIA_MAXIMA, al_cerrar=None,
+                 max_pasos=1000):
+        self.ventana = ventana
+        self.distancia_maxima = distancia_maxima
+        self.al_cerrar = al_cerrar
+        self.max_pasos = max_pasos
+        self._pasos = {}
+        self._lock = threading.Lock()
+        self._hay_pasos = threading.Event()
+        self._detener = threading.Event()
+        self._hilo = None
+        self._abiertos = 0
+        self._agrupadas = 0
+        self._cerrados = 0
+
+    def agrupar(self, evento, camara):
+        """
+        Suma una lectura a un paso abierto o abre uno nuevo.
+
+        El evento que abre un paso recibe 'lecturas' y 'ultima_lectura', que se
+        actualizan con cada lectura agrupada.
+
+        Args:
+            evento (dict): Evento con 'placa' y 'fecha'
+            camara (Camara): Cámara que detectó la placa
+
+        Returns:
+            bool: True si la lectura pertenece a un paso abierto (no debe
+                  procesarse), False si abre un paso nuevo
+        """
+        evento.setdefault("lecturas", 1)
+        evento.setdefault("ultima_lectura", evento["fecha"])
+        if self.ventana <= 0:
+            return False
+
+        clave = clave_confusion(evento["placa"])
+        cerrados = []
+        with self._lock:
+            pasos = self._pasos.setdefault(camara.nombre, {})
+            paso = self._buscar(pasos, clave, evento["fecha"])
+            if paso is not None:
+                abierto = paso.evento
+                abierto["lecturas"] += 1
+                if evento["fecha"] > abierto["ultima_lectura"]:
+                    abierto["ultima_lectura"] = evento["fecha"]
+                paso.vence = time.monotonic() + self.ventana
+                self._agrupadas += 1
+                return True
+
+            # Misma placa fuera de la ventana: el paso anterior termina aquí
+            if clave in pasos:
+                cerrados.append(pasos.pop(clave))
+            pasos[clave] = _Paso(evento, camara, time.monotonic() + self.ventana)
+            self._abiertos += 1
+            while sum(len(p) for p in self._pasos.values()) > self.max_pasos:
+                cerrados.append(self._quitar_mas_antiguo())
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._ejecutar, name="pasos-vehiculo", daemon=True)
+                self._hilo.start()
+        self._hay_pasos.set()
+        for paso in cerrados:
+            self._cerrar(paso)
+        return False
+
+    def asociar(self, evento, camara, deteccion):
+        """
+        Guarda la última detección publicada del paso que abrió un evento.
+
+        Args:
+            evento (dict): Evento que abrió el paso
+            camara (Camara): Cámara que detectó la placa
+            deteccion (Deteccion): Detección publicada
+
+        Returns:
+            None
+        """
+        with self._lock:
+            paso = self._pasos.get(camara.nombre, {}).get(clave_confusion(evento["placa"]))
+            if paso is not None and paso.evento is evento:
+                paso.deteccion = deteccion
+
+    def cerrar_vencidos(self, todos=False):
+        """
+        Cierra los pasos sin lecturas durante la ventana.
+
+        Un paso cuya primera lectura aún no se publicó (consulta de cita en
+        curso) se mantiene abierto hasta que se publique.
+
+        Args:
+            todos (bool): Cerrar también los pasos que no han vencido
+
+        Returns:
+            int: Pasos cerrados
+        """
+        ahora = time.monotonic()
+        cerrados = []
+        with self._lock:
+            for pasos in self._pasos.values():
+                for clave, paso in list(pasos.items()):
+                    if todos or (paso.vence <= ahora and paso.deteccion is not None):
+                        cerrados.append(pasos.pop(clave))
+                    elif paso.vence <= ahora:
+                        paso.vence = ahora + self.ventana
+        for paso in cerrados:
+            self._cerrar(paso)
+        return len(cerrados)
+
+    def detener(self):
+        """Cierra los pasos abiertos y detiene el hilo de cierre."""
+        self._detener.set()
+        self._hay_pasos.set()
+        self.cerrar_vencidos(todos=True)
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: Pasos abiertos en este momento, pasos totales, lecturas
+                  agrupadas y pasos cerrados
+        """
+        with self._lock:
+            return {"abiertos": sum(len(p) for p in self._pasos.values()), "pasos": self._abiertos,
+                    "lecturas_agrupadas": self._agrupadas, "cerrados": self._cerrados}
+
+    def _buscar(self, pasos, clave, fecha):
+        margen = timedelta(seconds=self.ventana)
+        candidatos = [pasos[clave]] if clave in pasos else []
+        if not candidatos and self.distancia_maxima > 0:
+            candidatos = [paso for otra, paso in pasos.items()
+                          if distancia_edicion(clave, otra, self.distancia_maxima) <= self.distancia_maxima]
+        for paso in candidatos:
+            evento = paso.evento
+            if evento["fecha"] - margen <= fecha <= evento["ultima_lectura"] + margen:
+                return paso
+        return None
+
+    def _quitar_mas_antiguo(self):
+        nombre, clave = min(((nombre, clave) for nombre, pasos in self._pasos.items() for clave in pasos),
+                            key=lambda x: self._pasos[x[0]][x[1]].vence)
+        return self._pasos[nombre].pop(clave)
+
+    def _cerrar(self, paso):
+        with self._lock:
+            self._cerrados += 1
+        # Solo se publica si hubo lecturas después de la última publicación del paso
+        if (paso.deteccion is not None and paso.evento["lecturas"] > paso.deteccion.lecturas
+                and self.al_cerrar is not None):
+            try:
+                self.al_cerrar(paso.deteccion, paso.evento)
+            except Exception as e:
+                print(f"[{paso.camara.nombre}] Error al cerrar el paso de {paso.evento['placa']}: {e}")
+
+    def _ejecutar(self):
+        while not self._detener.is_set():
+            self._hay_pasos.wait()
+            self._hay_pasos.clear()
+            while not self._detener.is_set():
+                self.cerrar_vencidos()
+                with self._lock:
+                    vencimientos = [paso.vence for pasos in self._pasos.values() for paso in pasos.values()]
+                if not vencimientos:
+                    break
+                # Espera al vencimiento más próximo (o a un paso nuevo)
+                espera = max(0.1, min(vencimientos) - time.monotonic())
+                if self._hay_pasos.wait(espera):
+                    self._hay_pasos.clear()
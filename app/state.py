@@ -10,24 +10,262 @@ el historial de eventos procesados. Proporciona funciones para:
 3. Controlar qué eventos han sido procesados para evitar duplicación
 4. Generar identificadores únicos para eventos de detección
 
+Cada detección se publica como un registro inmutable (Deteccion) en el
+almacén 'almacen_detecciones', que reemplaza el registro completo de una sola
+vez: los lectores nunca ven una placa nueva con la cita anterior. Los
+consumidores (p. ej. la consola de run.py) se suscriben con una función o una
+cola y reciben cada detección en cuanto se publica, sin sondear el estado.
+
 El estado se mantiene en memoria durante la ejecución del programa y es
-compartido entre los diferentes componentes de la aplicación.
+compartido entre los diferentes componentes de la aplicación. El registro de
+eventos procesados está acotado por tamaño y por ventana de tiempo (ver
+app/dedup.py), por lo que la memoria se mantiene estable en servicios de
+larga duración.
 """
 
+import queue
+import threading
 from datetime import datetime
+from app.config import DEDUP_MAX_EVENTOS, DEDUP_VENTANA_SEGUNDOS
+from app.dedup import RegistroEventos
+from app.metricas import metricas
+
+class Deteccion:
+    """
+    Registro inmutable de una detección de placa y el resultado de su cita.
+
+    Attributes:
+        placa (str): Número de placa detectado
+        camara (str): Nombre de la cámara que detectó la placa
+        fecha (datetime): Fecha y hora de la captura
+        tiene_cita (bool): True si la placa tiene cita
+        datos_cita (dict): Cita tal como la devuelve la API (o None)
+        mensaje (str): Estado para mostrar ("CITA ENCONTRADA", error...)
+        coincidencia (str): "exacta", "aproximada" o None si no hay cita
+        placa_cita (str): Placa de la cita encontrada
+        puntaje (float): Puntaje de la coincidencia (1.0 si es exacta)
+        actualizado (datetime): Momento de la publicación
+        pendiente (bool): True si la cita aún no pudo consultarse (se publicará
+                          de nuevo cuando el servicio de citas responda)
+        secuencia (int): Número de publicación en el almacén (0 si no se publicó)
+        ultima_lectura (datetime): Captura más reciente del mismo paso del vehículo
+                                   ('fecha' es la primera; ver app/sesiones.py)
+        lecturas (int): Lecturas de la cámara agrupadas en este paso
+        revision (int): Número de la última actualización de la detección en el
+                        almacén (0 = detección nueva; ver AlmacenDetecciones.actualizar)
+    """
+
+    __slots__ = ("placa", "camara", "fecha", "tiene_cita", "datos_cita", "mensaje", "coincidencia",
+                 "placa_cita", "puntaje", "actualizado", "pendiente", "secuencia", "ultima_lectura", "lecturas",
+                 "revision")
+
+    def __init__(self, placa, camara, fecha, tiene_cita=False, datos_cita=None, mensaje=None,
+                 coincidencia=None, placa_cita=None, puntaje=None, actualizado=None, pendiente=False,
+                 secuencia=0, ultima_lectura=None, lecturas=1, revision=0):
+        valores = (placa, camara, fecha, tiene_cita, datos_cita, mensaje, coincidencia, placa_cita,
+                   puntaje, actualizado or datetime.now(), pendiente, secuencia, ultima_lectura or fecha, lecturas,
+                   revision)
+        for nombre, valor in zip(self.__slots__, valores):
+            object.__setattr__(self, nombre, valor)
+
+    def __setattr__(self, nombre, valor):
+        raise AttributeError("Deteccion es inmutable")
+
+    def __delattr__(self, nombre):
+        raise AttributeError("Deteccion es inmutable")
+
+    def __repr__(self):
+        return f"Deteccion({self.placa!r}, {self.camara!r}, {self.fecha!r}, {self.mensaje!r})"
+
+    def reemplazar(self, **cambios):
+        """
+        Returns:
+            Deteccion: Copia con los campos indicados modificados
+        """
+        valores = {nombre: getattr(self, nombre) for nombre in self.__slots__}
+        valores.update(cambios)
+        return Deteccion(**valores)
+
+    def a_dict(self):
+        """
+        Returns:
+            dict: Campos de la detección con las fechas como texto
+                  ("%Y-%m-%d %H:%M:%S"), en el formato del antiguo 'ultima_consulta'
+        """
+        datos = {nombre: getattr(self, nombre) for nombre in self.__slots__}
+        datos["fecha"] = self.fecha.strftime("%Y-%m-%d %H:%M:%S")
+        datos["actualizado"] = self.actualizado.strftime("%Y-%m-%d %H:%M:%S")
+        datos["ultima_lectura"] = self.ultima_lectura.strftime("%Y-%m-%d %H:%M:%S")
+        return datos
+
+
+class AlmacenDetecciones:
+    """
+    Almacén de la última detección, seguro entre hilos, con notificaciones.
+
+    Attributes:
+        max_cola (int): Capacidad por defecto de las colas de suscripción
+        descartadas (int): Detecciones descartadas porque una cola estaba llena
+    """
+
+    def __init__(self, max_cola=100):
+        self.max_cola = max_cola
+        self.descartadas = 0
+        self._lock = threading.Lock()
+        self._ultima = None
+        self._secuencia = 0
+        self._revision = 0
+        self._suscriptores = []
+        self._colas = []
+
+    def publicar(self, deteccion):
+        """
+        Publica una detección: la reemplaza como la última y avisa a los suscriptores.
+
+        Args:
+            deteccion (Deteccion): Detección a publicar
+
+        Returns:
+            Deteccion: La detección publicada, con su número de secuencia
+        """
+        with self._lock:
+            self._secuencia += 1
+            deteccion = deteccion.reemplazar(secuencia=self._secuencia)
+            self._ultima = deteccion
+            suscriptores = list(self._suscriptores)
+            colas = list(self._colas)
+        return self._notificar(deteccion, suscriptores, colas)
+
+    def actualizar(self, deteccion):
+        """
+        Publica los datos nuevos de una detección ya publicada (cita completada,
+        total de lecturas de su paso...).
+
+        La detección conserva su número de secuencia y recibe un número de
+        revisión nuevo, distinto en cada actualización. Solo
+        reemplaza a la última si es la misma detección o si no se publicó
+        después otra con una captura más reciente.
+
+        Args:
+            deteccion (Deteccion): Detección publicada con los campos actualizados
+
+        Returns:
+            Deteccion: La detección actualizada
+        """
+        with self._lock:
+            self._revision += 1
+            deteccion = deteccion.reemplazar(revision=self._revision)
+            ultima = self._ultima
+            if ultima is None or ultima.secuencia == deteccion.secuencia or deteccion.fecha >= ultima.fecha:
+                self._ultima = deteccion
+            suscriptores = list(self._suscriptores)
+            colas = list(self._colas)
+        return self._notificar(deteccion, suscriptores, colas)
+
+    def _notificar(self, deteccion, suscriptores, colas):
+        for cola in colas:
+            self._encolar(cola, deteccion)
+        for funcion in suscriptores:
+            try:
+                funcion(deteccion)
+            except Exception as e:
+                print(f"Error en un suscriptor de detecciones: {e}")
+        return deteccion
+
+    def ultima(self):
+        """
+        Returns:
+            Deteccion: Última detección publicada o None si aún no hay ninguna
+        """
+        return self._ultima
+
+    @property
+    def secuencia(self):
+        """Número de secuencia de la última detección publicada."""
+        return self._secuencia
+
+    def continuar_secuencia(self, ultima):
+        """
+        Continúa la numeración a partir de la última detección de un reinicio
+        anterior (ver HistorialDetecciones.ultimo_id), para que los números
+        de secuencia no se repitan entre ejecuciones.
+
+        Args:
+            ultima (int): Último número de secuencia ya usado
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._secuencia = max(self._secuencia, ultima)
+
+    def suscribir(self, funcion):
+        """
+        Registra una función que se llama con cada detección publicada.
+
+        La función se ejecuta en el hilo que publica, por lo que debe ser breve.
+        También recibe las actualizaciones (revision > 0), que conservan el
+        número de secuencia de la detección original.
+
+        Args:
+            funcion (callable): Recibe un objeto Deteccion
+
+        Returns:
+            callable: Función sin argumentos que cancela la suscripción
+        """
+        with self._lock:
+            self._suscriptores.append(funcion)
+
+        def cancelar():
+            with self._lock:
+                if funcion in self._suscriptores:
+                    self._suscriptores.remove(funcion)
+        return cancelar
+
+    def crear_cola(self, max_elementos=None):
+        """
+        Crea una cola que recibe cada detección publicada.
+
+        Si el consumidor se atrasa y la cola se llena, se descarta la detección
+        más antigua de la cola.
+
+        Args:
+            max_elementos (int): Capacidad de la cola (por defecto max_cola)
+
+        Returns:
+            queue.Queue: Cola de objetos Deteccion
+        """
+        cola = queue.Queue(max_elementos or self.max_cola)
+        with self._lock:
+            self._colas.append(cola)
+        return cola
+
+    def cerrar_cola(self, cola):
+        """Deja de enviar detecciones a una cola creada con crear_cola()."""
+        with self._lock:
+            if cola in self._colas:
+                self._colas.remove(cola)
+
+    def _encolar(self, cola, deteccion):
+        while True:
+            try:
+                cola.put_nowait(deteccion)
+                return
+            except queue.Full:
+                try:
+                    cola.get_nowait()
+                    with self._lock:
+                        self.descartadas += 1
+                except queue.Empty:
+                    pass
+
 
 # Estado compartido de la aplicación
-ultima_consulta = {
-    "placa": None,
-    "fecha": None,
-    "tiene_cita": False,
-    "datos_cita": None,
-    "mensaje": None,
-    "actualizado": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-}
-
-# Conjunto para almacenar los eventos exactos ya procesados
-eventos_exactos_procesados = set()
+almacen_detecciones = AlmacenDetecciones()
+metricas.registrar_indicadores("almacen", lambda: {"detecciones_descartadas": almacen_detecciones.descartadas})
+
+# Registro acotado de los eventos exactos ya procesados
+eventos_exactos_procesados = RegistroEventos(DEDUP_MAX_EVENTOS, DEDUP_VENTANA_SEGUNDOS)
 
 def crear_id_evento_exacto(placa, fecha):
     """
@@ -35,68 +273,109 @@ def crear_id_evento_exacto(placa, fecha):
     
     Este identificador permite determinar si un evento específico ya ha sido
     procesado, evitando duplicados. Se compone del número de placa combinado
-    con la fecha y hora exacta de detección, formateado como una cadena única.
+    con la fecha y hora exacta de detección en segundos epoch, lo que permite
+    descartar eventos por antigüedad sin volver a interpretar fechas.
     
     Args:
         placa (str): Número de placa detectado
         fecha (datetime): Fecha y hora de la detección
         
     Returns:
-        str: Identificador único para el evento en formato "PLACA_YYYYMMDDHHMMSS"
+        tuple: Identificador único para el evento (placa, segundos epoch)
     """
-    return f"{placa}_{fecha.strftime('%Y%m%d%H%M%S')}"
+    return (placa, int(fecha.timestamp()))
 
-def actualizar_datos(resultado_cita, placa, fecha):
+def construir_deteccion(resultado_cita, placa, fecha, camara=None):
     """
-    Actualiza el estado global con los datos de la última consulta y cita.
-    
-    Esta función actualiza el diccionario global 'ultima_consulta' con la
-    información de la placa detectada y el resultado de la consulta a la API
-    de citas. Analiza la respuesta JSON de la API para determinar si el vehículo
-    tiene una cita programada y extrae los datos relevantes.
-    
+    Construye el registro de una detección a partir de la respuesta de citas.
+
+    Analiza la respuesta JSON de la API para determinar si el vehículo tiene
+    una cita programada y extrae los datos relevantes.
+
+    Cuando hay cita, 'coincidencia' indica si la placa coincidió de forma
+    "exacta" o "aproximada" (con la placa de la cita y su puntaje).
+
     Args:
         resultado_cita (dict): Respuesta JSON de la API de citas o None si hubo error
         placa (str): Número de placa detectado
         fecha (datetime): Fecha y hora de la detección
-        
+        camara (str): Nombre de la cámara que detectó la placa
+
     Returns:
-        None: La función actualiza el estado global directamente
+        Deteccion: Registro de la detección (aún sin publicar)
     """
-    global ultima_consulta
-    
-    # Actualizar los datos básicos
-    ultima_consulta["placa"] = placa
-    ultima_consulta["fecha"] = fecha.strftime("%Y-%m-%d %H:%M:%S")
-    ultima_consulta["actualizado"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
     # Si resultado_cita es None, establecer mensaje de error
     if resultado_cita is None:
-        ultima_consulta["tiene_cita"] = False
-        ultima_consulta["datos_cita"] = None
-        ultima_consulta["mensaje"] = "ERROR DE CONEXIÓN"
-        return
-    
+        return Deteccion(placa, camara, fecha, mensaje="ERROR DE CONEXIÓN")
+
     # Si hay un mensaje de error, mostrarlo correctamente
     if isinstance(resultado_cita, dict) and "mensaje" in resultado_cita and resultado_cita.get("codigo") == "1":
-        ultima_consulta["tiene_cita"] = False
-        ultima_consulta["datos_cita"] = None
-        ultima_consulta["mensaje"] = resultado_cita["mensaje"]
-        return
-    
+        return Deteccion(placa, camara, fecha, mensaje=resultado_cita["mensaje"],
+                         pendiente=bool(resultado_cita.get("pendiente")))
+
     # Procesar respuesta normal
     if resultado_cita and "codigo" in resultado_cita:
         if resultado_cita["codigo"] == "0" and resultado_cita.get("listadoDatosAgendamiento", []):
             # Guardar la cita completa tal como viene de la API
             cita = resultado_cita["listadoDatosAgendamiento"][0]
-            ultima_consulta["tiene_cita"] = True
-            ultima_consulta["datos_cita"] = cita
-            ultima_consulta["mensaje"] = "CITA ENCONTRADA"
-        else:
-            ultima_consulta["tiene_cita"] = False
-            ultima_consulta["datos_cita"] = None
-            ultima_consulta["mensaje"] = resultado_cita.get("mensaje", "NO SE ENCONTRARON RESULTADOS")
-    else:
-        ultima_consulta["tiene_cita"] = False
-        ultima_consulta["datos_cita"] = None
-        ultima_consulta["mensaje"] = "FORMATO DE RESPUESTA INVÁLIDO" 
\ No newline at end of file
+            coincidencia = resultado_cita.get("coincidencia")
+            if coincidencia:
+                return Deteccion(placa, camara, fecha, True, cita, "CITA ENCONTRADA (COINCIDENCIA APROXIMADA)",
+                                 coincidencia["tipo"], coincidencia["placa"], coincidencia["puntaje"])
+            return Deteccion(placa, camara, fecha, True, cita, "CITA ENCONTRADA", "exacta", placa, 1.0)
+        return Deteccion(placa, camara, fecha,
+                         mensaje=resultado_cita.get("mensaje", "NO SE ENCONTRARON RESULTADOS"))
+    return Deteccion(placa, camara, fecha, mensaje="FORMATO DE RESPUESTA INVÁLIDO")
+
+def actualizar_datos(resultado_cita, placa, fecha, camara=None, ultima_lectura=None, lecturas=1):
+    """
+    Publica en el estado global los datos de la última consulta y cita.
+
+    Args:
+        resultado_cita (dict): Respuesta JSON de la API de citas o None si hubo error
+        placa (str): Número de placa detectado
+        fecha (datetime): Fecha y hora de la detección
+        camara (str): Nombre de la cámara que detectó la placa
+        ultima_lectura (datetime): Última lectura del paso del vehículo (por defecto 'fecha')
+        lecturas (int): Lecturas agrupadas en el paso
+
+    Returns:
+        Deteccion: La detección publicada en 'almacen_detecciones'
+    """
+    deteccion = construir_deteccion(resultado_cita, placa, fecha, camara)
+    if lecturas > 1 or ultima_lectura is not None:
+        deteccion = deteccion.reemplazar(ultima_lectura=ultima_lectura or fecha, lecturas=lecturas)
+    return almacen_detecciones.publicar(deteccion)
+
+def actualizar_paso(deteccion, ultima_lectura, lecturas):
+    """
+    Actualiza una detección publicada con el total de lecturas de su paso.
+
+    Args:
+        deteccion (Deteccion): Última detección publicada del paso
+        ultima_lectura (datetime): Captura más reciente del paso
+        lecturas (int): Lecturas agrupadas
+
+    Returns:
+        Deteccion: La detección actualizada en 'almacen_detecciones'
+    """
+    return almacen_detecciones.actualizar(deteccion.reemplazar(ultima_lectura=ultima_lectura, lecturas=lecturas,
+                                                             actualizado=datetime.now()))
+
+def actualizar_cita(deteccion, resultado_cita, ultima_lectura=None, lecturas=None):
+    """
+    Actualiza una detección publicada como pendiente con la respuesta de su cita.
+
+    Args:
+        deteccion (Deteccion): Detección pendiente ya publicada
+        resultado_cita (dict): Respuesta JSON de la API de citas
+        ultima_lectura (datetime): Captura más reciente del paso (por defecto la de la detección)
+        lecturas (int): Lecturas agrupadas en el paso (por defecto las de la detección)
+
+    Returns:
+        Deteccion: La detección actualizada en 'almacen_detecciones'
+    """
+    nueva = construir_deteccion(resultado_cita, deteccion.placa, deteccion.fecha, deteccion.camara)
+    return almacen_detecciones.actualizar(nueva.reemplazar(secuencia=deteccion.secuencia,
+                                                           ultima_lectura=ultima_lectura or deteccion.ultima_lectura,
+                                                           lecturas=lecturas or deteccion.lecturas))
@@ -0,0 +1,81 @@
+"""
+Supervisor de monitoreo multi-cámara
+
+Arranca un hilo de ingesta por cada cámara registrada y vigila que sigan
+vivos. Cada hilo trabaja con el cursor, el registro de duplicados, el pool de
+consultas y la espera de reintentos de su propia cámara, por lo que una cámara
+lenta o fuera de línea no retrasa las detecciones de las demás.
+"""
+
+import threading
+
+
+class Supervisor:
+    """
+    Supervisa un hilo de monitoreo por cámara.
+
+    Attributes:
+        camaras (list): Cámaras registradas (objetos Camara)
+        objetivo (callable): Bucle de monitoreo que recibe una cámara
+        intervalo_revision (float): Segundos entre revisiones de los hilos
+    """
+
+    def __init__(self, camaras, objetivo, intervalo_revision=5):
+        self.camaras = camaras
+        self.objetivo = objetivo
+        self.intervalo_revision = intervalo_revision
+        self.hilos = {}
+        self.reinicios = {camara.nombre: 0 for camara in camaras}
+        self._detener = threading.Event()
+
+    def iniciar(self):
+        """
+        Arranca los hilos de las cámaras y el hilo de supervisión.
+
+        Returns:
+            threading.Thread: Hilo de supervisión
+        """
+        for camara in self.camaras:
+            self._arrancar(camara)
+        hilo = threading.Thread(target=self._supervisar, name="supervisor", daemon=True)
+        hilo.start()
+        return hilo
+
+    def detener(self):
+        """Detiene la supervisión (los hilos de cámara son daemon)."""
+        self._detener.set()
+
+    def estado(self):
+        """
+        Returns:
+            list: Estado de cada cámara, con si su hilo está vivo y sus reinicios
+        """
+        estados = []
+        for camara in self.camaras:
+            estado = camara.estado()
+            hilo = self.hilos.get(camara.nombre)
+            estado["activo"] = bool(hilo and hilo.is_alive())
+            estado["reinicios"] = self.reinicios[camara.nombre]
+            estados.append(estado)
+        return estados
+
+    def _arrancar(self, camara):
+        hilo = threading.Thread(target=self._ejecutar, args=(camara,), name=f"camara-{camara.nombre}",
+                                daemon=True)
+        self.hilos[camara.nombre] = hilo
+        hilo.start()
+
+    def _ejecutar(self, camara):
+        try:
+            self.objetivo(camara)
+        except Exception as e:
+            print(f"[{camara.nombre}] El monitoreo terminó por un error: {e}")
+
+    def _supervisar(self):
+        while not self._detener.wait(self.intervalo_revision):
+            for camara in self.camaras:
+                hilo = self.hilos.get(camara.nombre)
+                if hilo is None or not hilo.is_alive():
+                    self.reinicios[camara.nombre] += 1
+                    print(f"[{camara.nombre}] Reiniciando monitoreo de la cámara")
+                    self._arrancar(camara)
@@ -0,0 +1,219 @@
+"""
+Proceso trabajador de ingesta de cámaras (MODO_MONITOR=procesos)
+
+Cada trabajador consulta su cámara y analiza el XML en su propio proceso, sin
+competir por el GIL con las demás cámaras ni con el coordinador. Las placas
+obtenidas se envían al coordinador (app/coordinador.py) por una conexión local
+de multiprocessing.connection autenticada con una clave compartida. El
+coordinador es el único que mantiene el cursor, el control de duplicados, el
+caché de citas y la publicación, y responde a cada envío con el cursor
+actualizado y la espera hasta el siguiente sondeo.
+
+El coordinador arranca un trabajador por cámara. También se puede ejecutar de
+forma independiente en otro equipo de la sucursal, con las cámaras de su
+propio .env (CAMARAS o CAMERA_URL):
+
+    python -m app.trabajador
+
+En ese caso COORDINADOR_HOST, COORDINADOR_PUERTO y COORDINADOR_CLAVE deben
+apuntar al coordinador.
+"""
+
+import multiprocessing
+import threading
+import time
+from multiprocessing.connection import Client
+
+from app.camera import ClienteCamara
+from app.config import (STREAM_REINTENTO, STREAM_TIMEOUT_LECTURA, CAMARA_ESPERA_MAXIMA, COORDINADOR_HOST,
+                        COORDINADOR_PUERTO, COORDINADOR_CLAVE)
+from app.eventos_camara import consumir_alert_stream, ServidorAlarmas
+
+
+class ConexionCoordinador:
+    """
+    Conexión de una cámara con el coordinador.
+
+    Attributes:
+        desde (datetime): Cursor de captura que indicó el coordinador
+        espera (float): Segundos hasta el siguiente sondeo según el coordinador
+    """
+
+    def __init__(self, direccion, clave, datos_camara):
+        self._conexion = Client(direccion, authkey=clave)
+        # Los eventos push pueden llegar desde hilos del servidor de alarmas
+        self._lock = threading.Lock()
+        self.desde = None
+        self.espera = 1.0
+        self._solicitar(("registrar", datos_camara))
+
+    def sondeo(self, placas, conectado, mensaje):
+        """
+        Envía el resultado de un sondeo.
+
+        Args:
+            placas (list): Placas obtenidas (vacía si la consulta falló)
+            conectado (bool): True si la cámara respondió
+            mensaje (str): Estado de la conexión con la cámara
+
+        Returns:
+            None
+        """
+        self._solicitar(("sondeo", placas, conectado, mensaje))
+
+    def eventos(self, placas):
+        """
+        Envía eventos recibidos por push (alert stream o servidor de alarmas).
+
+        Args:
+            placas (list): Eventos con 'placa', 'fecha' y 'país'
+
+        Returns:
+            None
+        """
+        self._solicitar(("eventos", placas))
+
+    def cerrar(self):
+        """Cierra la conexión."""
+        self._conexion.close()
+
+    def _solicitar(self, mensaje):
+        with self._lock:
+            self._conexion.send(mensaje)
+            _, self.desde, self.espera = self._conexion.recv()
+
+
+def ejecutar_trabajador(datos_camara, direccion, clave):
+    """
+    Monitorea una cámara y envía sus placas al coordinador hasta perder la conexión.
+
+    Args:
+        datos_camara (dict): Configuración de la cámara (ver Camara.configuracion)
+        direccion (tuple): (host, puerto) del coordinador
+        clave (bytes): Clave de autenticación del coordinador
+
+    Returns:
+        None
+    """
+    try:
+        coordinador = ConexionCoordinador(direccion, clave, datos_camara)
+    except (OSError, EOFError, multiprocessing.AuthenticationError) as e:
+        print(f"[{datos_camara['nombre']}] No se pudo conectar con el coordinador: {e}")
+        return
+    cliente = ClienteCamara(datos_camara["url"], datos_camara["usuario"], datos_camara["clave"])
+
+    def sondear():
+        placas = cliente.obtener_placas(desde=coordinador.desde)
+        conectado, mensaje = cliente.estado()
+        coordinador.sondeo(placas, conectado, mensaje)
+
+    try:
+        modo = datos_camara.get("modo_ingesta")
+        if modo == "stream":
+            _monitor_stream(datos_camara, cliente, coordinador, sondear)
+        elif modo == "alarma":
+            _monitor_alarmas(datos_camara, coordinador, sondear)
+        else:
+            while True:
+                sondear()
+                time.sleep(coordinador.espera)
+    except (OSError, EOFError):
+        print(f"[{datos_camara['nombre']}] Conexión con el coordinador perdida")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        coordinador.cerrar()
+        cliente.cerrar()
+
+
+def _monitor_stream(datos_camara, cliente, coordinador, sondear):
+    # Mismo esquema que app/monitor.py: stream con sondeo de respaldo
+    while True:
+        motivo = consumir_alert_stream(datos_camara["url_alert_stream"], datos_camara["usuario"],
+                                       datos_camara["clave"], coordinador.eventos, al_conectar=sondear,
+                                       timeout_conexion=cliente.timeout[0], timeout_lectura=STREAM_TIMEOUT_LECTURA)
+        print(f"[{datos_camara['nombre']}] {motivo}. Usando sondeo como respaldo durante {STREAM_REINTENTO:g} s")
+        fin = time.monotonic() + STREAM_REINTENTO
+        while time.monotonic() < fin:
+            sondear()
+            time.sleep(coordinador.espera)
+
+
+def _monitor_alarmas(datos_camara, coordinador, sondear):
+    servidor = ServidorAlarmas(("0.0.0.0", int(datos_camara["puerto_alarma"])), coordinador.eventos)
+    servidor.iniciar()
+    try:
+        while True:
+            if not servidor.activo(STREAM_REINTENTO):
+                sondear()
+                time.sleep(coordinador.espera)
+            else:
+                time.sleep(1)
+    finally:
+        servidor.shutdown()
+
+
+def _camaras_locales():
+    # Configuración de las cámaras del .env, sin construir el registro completo
+    from app.config import CAMARAS, URL, USERNAME, PASSWORD, MODO_INGESTA, URL_ALERT_STREAM, PUERTO_ALARMA
+    from app.eventos_camara import url_alert_stream
+    if CAMARAS:
+        camaras = [dict(datos) for datos in CAMARAS if datos["url"]]
+    elif URL:
+        camaras = [{"nombre": "principal", "url": URL, "usuario": USERNAME, "clave": PASSWORD,
+                    "url_alert_stream": URL_ALERT_STREAM or None, "puerto_alarma": PUERTO_ALARMA}]
+    else:
+        camaras = []
+    for datos in camaras:
+        datos["modo_ingesta"] = (datos.get("modo_ingesta") or MODO_INGESTA).strip().lower()
+        datos["url_alert_stream"] = datos.get("url_alert_stream") or url_alert_stream(datos["url"])
+        datos["puerto_alarma"] = int(datos.get("puerto_alarma") or PUERTO_ALARMA)
+    return camaras
+
+
+def main():
+    """
+    Ejecuta un proceso trabajador por cada cámara del .env contra un coordinador remoto.
+
+    Si el proceso termina (p. ej. se perdió la conexión), se vuelve a arrancar
+    con espera exponencial (hasta CAMARA_ESPERA_MAXIMA segundos).
+
+    Returns:
+        None
+    """
+    if not COORDINADOR_CLAVE:
+        print("Defina COORDINADOR_CLAVE (la misma que en el coordinador) para conectarse")
+        return
+    camaras = _camaras_locales()
+    if not camaras:
+        print("No hay cámaras configuradas (CAMARAS o CAMERA_URL)")
+        return
+    direccion = (COORDINADOR_HOST, COORDINADOR_PUERTO)
+    clave = COORDINADOR_CLAVE.encode("utf-8")
+    contexto = multiprocessing.get_context("spawn")
+
+    def ejecutar(datos):
+        espera = 1.0
+        while True:
+            inicio = time.monotonic()
+            proceso = contexto.Process(target=ejecutar_trabajador, args=(datos, direccion, clave),
+                                       name=f"trabajador-{datos['nombre']}", daemon=True)
+            proceso.start()
+            proceso.join()
+            # Un proceso que duró reinicia la espera
+            espera = 1.0 if time.monotonic() - inicio > CAMARA_ESPERA_MAXIMA else min(espera * 2, CAMARA_ESPERA_MAXIMA)
+            time.sleep(espera)
+
+    for datos in camaras:
+        threading.Thread(target=ejecutar, args=(datos,), name=f"supervisor-{datos['nombre']}", daemon=True).start()
+    print(f"Trabajador conectado a {COORDINADOR_HOST}:{COORDINADOR_PUERTO} con {len(camaras)} cámara(s). "
+          "Presione Ctrl+C para detener")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Benchmark de arranque del punto de entrada (run.py)
+
+Mide, en procesos nuevos de Python:
+
+- import: tiempo de "import run" descontando el arranque del intérprete. Debe
+  mantenerse bajo: los procesos trabajadores del modo "procesos" vuelven a
+  importar run.py al arrancar.
+- api: tiempo desde que se lanza "python run.py" hasta que la API HTTP responde.
+- listo: tiempo hasta que run.py informa "Sistema listo".
+
+La cámara configurada acepta conexiones pero nunca responde, como una cámara
+colgada: el arranque no debe esperarla (el monitor la reintenta en segundo
+plano). Con --limite el script termina con código 1 si la mediana de "listo"
+supera ese valor, para detectar regresiones.
+
+Uso:
+    python benchmarks/bench_arranque.py --repeticiones 5 [--modo asyncio] [--limite 2]
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def medir_import():
+    """Segundos de "import run" en un intérprete nuevo, sin contar su arranque."""
+    def ejecutar(codigo):
+        inicio = time.perf_counter()
+        subprocess.run([sys.executable, "-c", codigo], cwd=RAIZ, check=True)
+        return time.perf_counter() - inicio
+    return max(0.0, ejecutar("import run") - ejecutar("pass"))
+
+
+def medir_arranque(camara, modo, directorio, espera_maxima=30):
+    """
+    Lanza run.py y mide cuándo responde la API y cuándo informa que está listo.
+
+    Returns:
+        tuple: (segundos hasta la API, segundos hasta "Sistema listo"); None
+               en los valores que no se alcanzaron
+    """
+    puerto_http = puerto_libre()
+    entorno = dict(os.environ, PYTHONUNBUFFERED="1", CAMARAS="", CAMERA_URL=camara,
+                   CAMERA_USERNAME="admin", CAMERA_PASSWORD="clave", URL_CITAS="http://127.0.0.1:9/citas",
+                   MODO_MONITOR=modo, HTTP_HOST="127.0.0.1", HTTP_PUERTO=str(puerto_http),
+                   COORDINADOR_PUERTO=str(puerto_libre()), METRICAS_JSON="",
+                   ARCHIVO_HISTORIAL=os.path.join(directorio, "historial.db"),
+                   ARCHIVO_CURSOR=os.path.join(directorio, "cursor.json"))
+    inicio = time.perf_counter()
+    proceso = subprocess.Popen([sys.executable, os.path.join(RAIZ, "run.py")], cwd=directorio, env=entorno,
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding="utf-8")
+    listo = threading.Event()
+    momentos = {}
+
+    def leer_salida():
+        for linea in proceso.stdout:
+            if "Sistema listo" in linea and not listo.is_set():
+                momentos["listo"] = time.perf_counter() - inicio
+                listo.set()
+
+    threading.Thread(target=leer_salida, daemon=True).start()
+    try:
+        limite = inicio + espera_maxima
+        while "api" not in momentos and time.perf_counter() < limite and proceso.poll() is None:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{puerto_http}/api/ultima", timeout=1).close()
+                momentos["api"] = time.perf_counter() - inicio
+            except urllib.error.HTTPError:
+                # Cualquier respuesta HTTP indica que el servidor ya atiende
+                momentos["api"] = time.perf_counter() - inicio
+            except OSError:
+                time.sleep(0.01)
+        listo.wait(max(0.0, limite - time.perf_counter()))
+    finally:
+        proceso.terminate()
+        try:
+            proceso.wait(5)
+        except subprocess.TimeoutExpired:
+            proceso.kill()
+    return momentos.get("api"), momentos.get("listo")
+
+
+def resumen(nombre, valores):
+    validos = [v for v in valores if v is not None]
+    if not validos:
+        print(f"{nombre:<8} sin datos ({len(valores)} intentos)")
+        return None
+    mediana = statistics.median(validos)
+    print(f"{nombre:<8} mediana {mediana * 1000:8.1f} ms   mín {min(validos) * 1000:8.1f} ms   "
+          f"máx {max(validos) * 1000:8.1f} ms   ({len(validos)}/{len(valores)})")
+    return mediana
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de arranque de run.py")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--modo", choices=("hilos", "asyncio", "procesos"), default="hilos")
+    parser.add_argument("--limite", type=float, help="Segundos máximos hasta 'Sistema listo' (mediana)")
+    args = parser.parse_args()
+
+    # Cámara colgada: acepta la conexión TCP pero nunca responde
+    camara = socket.socket()
+    camara.bind(("127.0.0.1", 0))
+    camara.listen(64)
+    url_camara = f"http://127.0.0.1:{camara.getsockname()[1]}/ISAPI/Traffic/channels/1/vehicleDetect/plates"
+
+    importaciones, apis, listos = [], [], []
+    for _ in range(args.repeticiones):
+        importaciones.append(medir_import())
+        with tempfile.TemporaryDirectory() as directorio:
+            api, listo = medir_arranque(url_camara, args.modo, directorio)
+        apis.append(api)
+        listos.append(listo)
+    camara.close()
+
+    print(f"Arranque de run.py (modo {args.modo}, {args.repeticiones} repeticiones, cámara sin respuesta)")
+    resumen("import", importaciones)
+    resumen("api", apis)
+    mediana = resumen("listo", listos)
+    if args.limite is not None and (mediana is None or mediana > args.limite):
+        print(f"REGRESIÓN: el arranque supera el límite de {args.limite:g} s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
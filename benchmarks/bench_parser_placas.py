@@ -0,0 +1,131 @@
+"""
+Benchmark del parser de la lista de placas de la cámara
+
+Compara el parser anterior (árbol completo con ET.fromstring y strptime por
+placa) con el parser incremental de app.camera sobre respuestas ISAPI
+sintéticas de distinto tamaño:
+
+- arbol:        parser anterior, respuesta completa
+- incremental:  ParserPlacas alimentado por bloques de 64 KB, como en
+                ClienteCamara.obtener_placas()
+- con cursor:   igual, con un cursor que deja solo el 1 % más reciente
+                (la cámara devuelve las placas de la más reciente a la más antigua)
+
+Uso:
+    python benchmarks/bench_parser_placas.py [cantidad_de_placas ...]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.camera import ParserPlacas, _TAMANO_BLOQUE  # noqa: E402
+
+_PLACA = ("<Plate><captureTime>{fecha}</captureTime><plateNumber>{placa}</plateNumber>"
+          "<picName>{placa}_{fecha}</picName><country>EC</country><laneNo>1</laneNo>"
+          "<direction>forward</direction><matchingResult>noList</matchingResult></Plate>")
+
+
+def generar_respuesta(cantidad):
+    """
+    Genera una respuesta ISAPI con 'cantidad' placas, de la más reciente a la más antigua.
+
+    Returns:
+        tuple: (bytes con el XML, datetime de la placa más reciente)
+    """
+    zona = timezone(timedelta(hours=-5))
+    fin = datetime(2025, 5, 1, 18, 0, 0, tzinfo=zona)
+    partes = ['<?xml version="1.0" encoding="UTF-8"?>',
+              '<Plates version="2.0" xmlns="http://www.hikvision.com/ver20/XMLSchema">']
+    for i in range(cantidad):
+        fecha = fin - timedelta(seconds=7 * i)
+        partes.append(_PLACA.format(fecha=fecha.strftime("%Y%m%dT%H%M%S") + "-500",
+                                    placa=f"P{chr(65 + i % 26)}{chr(65 + i // 26 % 26)}-{i % 10000:04d}"))
+    partes.append("</Plates>")
+    return "".join(partes).encode("utf-8"), fin
+
+
+def parser_arbol(contenido):
+    """Parser anterior de app/camera.py, conservado como referencia."""
+    import re
+    root = ET.fromstring(contenido)
+    plates = []
+    namespace = root.tag.split('}')[0].strip('{') if '}' in root.tag else None
+    ns = {'ns': namespace} if namespace else None
+    xpath = ".//ns:Plate" if namespace else ".//Plate"
+    for plate in root.findall(xpath, ns):
+        def get_text(element, tag):
+            return (element.findtext(f"ns:{tag}", namespaces=ns) if namespace
+                    else element.findtext(tag))
+        plate_number = get_text(plate, "plateNumber")
+        capture_time = get_text(plate, "captureTime")
+        country = get_text(plate, "country")
+        if plate_number and capture_time:
+            capture_time = capture_time.replace("-500", "-0500")
+            plate_number_cleaned = re.sub(r'[^A-Za-z0-9]', '', plate_number)
+            if not plate_number_cleaned or plate_number_cleaned.lower() == "unknown":
+                continue
+            try:
+                dt = datetime.strptime(capture_time, "%Y%m%dT%H%M%S%z")
+                plates.append({"placa": plate_number_cleaned, "fecha": dt, "país": country})
+            except ValueError:
+                continue
+    plates.sort(key=lambda x: x["fecha"], reverse=True)
+    return plates
+
+
+def parser_incremental(contenido, limite=None):
+    parser = ParserPlacas(limite)
+    for inicio in range(0, len(contenido), _TAMANO_BLOQUE):
+        if not parser.feed(contenido[inicio:inicio + _TAMANO_BLOQUE]):
+            break
+    return parser.cerrar()
+
+
+def medir(funcion, repeticiones):
+    """
+    Returns:
+        tuple: (resultado, mejor tiempo en ms, memoria pico en MB)
+    """
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    tracemalloc.start()
+    funcion()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return resultado, mejor * 1000, pico / 1024 / 1024
+
+
+def main(cantidades):
+    print(f"{'placas':>8} {'KB':>8} | {'parser':<12} {'ms':>9} {'MB pico':>8} {'placas':>7} {'x':>6}")
+    for cantidad in cantidades:
+        contenido, fin = generar_respuesta(cantidad)
+        limite = fin - timedelta(seconds=7 * max(1, cantidad // 100))
+        repeticiones = max(3, 20000 // cantidad)
+        casos = [
+            ("arbol", lambda: parser_arbol(contenido)),
+            ("incremental", lambda: parser_incremental(contenido)),
+            ("con cursor", lambda: parser_incremental(contenido, limite)),
+        ]
+        referencia = None
+        esperado = None
+        for nombre, funcion in casos:
+            placas, ms, mb = medir(funcion, repeticiones)
+            if referencia is None:
+                referencia, esperado = ms, placas
+            elif nombre == "incremental" and placas != esperado:
+                raise AssertionError("El parser incremental no coincide con el parser anterior")
+            print(f"{cantidad:>8} {len(contenido) // 1024:>8} | {nombre:<12} {ms:>9.2f} {mb:>8.2f} "
+                  f"{len(placas):>7} {referencia / ms:>5.1f}x")
+
+
+if __name__ == "__main__":
+    main([int(x) for x in sys.argv[1:]] or [100, 1000, 10000, 50000])
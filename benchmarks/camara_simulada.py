@@ -0,0 +1,230 @@
+"""
+Cámara Hikvision ISAPI simulada para pruebas de carga
+
+Servidor HTTP local que responde como el endpoint de placas de la cámara:
+
+- Exige autenticación HTTP Digest (MD5, qop="auth") y renueva el nonce cada
+  cierto número de solicitudes, como hace el firmware.
+- Genera lecturas de placas sintéticas a una tasa configurable (eventos por
+  segundo) o repite las placas de una respuesta XML grabada de una cámara real.
+- Respeta el filtro AfterTime del cuerpo de la consulta y devuelve las placas
+  de la más reciente a la más antigua, conservando como máximo 'capacidad'
+  lecturas (la cámara también tiene memoria limitada).
+
+El momento en que cada lectura pasa a estar disponible queda en 'generados',
+para que el driver de carga mida la latencia hasta su publicación.
+
+Uso independiente:
+    python benchmarks/camara_simulada.py --puerto 8081 --eventos-por-segundo 2
+"""
+
+import argparse
+import hashlib
+import re
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ZONA_CAMARA = timezone(timedelta(hours=-5))
+_PIC_TIME = re.compile(rb"<picTime>\s*(\d{8}T\d{6})([+-]\d{1,4})?\s*</picTime>")
+_CAMPO_DIGEST = re.compile(r'(\w+)=(?:"([^"]*)"|([^,\s]*))')
+
+_RAIZ = b'<?xml version="1.0" encoding="UTF-8"?>\n<Plates version="2.0" xmlns="http://www.hikvision.com/ver20/XMLSchema">'
+_PLACA = ("<Plate><captureTime>{fecha}</captureTime><plateNumber>{placa}</plateNumber>"
+          "<picName>{placa}{fecha}</picName><country>EC</country><laneNo>1</laneNo>"
+          "<direction>forward</direction><matchingResult>noList</matchingResult></Plate>")
+
+
+def _md5(texto):
+    return hashlib.md5(texto.encode("utf-8")).hexdigest()
+
+
+def formatear_captura(fecha):
+    """Fecha en el formato captureTime de la cámara ("20250501T100102-500")."""
+    return fecha.astimezone(ZONA_CAMARA).strftime("%Y%m%dT%H%M%S") + "-500"
+
+
+def cargar_grabacion(ruta):
+    """
+    Lee las placas de una respuesta XML grabada de una cámara real.
+
+    Returns:
+        list: Números de placa, del más antiguo al más reciente
+    """
+    placas = []
+    for _, elemento in ET.iterparse(ruta):
+        if elemento.tag.rsplit("}", 1)[-1] == "plateNumber" and elemento.text:
+            placas.append(elemento.text.strip())
+    placas.reverse()
+    return placas
+
+
+class _ManejadorCamara(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        longitud = int(self.headers.get("Content-Length") or 0)
+        cuerpo = self.rfile.read(longitud) if longitud else b""
+        camara = self.server
+        with camara.lock:
+            camara.solicitudes += 1
+        if not camara.autorizado(self.command, self.headers.get("Authorization", "")):
+            with camara.lock:
+                camara.desafios += 1
+            self.send_response(401)
+            self.send_header("WWW-Authenticate",
+                             f'Digest realm="{camara.realm}", nonce="{camara.nonce}", qop="auth"')
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        respuesta = camara.respuesta(cuerpo)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/xml")
+        self.send_header("Content-Length", str(len(respuesta)))
+        self.end_headers()
+        self.wfile.write(respuesta)
+
+    do_POST = do_GET
+
+    def log_message(self, formato, *args):
+        pass
+
+
+class CamaraSimulada(ThreadingHTTPServer):
+    """
+    Cámara ISAPI simulada.
+
+    Attributes:
+        eventos_por_segundo (float): Tasa de lecturas generadas (0 = ninguna)
+        capacidad (int): Lecturas retenidas por la cámara
+        generados (dict): (placa, segundos epoch) -> time.monotonic() en que se generó
+    """
+
+    daemon_threads = True
+
+    def __init__(self, direccion=("127.0.0.1", 0), usuario="admin", clave="clave", eventos_por_segundo=1.0,
+                 capacidad=1000, grabacion=None, renovar_nonce=100):
+        super().__init__(direccion, _ManejadorCamara)
+        self.usuario = usuario
+        self.clave = clave
+        self.realm = "IP Camera"
+        self.eventos_por_segundo = eventos_por_segundo
+        self.capacidad = capacidad
+        self.renovar_nonce = renovar_nonce
+        self.lock = threading.Lock()
+        self.generados = {}
+        self.solicitudes = 0
+        self.desafios = 0
+        self.nonce = _md5(str(time.time()))
+        self._usos_nonce = 0
+        self._placas = deque(maxlen=capacidad)
+        self._grabacion = cargar_grabacion(grabacion) if grabacion else None
+        self._contador = 0
+        self._detener = threading.Event()
+
+    @property
+    def url(self):
+        """URL del endpoint de placas (CAMERA_URL)."""
+        host, puerto = self.server_address[:2]
+        return f"http://{host}:{puerto}/ISAPI/Traffic/channels/1/vehicleDetect/plates"
+
+    def iniciar(self):
+        """Atiende solicitudes y genera lecturas en hilos daemon."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        threading.Thread(target=self._generar, daemon=True).start()
+        return self
+
+    def detener(self):
+        """Detiene la generación y el servidor."""
+        self._detener.set()
+        self.shutdown()
+        self.server_close()
+
+    def agregar_placa(self, placa=None):
+        """
+        Registra una lectura con la hora actual.
+
+        Args:
+            placa (str): Placa leída; por defecto una sintética (o la siguiente de la grabación)
+
+        Returns:
+            tuple: (placa, segundos epoch) de la lectura
+        """
+        with self.lock:
+            if placa is None:
+                if self._grabacion:
+                    placa = self._grabacion[self._contador % len(self._grabacion)]
+                else:
+                    placa = f"S{self._contador:06d}"
+            self._contador += 1
+            fecha = datetime.now(ZONA_CAMARA).replace(microsecond=0)
+            self._placas.append((fecha, _PLACA.format(fecha=formatear_captura(fecha), placa=placa)))
+            limpia = re.sub(r"[^A-Za-z0-9]", "", placa)
+            clave = (limpia, int(fecha.timestamp()))
+            self.generados.setdefault(clave, time.monotonic())
+            return clave
+
+    def autorizado(self, metodo, cabecera):
+        """Valida la cabecera Authorization Digest contra el nonce vigente."""
+        if not cabecera.startswith("Digest "):
+            return False
+        campos = {m.group(1): m.group(2) if m.group(2) is not None else m.group(3)
+                  for m in _CAMPO_DIGEST.finditer(cabecera[7:])}
+        with self.lock:
+            if campos.get("nonce") != self.nonce or campos.get("username") != self.usuario:
+                return False
+            self._usos_nonce += 1
+            if self.renovar_nonce and self._usos_nonce > self.renovar_nonce:
+                # Nonce vencido: el cliente recibirá un 401 y debe volver a autenticarse
+                self.nonce = _md5(f"{self.nonce}{time.time()}")
+                self._usos_nonce = 0
+                return False
+        ha1 = _md5(f"{self.usuario}:{self.realm}:{self.clave}")
+        ha2 = _md5(f"{metodo}:{campos.get('uri', '')}")
+        esperado = _md5(f"{ha1}:{campos.get('nonce')}:{campos.get('nc')}:{campos.get('cnonce')}:"
+                        f"{campos.get('qop')}:{ha2}")
+        return campos.get("response") == esperado
+
+    def respuesta(self, cuerpo):
+        """XML de placas posteriores al AfterTime del cuerpo, más reciente primero."""
+        desde = None
+        coincidencia = _PIC_TIME.search(cuerpo or b"")
+        if coincidencia:
+            desde = datetime.strptime(coincidencia.group(1).decode(), "%Y%m%dT%H%M%S").replace(tzinfo=ZONA_CAMARA)
+        with self.lock:
+            placas = [xml for fecha, xml in reversed(self._placas) if desde is None or fecha >= desde]
+        return _RAIZ + "".join(placas).encode("utf-8") + b"</Plates>"
+
+    def _generar(self):
+        siguiente = time.monotonic()
+        while not self._detener.is_set():
+            if self.eventos_por_segundo <= 0:
+                self._detener.wait(0.1)
+                siguiente = time.monotonic()
+                continue
+            siguiente += 1 / self.eventos_por_segundo
+            espera = siguiente - time.monotonic()
+            if espera > 0 and self._detener.wait(espera):
+                return
+            self.agregar_placa()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cámara ISAPI simulada")
+    parser.add_argument("--puerto", type=int, default=8081)
+    parser.add_argument("--usuario", default="admin")
+    parser.add_argument("--clave", default="clave")
+    parser.add_argument("--eventos-por-segundo", type=float, default=1.0)
+    parser.add_argument("--grabacion", help="Respuesta XML grabada de una cámara real")
+    argumentos = parser.parse_args()
+    camara = CamaraSimulada(("0.0.0.0", argumentos.puerto), argumentos.usuario, argumentos.clave,
+                            argumentos.eventos_por_segundo, grabacion=argumentos.grabacion).iniciar()
+    print(f"Cámara simulada en {camara.url} (usuario {argumentos.usuario})")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        camara.detener()
@@ -0,0 +1,139 @@
+"""
+API de citas simulada para pruebas de carga
+
+Responde como el servicio de citas por placa (noCia, placa, agencia) con:
+
+- latencia configurable: fija más un componente aleatorio exponencial;
+- tasa de errores 503 y tasa de respuestas que no llegan a tiempo (cuelga la
+  solicitud 'bloqueo' segundos);
+- una fracción de placas con cita.
+
+También expone la agenda del día (parámetro 'fecha') con las placas con cita
+registradas en 'agenda', para probar la precarga.
+
+Uso independiente:
+    python benchmarks/citas_simulada.py --puerto 8082 --latencia 0.2 --errores 0.05
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+
+class _ManejadorCitas(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        api = self.server
+        parametros = parse_qs(urlsplit(self.path).query)
+        with api.lock:
+            api.solicitudes += 1
+        if "fecha" in parametros:
+            citas = [api.cita(placa) for placa in sorted(api.agenda)]
+            self._json({"codigo": "0", "listadoDatosAgendamiento": citas})
+            return
+
+        placa = parametros.get("placa", [""])[0]
+        time.sleep(api.latencia + (random.expovariate(1 / api.latencia_variable) if api.latencia_variable else 0))
+        azar = random.random()
+        if azar < api.errores:
+            with api.lock:
+                api.fallidas += 1
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if azar < api.errores + api.bloqueos:
+            with api.lock:
+                api.fallidas += 1
+            time.sleep(api.bloqueo)
+        if api.tiene_cita(placa):
+            self._json({"codigo": "0", "listadoDatosAgendamiento": [api.cita(placa)]})
+        else:
+            self._json({"codigo": "0", "mensaje": "NO SE ENCONTRARON RESULTADOS", "listadoDatosAgendamiento": []})
+
+    def _json(self, datos):
+        cuerpo = json.dumps(datos).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *args):
+        pass
+
+
+class CitasSimulada(ThreadingHTTPServer):
+    """
+    API de citas simulada.
+
+    Attributes:
+        latencia (float): Segundos fijos por respuesta
+        latencia_variable (float): Media en segundos del componente aleatorio
+        errores (float): Fracción de respuestas 503
+        bloqueos (float): Fracción de respuestas retrasadas 'bloqueo' segundos
+        con_cita (float): Fracción de placas con cita
+        agenda (set): Placas de la agenda del día
+    """
+
+    daemon_threads = True
+
+    def __init__(self, direccion=("127.0.0.1", 0), latencia=0.05, latencia_variable=0.0, errores=0.0,
+                 bloqueos=0.0, bloqueo=15.0, con_cita=0.3):
+        super().__init__(direccion, _ManejadorCitas)
+        self.latencia = latencia
+        self.latencia_variable = latencia_variable
+        self.errores = errores
+        self.bloqueos = bloqueos
+        self.bloqueo = bloqueo
+        self.con_cita = con_cita
+        self.agenda = set()
+        self.lock = threading.Lock()
+        self.solicitudes = 0
+        self.fallidas = 0
+
+    @property
+    def url(self):
+        """URL de la consulta por placa (URL_CITAS)."""
+        host, puerto = self.server_address[:2]
+        return f"http://{host}:{puerto}/citas"
+
+    def tiene_cita(self, placa):
+        # Decisión estable por placa, para que el caché y la agenda sean coherentes
+        return placa in self.agenda or zlib.crc32(placa.encode()) % 1000 < self.con_cita * 1000
+
+    def cita(self, placa):
+        return {"placa": placa, "nombreCliente": f"Cliente {placa}", "descripcionVeh": "SWIFT",
+                "fechaCita": time.strftime("%Y-%m-%d 10:00"), "nombreAsesor": "Asesor"}
+
+    def iniciar(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def detener(self):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="API de citas simulada")
+    parser.add_argument("--puerto", type=int, default=8082)
+    parser.add_argument("--latencia", type=float, default=0.05)
+    parser.add_argument("--latencia-variable", type=float, default=0.0)
+    parser.add_argument("--errores", type=float, default=0.0)
+    parser.add_argument("--bloqueos", type=float, default=0.0)
+    argumentos = parser.parse_args()
+    api = CitasSimulada(("0.0.0.0", argumentos.puerto), argumentos.latencia, argumentos.latencia_variable,
+                        argumentos.errores, argumentos.bloqueos).iniciar()
+    print(f"API de citas simulada en {api.url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        api.detener()
@@ -0,0 +1,214 @@
+"""
+Driver de carga: reproduce tráfico a través de app.monitor
+
+Levanta la cámara simulada (camara_simulada.py) y la API de citas simulada
+(citas_simulada.py) en el mismo proceso, configura el sistema para usarlas y
+arranca el monitoreo real (hilos o pipeline asyncio). Cada lectura generada por
+la cámara se sigue hasta su publicación en el almacén de detecciones.
+
+Informe periódico y final:
+- latencia lectura -> publicación (p50, p90, p99, máximo)
+- eventos publicados por segundo
+- eventos perdidos (generados y nunca publicados) y publicaciones duplicadas
+- crecimiento de memoria (RSS y memoria de Python con tracemalloc)
+
+Uso:
+    python benchmarks/replay_monitor.py --duracion 60 --eventos-por-segundo 5 \\
+        --latencia-citas 0.2 --errores-citas 0.05 [--modo asyncio]
+
+Nota: captureTime tiene resolución de segundos, por lo que la latencia medida
+incluye hasta un segundo de redondeo del filtro AfterTime de la cámara.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from camara_simulada import CamaraSimulada  # noqa: E402
+from citas_simulada import CitasSimulada  # noqa: E402
+
+
+def percentil(valores, p):
+    if not valores:
+        return float("nan")
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def memoria_rss_mb():
+    """RSS actual del proceso en MB (Linux); None si no está disponible."""
+    try:
+        with open("/proc/self/statm") as archivo:
+            return int(archivo.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError):
+        return None
+
+
+class Medicion:
+    """Acumula las publicaciones observadas en el almacén de detecciones."""
+
+    def __init__(self, camara):
+        self.camara = camara
+        self.lock = threading.Lock()
+        self.latencias = []
+        self.publicados = set()
+        self.sin_completar = set()
+        self.lecturas = {}
+        self.duplicados = 0
+        self.pendientes = 0
+
+    def al_publicar(self, deteccion):
+        ahora = time.monotonic()
+        clave = (deteccion.placa, int(deteccion.fecha.timestamp()))
+        generado = self.camara.generados.get(clave)
+        with self.lock:
+            if clave in self.publicados:
+                # Una consulta pendiente se publica de nuevo al completarse; lo demás es duplicado
+                # y el cierre de un paso con lecturas agrupadas también
+                if clave in self.sin_completar and not deteccion.pendiente:
+                    self.sin_completar.discard(clave)
+                elif deteccion.lecturas > self.lecturas.get(clave, 1):
+                    self.lecturas[clave] = deteccion.lecturas
+                else:
+                    self.duplicados += 1
+                return
+            self.publicados.add(clave)
+            self.lecturas[clave] = deteccion.lecturas
+            if deteccion.pendiente:
+                self.pendientes += 1
+                self.sin_completar.add(clave)
+            if generado is not None:
+                self.latencias.append(ahora - generado)
+
+    def resumen(self):
+        with self.lock:
+            return list(self.latencias), len(self.publicados), self.duplicados, self.pendientes
+
+
+def configurar_entorno(camara, citas, argumentos, directorio):
+    os.environ.update({
+        "CAMERA_URL": camara.url,
+        "CAMERA_USERNAME": camara.usuario,
+        "CAMERA_PASSWORD": camara.clave,
+        "URL_CITAS": citas.url,
+        "NO_CIA": "01",
+        "AGENCIA": "01",
+        "URL_CITAS_DIA": "",
+        "MODO_MONITOR": argumentos.modo,
+        "ARCHIVO_CURSOR": os.path.join(directorio, "cursor_placas.json"),
+        "ARCHIVO_HISTORIAL": os.path.join(directorio, "historial_placas.db"),
+        "HISTORIAL_ACTIVO": "1" if argumentos.historial else "0",
+        "HTTP_ACTIVO": "0",
+        "SONDEO_INTERVALO_MIN": str(argumentos.intervalo),
+        "SESION_VENTANA": str(argumentos.ventana_pasos),
+        "FECHA_INICIO_CONSULTA": time.strftime("%Y%m%dT%H%M%S-500", time.gmtime(time.time() - 5 * 3600)),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga del monitoreo de placas")
+    parser.add_argument("--duracion", type=float, default=30, help="Segundos de generación de tráfico")
+    parser.add_argument("--eventos-por-segundo", type=float, default=2)
+    parser.add_argument("--latencia-citas", type=float, default=0.05)
+    parser.add_argument("--latencia-variable-citas", type=float, default=0.0)
+    parser.add_argument("--errores-citas", type=float, default=0.0)
+    parser.add_argument("--bloqueos-citas", type=float, default=0.0)
+    parser.add_argument("--modo", choices=("hilos", "asyncio"), default="hilos")
+    parser.add_argument("--intervalo", type=float, default=0.5, help="SONDEO_INTERVALO_MIN")
+    parser.add_argument("--ventana-pasos", type=float, default=0,
+                        help="SESION_VENTANA (0 = medir cada lectura por separado)")
+    parser.add_argument("--historial", action="store_true", help="Activar el historial SQLite")
+    parser.add_argument("--grabacion", help="Respuesta XML grabada para repetir sus placas")
+    parser.add_argument("--informe", type=float, default=10, help="Segundos entre informes parciales")
+    argumentos = parser.parse_args()
+
+    camara = CamaraSimulada(eventos_por_segundo=0, grabacion=argumentos.grabacion).iniciar()
+    citas = CitasSimulada(latencia=argumentos.latencia_citas, latencia_variable=argumentos.latencia_variable_citas,
+                          errores=argumentos.errores_citas, bloqueos=argumentos.bloqueos_citas).iniciar()
+    directorio = tempfile.mkdtemp(prefix="bench_placas_")
+    configurar_entorno(camara, citas, argumentos, directorio)
+
+    tracemalloc.start()
+    # Los módulos de la aplicación leen la configuración al importarse
+    from app.camaras import camaras
+    from app.state import almacen_detecciones
+    from app.historial import iniciar_historial
+    from app.monitor import iniciar_monitor
+    from app.metricas import metricas
+
+    medicion = Medicion(camara)
+    almacen_detecciones.suscribir(medicion.al_publicar)
+    iniciar_historial(camaras)
+    if argumentos.modo == "asyncio":
+        from app.pipeline import iniciar_pipeline
+        _, detener = iniciar_pipeline(camaras)
+    else:
+        iniciar_monitor()
+        detener = None
+
+    time.sleep(1)
+    rss_inicial, python_inicial = memoria_rss_mb(), tracemalloc.get_traced_memory()[0]
+    print(f"Modo {argumentos.modo}: {argumentos.eventos_por_segundo:g} eventos/s durante "
+          f"{argumentos.duracion:g} s, citas con {argumentos.latencia_citas * 1000:.0f} ms y "
+          f"{argumentos.errores_citas:.0%} de errores")
+    print(f"{'t (s)':>6} {'generados':>9} {'publicados':>10} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'RSS MB':>7} {'Python MB':>9}")
+
+    inicio = time.monotonic()
+    camara.eventos_por_segundo = argumentos.eventos_por_segundo
+    proximo_informe = inicio + argumentos.informe
+    while time.monotonic() - inicio < argumentos.duracion:
+        time.sleep(0.2)
+        if time.monotonic() >= proximo_informe:
+            proximo_informe += argumentos.informe
+            latencias, publicados, _, _ = medicion.resumen()
+            recientes = latencias[-1000:]
+            print(f"{time.monotonic() - inicio:>6.0f} {len(camara.generados):>9} {publicados:>10} "
+                  f"{percentil(recientes, 50) * 1000:>8.0f} {percentil(recientes, 99) * 1000:>8.0f} "
+                  f"{memoria_rss_mb() or 0:>7.1f} {tracemalloc.get_traced_memory()[0] / 1024 / 1024:>9.1f}")
+    camara.eventos_por_segundo = 0
+    generacion = time.monotonic() - inicio
+
+    # Margen para que terminen las consultas en curso
+    limite = time.monotonic() + 15
+    while time.monotonic() < limite and medicion.resumen()[1] < len(camara.generados):
+        time.sleep(0.2)
+
+    latencias, publicados, duplicados, pendientes = medicion.resumen()
+    generados = len(camara.generados)
+    rss_final, python_final = memoria_rss_mb(), tracemalloc.get_traced_memory()[0]
+    print("\n=== RESULTADO ===")
+    print(f"Eventos generados:       {generados}")
+    print(f"Eventos publicados:      {publicados} ({publicados / generacion:.2f} eventos/s)")
+    print(f"Eventos perdidos:        {generados - publicados}")
+    print(f"Publicaciones duplicadas: {duplicados}")
+    print(f"Publicados como pendientes: {pendientes} ({len(medicion.sin_completar)} sin completar)")
+    print(f"Latencia lectura->publicación: p50 {percentil(latencias, 50) * 1000:.0f} ms, "
+          f"p90 {percentil(latencias, 90) * 1000:.0f} ms, p99 {percentil(latencias, 99) * 1000:.0f} ms, "
+          f"máx {max(latencias, default=float('nan')) * 1000:.0f} ms")
+    if rss_inicial is not None:
+        print(f"Memoria RSS:             {rss_inicial:.1f} -> {rss_final:.1f} MB ({rss_final - rss_inicial:+.1f} MB)")
+    print(f"Memoria Python:          {python_inicial / 1024 / 1024:.1f} -> {python_final / 1024 / 1024:.1f} MB "
+          f"({(python_final - python_inicial) / 1024 / 1024:+.1f} MB)")
+    print(f"Cámara: {camara.solicitudes} solicitudes HTTP, {camara.desafios} desafíos Digest; "
+          f"API de citas: {citas.solicitudes} solicitudes, {citas.fallidas} fallidas")
+    print("Tiempo por etapa (app/metricas.py):")
+    for etapa, datos in sorted(metricas.instantanea()["etapas"].items()):
+        print(f"  {etapa:<14} {datos['cantidad']:>7} veces, promedio {datos['promedio_ms']:.2f} ms, "
+              f"p99 <= {datos['p99_ms']:g} ms")
+
+    if detener is not None:
+        detener()
+    camara.detener()
+    citas.detener()
+
+
+if __name__ == "__main__":
+    main()
@@ -12,108 +12,173 @@ Fecha: 2025
 Versión: 1.0
 """
 
-import os
+import queue
 import time
-from app.monitor import iniciar_monitor, obtener_ultima_deteccion
-from app.camera import verificar_conexion_camara
+from collections import OrderedDict
+
+# Los módulos de app (requests, XML, SQLite...) se importan dentro de
+# iniciar_sistema: importar run.py, p. ej. al arrancar un proceso trabajador del
+# modo "procesos", no debe cargar ni configurar el sistema completo.
+
+# Estado ya mostrado de las detecciones recientes, para resumir en una línea el
+# cierre de un paso con varias lecturas en lugar de repetir todo el bloque
+_mostradas = OrderedDict()
+
+def mostrar_deteccion(deteccion):
+    """
+    Muestra en consola una detección y los datos de su cita.
+
+    Args:
+        deteccion (Deteccion): Detección publicada por el monitor
+
+    Returns:
+        None
+    """
+    clave = (deteccion.camara, deteccion.placa, deteccion.fecha)
+    if _mostradas.get(clave) == (deteccion.mensaje, deteccion.pendiente):
+        print(f"  {deteccion.placa}: mismo vehículo, {deteccion.lecturas} lecturas hasta "
+              f"{deteccion.ultima_lectura:%H:%M:%S}")
+        return
+    _mostradas[clave] = (deteccion.mensaje, deteccion.pendiente)
+    while len(_mostradas) > 100:
+        _mostradas.popitem(last=False)
+
+    from app.camaras import camaras
+
+    print("\n" + "="*50)
+    print(f"PLACA DETECTADA: {deteccion.placa}")
+    if len(camaras) > 1:
+        print(f"CÁMARA: {deteccion.camara}")
+    print(f"FECHA: {deteccion.fecha:%Y-%m-%d %H:%M:%S}")
+    if deteccion.lecturas > 1:
+        print(f"LECTURAS: {deteccion.lecturas} (hasta {deteccion.ultima_lectura:%H:%M:%S})")
+    print(f"ESTADO: {deteccion.mensaje}")
+    if deteccion.pendiente:
+        print("  La cita se consultará de nuevo cuando el servicio de citas responda")
+
+    if deteccion.tiene_cita:
+        datos_cita = deteccion.datos_cita
+        if deteccion.coincidencia == "aproximada":
+            print(f"COINCIDENCIA: aproximada con {deteccion.placa_cita} (puntaje {deteccion.puntaje})")
+        print("\nDATOS DE LA CITA:")
+        print(f"  Cliente: {datos_cita.get('nombreCliente', 'N/A')}")
+        print(f"  Vehículo: {datos_cita.get('descripcionVeh', 'N/A')}")
+        print(f"  Fecha: {datos_cita.get('fechaCita', 'N/A')}")
+        print(f"  Hora: {datos_cita.get('horaCita', 'N/A') if 'horaCita' in datos_cita else datos_cita.get('fechaCita', 'N/A').split(' ')[1] if ' ' in datos_cita.get('fechaCita', 'N/A') else 'N/A'}")
+        print(f"  Asesor: {datos_cita.get('nombreAsesor', datos_cita.get('asesor', 'N/A'))}")
+        print(f"  OT: {datos_cita.get('ordenrepld', 'N/A')}")
+        if 'descripcionAlterna' in datos_cita and datos_cita['descripcionAlterna']:
+            print(f"  Servicio: {datos_cita['descripcionAlterna']}")
+        if 'agencia' in datos_cita and datos_cita['agencia']:
+            print(f"  Agencia: {datos_cita['agencia']}")
+
+    print("="*50)
 
 def iniciar_sistema():
     """
     Inicializa el sistema de detección de placas.
     
     Esta función realiza las siguientes tareas:
-    1. Verifica la conexión con la cámara de detección de placas
-    2. Inicia el hilo de monitoreo para la detección de placas
+    1. Valida la configuración cargada del .env
+    2. Inicia el historial, la API HTTP y el hilo de monitoreo sin esperar a
+       la cámara (el monitor reintenta la conexión en segundo plano)
     3. Muestra los resultados en consola
     
     Returns:
         None
     """
+    inicio = time.perf_counter()
+    from app.config import (MODO_MONITOR, HTTP_HOST, HTTP_PUERTO, METRICAS_JSON, METRICAS_INTERVALO,
+                            PERFILADOR_ACTIVO, validar_configuracion)
+
     print("\n=== VERIFICACIÓN DE COMPONENTES ===")
     
-    # Verificar conexión a la cámara con reintentos automáticos
-    print("\n1. Verificando conexión con la cámara...")
-    conectado = False
-    primer_intento = True
-    contador_puntos = 0
-    
-    while not conectado:
-        conectado, mensaje = verificar_conexion_camara()
-        
-        if conectado:
-            if not primer_intento:
-                print("\r", end="")  # Limpiar línea de progreso
-            print(" ✓ Conexión con la cámara establecida correctamente")
-        else:
-            if primer_intento:
-                print(f" ✗ Error: {mensaje}")
-                print("   Reintentando conexión (Ctrl+C para cancelar)")
-                print("   Intentando conectarse", end="", flush=True)
-                primer_intento = False
-            else:
-                # Mostrar indicador de progreso con puntos animados
-                puntos = "." * ((contador_puntos % 3) + 1)
-                espacios = " " * (3 - len(puntos))
-                print(f"\r   Intentando conectarse {puntos}{espacios}", end="", flush=True)
-                contador_puntos += 1
-            
-            try:
-                time.sleep(0.5)
-            except KeyboardInterrupt:
-                print("\n\n   Conexión cancelada por el usuario.")
-                print("   El sistema se iniciará sin conexión a la cámara.")
-                print("   Es posible que no detecte placas.")
-                break
+    print("\n1. Verificando configuración...")
+    problemas = validar_configuracion()
+    for problema in problemas:
+        print(f" ✗ {problema}")
+    if not problemas:
+        print(" ✓ Configuración válida")
+
+    from app.monitor import iniciar_monitor, sesiones_paso
+    from app.camaras import camaras
+    from app.api_citas import iniciar_prefetch_citas
+    from app.state import almacen_detecciones
+    from app.historial import historial, iniciar_historial
+    from app.servidor_http import iniciar_servidor_http
+    from app.metricas import perfilador, iniciar_instantaneas
     
     print("\n=== INICIANDO SERVICIOS ===")
     
+    # Precargar la agenda del día si está configurada
+    if iniciar_prefetch_citas():
+        print("\nPrecarga de la agenda diaria de citas iniciada")
+    
+    # Restaurar duplicados y cursores desde el historial antes de monitorear
+    activo, restaurados, milisegundos = iniciar_historial(camaras)
+    if activo:
+        print(f"\nHistorial de detecciones: {restaurados} eventos restaurados en {milisegundos:.1f} ms")
+
+    # API HTTP local para pantallas de recepción y aplicaciones de asesores
+    servidor_http = iniciar_servidor_http(historial)
+    if servidor_http is not None:
+        print(f"\nAPI de detecciones disponible en http://{HTTP_HOST}:{HTTP_PUERTO}/api/ultima")
+        print(f"Métricas en http://{HTTP_HOST}:{HTTP_PUERTO}/metrics")
+
+    # Métricas de rendimiento en disco y perfilador por muestreo
+    if METRICAS_JSON:
+        iniciar_instantaneas(METRICAS_JSON, METRICAS_INTERVALO)
+        print(f"Instantánea de métricas cada {METRICAS_INTERVALO:g} s en {METRICAS_JSON}")
+    if PERFILADOR_ACTIVO:
+        perfilador.iniciar()
+        print("Perfilador por muestreo activo (ver /api/perfilador)")
+
+    # Suscribirse a las detecciones antes de arrancar el monitoreo
+    detecciones = almacen_detecciones.crear_cola()
+
     # Iniciar hilo de monitoreo
     print("\nIniciando sistema de monitoreo...")
-    iniciar_monitor()
-    print(" Monitor de placas iniciado")
+    detener_monitor = None
+    if MODO_MONITOR == "asyncio":
+        from app.pipeline import iniciar_pipeline
+        _, detener_monitor = iniciar_pipeline(camaras)
+    elif MODO_MONITOR == "procesos":
+        from app.coordinador import iniciar_coordinador
+        coordinador = iniciar_coordinador(camaras)
+        if coordinador is not None:
+            detener_monitor = coordinador.detener
+        else:
+            print("Usando un hilo por cámara en este proceso")
+            iniciar_monitor()
+    else:
+        iniciar_monitor()
+    print(f" Monitor de placas iniciado ({len(camaras)} cámara{'s' if len(camaras) != 1 else ''})")
+    print("   La conexión con la cámara se verifica en segundo plano")
     
-    print("\n Sistema listo. Mostrando detecciones en consola...")
+    print(f"\n Sistema listo en {time.perf_counter() - inicio:.2f} s. Mostrando detecciones en consola...")
     print("(Presione Ctrl+C para detener) \n")
     
     try:
-        # Bucle principal para mostrar resultados en consola
-        ultima_deteccion_completa = None
+        # Bucle principal: cada detección publicada llega por la cola en cuanto ocurre
         while True:
             try:
-                deteccion = obtener_ultima_deteccion()
-                # Crear identificador único con placa + fecha para evitar duplicados exactos
-                if deteccion:
-                    deteccion_actual = f"{deteccion['placa']}_{deteccion['fecha']}"
-                    if deteccion_actual != ultima_deteccion_completa:
-                        ultima_deteccion_completa = deteccion_actual
-                        print("\n" + "="*50)
-                        print(f"PLACA DETECTADA: {deteccion['placa']}")
-                        print(f"FECHA: {deteccion['fecha']}")
-                        print(f"ESTADO: {deteccion['mensaje']}")
-                        
-                        if deteccion["tiene_cita"]:
-                            datos_cita = deteccion["datos_cita"]
-                            print("\nDATOS DE LA CITA:")
-                            print(f"  Cliente: {datos_cita.get('nombreCliente', 'N/A')}")
-                            print(f"  Vehículo: {datos_cita.get('descripcionVeh', 'N/A')}")
-                            print(f"  Fecha: {datos_cita.get('fechaCita', 'N/A')}")
-                            print(f"  Hora: {datos_cita.get('horaCita', 'N/A') if 'horaCita' in datos_cita else datos_cita.get('fechaCita', 'N/A').split(' ')[1] if ' ' in datos_cita.get('fechaCita', 'N/A') else 'N/A'}")
-                            print(f"  Asesor: {datos_cita.get('nombreAsesor', datos_cita.get('asesor', 'N/A'))}")
-                            print(f"  OT: {datos_cita.get('ordenrepld', 'N/A')}")
-                            if 'descripcionAlterna' in datos_cita and datos_cita['descripcionAlterna']:
-                                print(f"  Servicio: {datos_cita['descripcionAlterna']}")
-                            if 'agencia' in datos_cita and datos_cita['agencia']:
-                                print(f"  Agencia: {datos_cita['agencia']}")
-                        
-                        print("="*50)
+                deteccion = detecciones.get(timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                mostrar_deteccion(deteccion)
             except Exception as e:
                 print(f"\nError al procesar detección: {e}")
                 print("El sistema continuará monitoreando...")
-                time.sleep(5)
-            
-            time.sleep(1)
     except KeyboardInterrupt:
         print("\nDetención solicitada por el usuario. Cerrando sistema...")
+        if detener_monitor is not None:
+            detener_monitor()
+        sesiones_paso.detener()
+        if servidor_http is not None:
+            servidor_http.detener()
+        if historial is not None:
+            historial.cerrar()
 
 if __name__ == "__main__":
     print("\n===============================================")